@@ -0,0 +1,46 @@
+"""
+Compare the column-wise merge_duplicate_columns engine with the previous transpose-based implementation.
+
+Usage:
+    python -m benchmarks.bench_merge_duplicate_columns [--rows 500] [--columns 1000] [--repeat 3]
+"""
+import argparse
+import timeit
+
+import pandas as pd
+
+from redcap_downloader.data_cleaning.helpers import merge_duplicate_columns
+from .synthetic import make_wide_frame
+
+
+def merge_duplicate_columns_transpose(df: pd.DataFrame) -> pd.DataFrame:
+    """Previous implementation of merge_duplicate_columns, kept as a reference."""
+    return (df
+            .T
+            .groupby(df.columns, sort=False)
+            .apply(lambda x: x.infer_objects().bfill().iloc[0])
+            .T
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=500)
+    parser.add_argument('--columns', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_wide_frame(args.rows, args.columns)
+    print(f'Synthetic frame: {df.shape[0]} rows x {df.shape[1]} columns '
+          f'({df.columns.nunique()} unique names)')
+
+    pd.testing.assert_frame_equal(merge_duplicate_columns(df),
+                                  merge_duplicate_columns_transpose(df).astype(merge_duplicate_columns(df).dtypes))
+
+    for label, func in [('transpose', merge_duplicate_columns_transpose), ('column-wise', merge_duplicate_columns)]:
+        best = min(timeit.repeat(lambda: func(df), number=1, repeat=args.repeat))
+        print(f'{label:>12}: {best:.3f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Compare write and read-back times of the cleaned reports saved as CSV, Parquet, Feather files or as one
+partitioned Parquet dataset.
+
+Usage:
+    python -m benchmarks.bench_output_formats [--participants 500] [--columns 300]
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from redcap_downloader.redcap_api.dom import Report
+from redcap_downloader.storage.formats import read_table
+from redcap_downloader.storage.path_resolver import PathResolver
+from .synthetic import make_cleaned_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--participants', type=int, default=500)
+    parser.add_argument('--columns', type=int, default=300)
+    args = parser.parse_args()
+
+    cleaned = make_cleaned_report(args.participants, args.columns)
+    report = Report(cleaned.rename(columns={'participant_id': 'study_id'}))
+    report.data = cleaned
+
+    print(f'{"layout":>20} {"write":>9} {"read":>9} {"size (MB)":>10}')
+    for layout in ['csv', 'parquet', 'feather', 'parquet dataset']:
+        with tempfile.TemporaryDirectory() as test_dir:
+            paths = PathResolver(test_dir, file_format=layout.split()[0])
+            start = time.perf_counter()
+            if layout == 'parquet dataset':
+                report.save_partitioned_data(paths)
+            else:
+                report.save_cleaned_data(paths, by=['participant_id', 'output_form'])
+            write_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            if layout == 'parquet dataset':
+                read_table(paths.get_reports_dataset())
+            else:
+                for file_path in paths.get_reports_dir().rglob(f'*.{layout}'):
+                    read_table(file_path)
+            read_time = time.perf_counter() - start
+
+            size = sum(f.stat().st_size for f in Path(test_dir).rglob('*') if f.is_file()) / 1e6
+        print(f'{layout:>20} {write_time:>8.2f}s {read_time:>8.2f}s {size:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Count the filesystem calls made to resolve the paths of the cleaned report files, with the directory checks made
+before every file (as before directories were cached) and with the cached directories of PathResolver.
+
+On a network filesystem, each call is a round trip to the server.
+
+Usage:
+    python -m benchmarks.bench_path_resolver [--participants 1000] [--forms 10]
+"""
+import argparse
+import os
+import tempfile
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+from redcap_downloader.storage.path_resolver import PathResolver
+
+
+@contextmanager
+def count_calls(counter: Counter):
+    """Count the calls to the os functions used by pathlib to check and create directories."""
+    originals = {name: getattr(os, name) for name in ('stat', 'mkdir', 'scandir', 'listdir')}
+
+    def counting(name):
+        def call(*args, **kwargs):
+            counter[name] += 1
+            return originals[name](*args, **kwargs)
+        return call
+    for name in originals:
+        setattr(os, name, counting(name))
+    try:
+        yield counter
+    finally:
+        for name, function in originals.items():
+            setattr(os, name, function)
+
+
+def resolve_uncached(main_dir: Path, subject_ids: list[str], forms: list[str]):
+    """Check for the reports and subject directories, and create them if missing, before every file."""
+    for subject_id in subject_ids:
+        for _ in forms:
+            for directory in (main_dir / 'reports', main_dir / 'reports' / subject_id):
+                if not directory.exists():
+                    directory.mkdir(parents=True)
+
+
+def resolve_cached(paths: PathResolver, subject_ids: list[str], forms: list[str]):
+    """Create all the subject directories at once, then resolve the path of every file."""
+    paths.make_subject_dirs(subject_ids)
+    for subject_id in subject_ids:
+        for form in forms:
+            paths.get_subject_questionnaire(subject_id, form)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--participants', type=int, default=1000)
+    parser.add_argument('--forms', type=int, default=10)
+    args = parser.parse_args()
+
+    subject_ids = [f'ABD{i:04d}' for i in range(args.participants)]
+    forms = [f'Form{i}' for i in range(args.forms)]
+    print(f'{args.participants * args.forms} files of {args.participants} participants')
+    print(f'{"resolver":>9} {"run":>6} {"stat":>7} {"mkdir":>7} {"scandir":>8} {"time":>9}')
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name in ('uncached', 'cached'):
+            main_dir = Path(temp_dir) / name
+            for run in ('first', 'rerun'):
+                # A new resolver is created for each run, as for each download
+                paths = PathResolver(main_dir, existing_dir='overwrite')
+                with count_calls(Counter()) as counter:
+                    start = time.perf_counter()
+                    if name == 'uncached':
+                        resolve_uncached(main_dir, subject_ids, forms)
+                    else:
+                        resolve_cached(paths, subject_ids, forms)
+                    elapsed = time.perf_counter() - start
+                print(f'{name:>9} {run:>6} {counter["stat"]:>7} {counter["mkdir"]:>7} {counter["scandir"]:>8} '
+                      f'{elapsed:>8.3f}s')
+
+
+if __name__ == '__main__':
+    main()
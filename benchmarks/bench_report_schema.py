@@ -0,0 +1,41 @@
+"""
+Compare parse time and memory use of a wide, sparse report parsed with inferred column types and with the schema
+derived from the data dictionary.
+
+Usage:
+    python -m benchmarks.bench_report_schema [--participants 500] [--forms 10] [--fields-per-form 50]
+"""
+import argparse
+import time
+from io import StringIO
+
+import pandas as pd
+
+from redcap_downloader.redcap_api.schema import ReportSchema
+from .synthetic import make_report_csv, make_variables
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--participants', type=int, default=500)
+    parser.add_argument('--forms', type=int, default=10)
+    parser.add_argument('--fields-per-form', type=int, default=50)
+    args = parser.parse_args()
+
+    variables = make_variables(n_forms=args.forms, fields_per_form=args.fields_per_form)
+    report_csv = make_report_csv(variables, args.participants)
+    schema = ReportSchema.from_variables(variables)
+    print(f'Report: {len(report_csv) / 1e6:.1f} MB of CSV, {schema}')
+
+    print(f'{"parser":>10} {"parse":>9} {"memory (MB)":>12} {"text columns":>13}')
+    for name, read_csv in [('inferred', pd.read_csv), ('schema', schema.read_csv)]:
+        start = time.perf_counter()
+        df = read_csv(StringIO(report_csv))
+        parse_time = time.perf_counter() - start
+        memory = df.memory_usage(deep=True).sum() / 1e6
+        text_columns = len(df.select_dtypes(['object', 'str']).columns)
+        print(f'{name:>10} {parse_time:>8.2f}s {memory:>12.1f} {text_columns:>13}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""
+Compare the serial, thread and process writer backends of Report.save_cleaned_data for several study sizes.
+
+Usage:
+    python -m benchmarks.bench_save_cleaned_data [--participants 100 500 2000] [--columns 300] [--workers 4]
+"""
+import argparse
+import tempfile
+import time
+
+from redcap_downloader.redcap_api.dom import Report
+from redcap_downloader.storage.path_resolver import PathResolver
+from redcap_downloader.storage.writer import GroupWriter
+from .synthetic import make_cleaned_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--participants', type=int, nargs='+', default=[100, 500, 2000])
+    parser.add_argument('--columns', type=int, default=300)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    print(f'{"participants":>12} ' + ' '.join(f'{backend:>9}' for backend in GroupWriter.BACKENDS))
+    for n_participants in args.participants:
+        cleaned = make_cleaned_report(n_participants, args.columns)
+        report = Report(cleaned.rename(columns={'participant_id': 'study_id'}))
+        report.data = cleaned
+        timings = []
+        for backend in GroupWriter.BACKENDS:
+            with tempfile.TemporaryDirectory() as test_dir:
+                paths = PathResolver(test_dir)
+                start = time.perf_counter()
+                with GroupWriter(backend, max_workers=args.workers) as writer:
+                    report.save_cleaned_data(paths, by=['participant_id', 'output_form'], writer=writer)
+                timings.append(time.perf_counter() - start)
+        print(f'{n_participants:>12} ' + ' '.join(f'{t:>8.2f}s' for t in timings))
+
+
+if __name__ == '__main__':
+    main()
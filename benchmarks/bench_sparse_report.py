@@ -0,0 +1,65 @@
+"""
+Compare memory use and runtime of cleaning a wide, mostly-empty report and splitting it into per-participant groups,
+in wide format and in long format (sparse mode of DataCleaner).
+
+Each participant-event row only fills the fields of the forms of its event, as in the combined REDCap report.
+
+Usage:
+    python -m benchmarks.bench_sparse_report [--participants 200] [--forms 5] [--fields-per-form 50]
+"""
+import argparse
+import time
+import tracemalloc
+from io import StringIO
+
+import pandas as pd
+
+from redcap_downloader.data_cleaning.data_cleaner import DataCleaner
+from redcap_downloader.redcap_api.dom import Report
+from redcap_downloader.redcap_api.redcap import REDCap
+from .synthetic import make_report_csv, make_variables
+
+
+def clean_and_split(report: Report, sparse: bool) -> tuple[int, int]:
+    """Clean the report and build every group, returning the size of the cleaned data and the number of groups."""
+    # Only the record ID field of the REDCap client is used by the cleaning steps
+    cleaner = DataCleaner(redcap=REDCap, paths=None, sparse=sparse)
+    report = cleaner.clean_reports(report)
+    by = ['participant_id', 'output_form']
+    if sparse:
+        size = report.sparse.memory_usage()
+        groups = sum(1 for _ in report.sparse.split(by))
+    else:
+        size = int(report.data.memory_usage(deep=True).sum())
+        groups = sum(1 for _ in report.split(by, remove_empty_columns=True))
+    return size, groups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--participants', type=int, default=200)
+    parser.add_argument('--forms', type=int, default=5)
+    parser.add_argument('--fields-per-form', type=int, default=50)
+    args = parser.parse_args()
+
+    variables = make_variables(n_forms=args.forms, fields_per_form=args.fields_per_form)
+    raw = pd.read_csv(StringIO(make_report_csv(variables, args.participants)))
+    density = raw.notna().to_numpy().mean()
+    print(f'Report: {raw.shape[0]} rows, {raw.shape[1]} columns, {density:.1%} non-empty cells, '
+          f'{raw.memory_usage(deep=True).sum() / 1e6:.1f} MB')
+
+    print(f'{"format":>8} {"time":>9} {"peak (MB)":>10} {"cleaned (MB)":>13} {"groups":>7}')
+    for name, sparse in [('wide', False), ('long', True)]:
+        start = time.perf_counter()
+        size, groups = clean_and_split(Report(raw), sparse)
+        elapsed = time.perf_counter() - start
+        # Memory is traced in a separate run, since tracing slows down the cleaning
+        tracemalloc.start()
+        clean_and_split(Report(raw), sparse)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f'{name:>8} {elapsed:>8.2f}s {peak / 1e6:>10.1f} {size / 1e6:>13.1f} {groups:>7}')
+
+
+if __name__ == '__main__':
+    main()
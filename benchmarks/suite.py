@@ -0,0 +1,197 @@
+"""
+Run the download pipeline on synthetic reports of several sizes, and compare the time of each stage with a stored
+baseline.
+
+The data dictionary and the report are served by a local stub of the REDCap API, so that the requests and the
+parsing of the responses are included. Each scale downloads, cleans and saves the variables and the report, and the
+time of each stage is taken from the run report of the download (see redcap_downloader.profiling).
+
+Baselines depend on the machine: record one (--save-baseline) before comparing changes on the same machine.
+
+Usage:
+    python -m benchmarks.suite [--scales 1k 10k] [--repeat 1] [--baseline benchmarks/baseline.json]
+                               [--save-baseline] [--output results.json] [--threshold 1.25] [--check]
+"""
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from redcap_downloader.config.properties import Properties
+from redcap_downloader.data_cleaning.data_cleaner import DataCleaner
+from redcap_downloader.profiling import StageProfiler
+from redcap_downloader.redcap_api.redcap import REDCap
+from redcap_downloader.storage.path_resolver import PathResolver
+from redcap_downloader.testing import StubREDCapServer
+from .synthetic import make_report_csv, make_variables
+
+# Number of participants of each scale: the report has one row per participant and event
+SCALES = {'1k': 250, '10k': 2500, '100k': 25000}
+N_EVENTS = 4
+N_FORMS = 5
+FIELDS_PER_FORM = 20
+
+STAGES = [
+    'REDCap.get_questionnaire_variables',
+    'REDCap.get_questionnaire_report',
+    'DataCleaner.clean_variables',
+    'DataCleaner.clean_reports',
+    'CleaningPlan.apply',
+    'DataMixin.split',
+    'Report.save_cleaned_data',
+]
+DEFAULT_BASELINE = Path(__file__).parent / 'baseline.json'
+
+
+def run_scale(n_participants: int, work_dir: Path) -> dict:
+    """
+    Download, clean and save a synthetic report from the stub server, and time each stage.
+
+    Args:
+        n_participants (int): Number of participants of the report.
+        work_dir (Path): Directory where the token file and the downloaded data are saved.
+
+    Returns:
+        dict: Rows and columns of the raw report, total time and time of each stage (in seconds).
+    """
+    variables = make_variables(n_forms=N_FORMS, fields_per_form=FIELDS_PER_FORM, n_events=N_EVENTS)
+    report_csv = make_report_csv(variables, n_participants)
+    token_file = work_dir / 'redcap_token.txt'
+    token_file.write_text('token\n')
+
+    with StubREDCapServer() as server:
+        server.queue('metadata', 200, variables.to_csv(index=False))
+        server.queue('report', 200, report_csv)
+        properties = Properties(redcap_token_file=token_file, download_folder=work_dir / 'data', report_id=1,
+                                api_url=server.url, max_retries=0)
+        paths = PathResolver(properties.download_folder, existing_dir='overwrite')
+        redcap = REDCap(properties)
+        cleaner = DataCleaner(redcap, paths)
+        profiler = StageProfiler()
+        start = time.perf_counter()
+        try:
+            with profiler.activate():
+                cleaner.save_questionnaire_variables()
+                cleaner.save_questionnaire_reports()
+        finally:
+            redcap.close()
+        total = time.perf_counter() - start
+
+    stages = dict.fromkeys(STAGES, 0.0)
+    for record in profiler.stages:
+        if record['stage'] in stages:
+            stages[record['stage']] += record['wall_time']
+    report = next(record for record in profiler.stages if record['stage'] == 'REDCap.get_questionnaire_report')
+    return {'rows': report['rows'], 'columns': report['columns'], 'total': total, 'stages': stages}
+
+
+def run_suite(scales: list[str], repeat: int = 1) -> dict:
+    """
+    Run every scale, keeping the fastest time of each stage over the repeats.
+
+    Args:
+        scales (list): Names of the scales to run (keys of SCALES).
+        repeat (int): Number of runs of each scale.
+
+    Returns:
+        dict: Result of each scale (see run_scale).
+    """
+    results = {}
+    for scale in scales:
+        runs = []
+        for _ in range(repeat):
+            with tempfile.TemporaryDirectory() as work_dir:
+                runs.append(run_scale(SCALES[scale], Path(work_dir)))
+        results[scale] = {'rows': runs[0]['rows'], 'columns': runs[0]['columns'],
+                          'total': min(run['total'] for run in runs),
+                          'stages': {stage: min(run['stages'][stage] for run in runs) for stage in STAGES}}
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float = 1.25, min_delta: float = 0.05) -> tuple[str, list]:
+    """
+    Compare the results with a baseline.
+
+    A stage missing from the baseline of a scale is reported as an error, so that a renamed stage is not silently
+    left unchecked. Scales missing from the baseline are skipped.
+
+    Args:
+        results (dict): Result of each scale (see run_suite).
+        baseline (dict): Results of the baseline, for the same or other scales.
+        threshold (float): Ratio to the baseline time above which a stage is a regression.
+        min_delta (float): Minimum slowdown (in seconds) of a regression, so that short stages are not flagged for
+            noise.
+
+    Returns:
+        tuple: Comparison table, and list of (scale, stage) regressions or stages missing from the baseline.
+    """
+    lines = [f'{"scale":>6} {"stage":<36} {"baseline":>9} {"current":>9} {"ratio":>6}']
+    regressions = []
+    for scale, result in results.items():
+        if scale not in baseline:
+            continue
+        for stage in [*STAGES, 'total']:
+            current = result['total'] if stage == 'total' else result['stages'][stage]
+            reference = baseline[scale]['total'] if stage == 'total' else baseline[scale]['stages'].get(stage)
+            if reference is None:
+                regressions.append((scale, stage))
+                lines.append(f'{scale:>6} {stage:<36} {"-":>9} {current:>8.3f}s {"-":>6}  MISSING FROM BASELINE')
+                continue
+            if not reference:
+                continue
+            ratio = current / reference
+            flag = ratio > threshold and current - reference > min_delta
+            if flag:
+                regressions.append((scale, stage))
+            lines.append(f'{scale:>6} {stage:<36} {reference:>8.3f}s {current:>8.3f}s {ratio:>6.2f}'
+                         f'{"  REGRESSION" if flag else ""}')
+    return '\n'.join(lines), regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=['1k', '10k'])
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='save the results as the new baseline')
+    parser.add_argument('--output', type=Path, help='save the results as JSON')
+    parser.add_argument('--threshold', type=float, default=1.25)
+    parser.add_argument('--check', action='store_true', help='exit with an error if a stage regressed')
+    args = parser.parse_args()
+
+    results = run_suite(args.scales, repeat=args.repeat)
+    for scale, result in results.items():
+        print(f'{scale}: {result["rows"]} rows x {result["columns"]} columns, {result["total"]:.2f} s')
+    document = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'machine': f'{platform.machine()} {platform.processor() or platform.system()}',
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'results': results,
+    }
+    if args.output is not None:
+        args.output.write_text(json.dumps(document, indent=2))
+
+    if args.baseline.exists():
+        table, regressions = compare(results, json.loads(args.baseline.read_text())['results'], args.threshold)
+        print(table)
+        if regressions:
+            print(f'{len(regressions)} stages slower than {args.threshold:.2f}x the baseline, or missing from it')
+            if args.check:
+                sys.exit(1)
+    if args.save_baseline:
+        if args.baseline.exists():
+            # Scales not run this time keep their previous baseline
+            document['results'] = {**json.loads(args.baseline.read_text())['results'], **results}
+        args.baseline.write_text(json.dumps(document, indent=2))
+        print(f'Saved baseline to {args.baseline}')
+
+
+if __name__ == '__main__':
+    main()
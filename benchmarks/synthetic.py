@@ -0,0 +1,170 @@
+"""
+Synthetic REDCap data dictionaries and reports for the benchmarks.
+
+The data dictionary has a screening form, and the same questionnaires at each event of the study, with the
+event-specific field name suffixes used by the project (e.g. phq_1_base, phq_1_6m, phq_1_12m), so that cleaning
+the report merges the columns of the same field across events.
+"""
+import numpy as np
+import pandas as pd
+
+# Events of the study (without the arm), and the suffix of their field names
+EVENT_SUFFIXES = {
+    'screening': '_screen',
+    'baseline': '_base',
+    '6month_followup': '_6m',
+    '12month_followup': '_12m',
+    '18month_followup': '_18m',
+}
+
+FIELD_TYPES = [('radio', None), ('dropdown', None), ('checkbox', None), ('text', 'integer'), ('text', 'number'),
+               ('text', 'date_ymd'), ('text', None), ('yesno', None)]
+
+CHOICES = '1, A | 2, B | 3, C'
+
+
+def make_variables(n_forms: int = 10, fields_per_form: int = 20, n_events: int = 4, seed: int = 0) -> pd.DataFrame:
+    """
+    Build a raw data dictionary, as exported by the REDCap API.
+
+    Args:
+        n_forms (int): Number of questionnaires at each event after screening.
+        fields_per_form (int): Number of fields of each form.
+        n_events (int): Number of events, including screening (at most len(EVENT_SUFFIXES)).
+        seed (int): Random seed.
+
+    Returns:
+        pd.DataFrame: Data dictionary, starting with the record ID field.
+    """
+    if not 2 <= n_events <= len(EVENT_SUFFIXES):
+        raise ValueError(f'n_events must be between 2 and {len(EVENT_SUFFIXES)}, got {n_events}.')
+    rng = np.random.default_rng(seed)
+    types = [FIELD_TYPES[i] for i in rng.integers(0, len(FIELD_TYPES), fields_per_form * (n_forms + 1))]
+    rows = [('study_id', 'participant_information', 'text', None, None)]
+    for event, suffix in list(EVENT_SUFFIXES.items())[:n_events]:
+        forms = ['screening'] if event == 'screening' else [f'{event}_q{i}' for i in range(n_forms)]
+        for form in forms:
+            # The fields of a questionnaire have the same names and types at every event, except for the suffix
+            form_index = 0 if form == 'screening' else int(form.rsplit('_q', 1)[1]) + 1
+            prefix = 'scr' if form == 'screening' else f'q{form_index}'
+            for j in range(fields_per_form):
+                field_type, validation = types[form_index * fields_per_form + j]
+                rows.append((f'{prefix}_{j}{suffix}', form, field_type,
+                             CHOICES if field_type in ('radio', 'dropdown', 'checkbox') else None, validation))
+    variables = pd.DataFrame(rows, columns=['field_name', 'form_name', 'field_type', 'select_choices_or_calculations',
+                                            'text_validation_type_or_show_slider_number'])
+    variables.insert(2, 'section_header', np.where(variables.index % 10 == 1, '<b>Section</b>', None))
+    variables.insert(4, 'field_label', '<p>Question ' + variables.field_name + '</p>')
+    return variables
+
+
+def make_report(variables: pd.DataFrame, n_participants: int, sparsity: float = 0.2, seed: int = 1) -> pd.DataFrame:
+    """
+    Build a raw report with one row per participant and event, in which each row fills the forms of its event.
+
+    Args:
+        variables (pd.DataFrame): Raw data dictionary (see make_variables).
+        n_participants (int): Number of participants.
+        sparsity (float): Fraction of unanswered fields in the forms of each event.
+        seed (int): Random seed.
+
+    Returns:
+        pd.DataFrame: Report with the columns of the data dictionary, as text ('' for empty cells).
+    """
+    rng = np.random.default_rng(seed)
+    values = {
+        'radio': lambda n: rng.integers(1, 4, n).astype(str),
+        'dropdown': lambda n: rng.integers(1, 4, n).astype(str),
+        'yesno': lambda n: rng.integers(0, 2, n).astype(str),
+        'integer': lambda n: rng.integers(0, 100, n).astype(str),
+        'number': lambda n: np.round(rng.random(n) * 100, 2).astype(str),
+        'date_ymd': lambda n: np.full(n, '2025-07-17'),
+        'text': lambda n: np.full(n, 'free text answer'),
+    }
+    events = [event for event, suffix in EVENT_SUFFIXES.items()
+              if variables.field_name.str.endswith(suffix).any()]
+    n_rows = n_participants * len(events)
+    row_events = np.tile(events, n_participants)
+    columns = {'study_id': np.repeat([f'abd{i:06d}' for i in range(n_participants)], len(events)),
+               'redcap_event_name': np.char.add(row_events.astype(str), '_arm_1')}
+    form_events = {}
+    for field in variables.iloc[1:].itertuples():
+        event = next(event for event in events if field.field_name.endswith(EVENT_SUFFIXES[event]))
+        form_events[field.form_name] = event
+        filled = (row_events == event) & (rng.random(n_rows) >= sparsity)
+        validation = field.text_validation_type_or_show_slider_number
+        kind = validation if isinstance(validation, str) else field.field_type
+        names = [f'{field.field_name}___{code}' for code in (1, 2, 3)] if field.field_type == 'checkbox' \
+            else [field.field_name]
+        for name in names:
+            column = np.full(n_rows, '', dtype=object)
+            column[filled] = values.get(kind, values['yesno'])(filled.sum())
+            columns[name] = column
+    for form, event in form_events.items():
+        columns[f'{form}_complete'] = np.where(row_events == event, '2', '')
+    return pd.DataFrame(columns)
+
+
+def make_report_csv(variables: pd.DataFrame, n_participants: int, sparsity: float = 0.2, seed: int = 1) -> str:
+    """Build a raw report (see make_report), as exported by the REDCap API in CSV format."""
+    return make_report(variables, n_participants, sparsity=sparsity, seed=seed).to_csv(index=False)
+
+
+def make_cleaned_report(n_participants: int, n_columns: int, events_per_participant: int = 4,
+                        sparsity: float = 0.7, seed: int = 0) -> pd.DataFrame:
+    """
+    Build a synthetic cleaned report with one screening row and several questionnaire rows per participant.
+
+    Args:
+        n_participants (int): Number of participants.
+        n_columns (int): Number of answer columns.
+        events_per_participant (int): Number of rows per participant (the first one is the screening).
+        sparsity (float): Fraction of empty cells.
+        seed (int): Random seed.
+
+    Returns:
+        pd.DataFrame: Synthetic cleaned report.
+    """
+    rng = np.random.default_rng(seed)
+    n_rows = n_participants * events_per_participant
+    values = rng.integers(0, 5, size=(n_rows, n_columns)).astype(float)
+    values[rng.random((n_rows, n_columns)) < sparsity] = np.nan
+    df = pd.DataFrame(values, columns=[f'field_{i}' for i in range(n_columns)])
+    df.insert(0, 'participant_id', np.repeat([f'abd{i:05d}' for i in range(n_participants)], events_per_participant))
+    df.insert(1, 'redcap_event_name', np.tile(['screening'] + ['baseline'] * (events_per_participant - 1),
+                                              n_participants))
+    df['output_form'] = np.where(df.redcap_event_name == 'screening', 'Scre', 'Ques')
+    return df
+
+
+def make_wide_frame(n_rows: int, n_columns: int, duplicate_fraction: float = 0.5, sparsity: float = 0.8,
+                    text_fraction: float = 0.2, seed: int = 0) -> pd.DataFrame:
+    """
+    Build a synthetic wide report with duplicated column names, similar to a report after field renaming.
+
+    Args:
+        n_rows (int): Number of rows.
+        n_columns (int): Number of columns (before merging).
+        duplicate_fraction (float): Fraction of columns that share their name with another column.
+        sparsity (float): Fraction of empty cells.
+        text_fraction (float): Fraction of unique fields holding free text instead of numeric codes.
+        seed (int): Random seed.
+
+    Returns:
+        pd.DataFrame: Synthetic DataFrame.
+    """
+    rng = np.random.default_rng(seed)
+    n_unique = n_columns - int(n_columns * duplicate_fraction)
+    names = [f'field_{i}' for i in range(n_unique)]
+    names += [f'field_{i}' for i in rng.integers(0, n_unique, size=n_columns - n_unique)]
+    text_fields = set(rng.choice(n_unique, size=int(n_unique * text_fraction), replace=False))
+
+    columns = []
+    for name in names:
+        values = pd.Series(rng.integers(0, 5, size=n_rows).astype(float))
+        if int(name.split('_')[1]) in text_fields:
+            values = 'answer ' + values.astype(int).astype(str)
+        columns.append(values.mask(rng.random(n_rows) < sparsity))
+    df = pd.concat(columns, axis=1)
+    df.columns = names
+    return df
@@ -0,0 +1,164 @@
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .config.properties import BatchProperties, Properties, load_batch_properties
+from .main import configure_logging, run_download
+
+if TYPE_CHECKING:
+    import requests
+
+BATCH_LOG_FORMAT = '%(asctime)s - %(threadName)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def create_sessions(batch: BatchProperties) -> dict[str, 'requests.Session']:
+    """
+    Create one pooled HTTP session per REDCap server of a batch, shared by all the jobs of that server.
+
+    The pool of each session is large enough for the jobs running at the same time to use their own pool size.
+
+    Args:
+        batch (BatchProperties): Properties of the batch.
+
+    Returns:
+        dict: Session of each API URL.
+    """
+    from .redcap_api.redcap import create_session
+
+    sessions = {}
+    for api_url in {properties.api_url for properties in batch.jobs.values()}:
+        server_jobs = [properties for properties in batch.jobs.values() if properties.api_url == api_url]
+        pool_size = min(len(server_jobs), batch.max_concurrent_jobs) * max(job.pool_size for job in server_jobs)
+        sessions[api_url] = create_session(server_jobs[0], pool_size=pool_size)
+    return sessions
+
+
+def run_job(name: str, properties: Properties, session: 'requests.Session' = None) -> dict:
+    """
+    Run one download job of a batch, without letting its errors stop the other jobs.
+
+    The thread running the job is named after it, so that the log records of concurrent jobs can be told apart.
+
+    Args:
+        name (str): Name of the job.
+        properties (Properties): Properties of the job.
+        session (requests.Session): HTTP session shared with the other jobs of the same REDCap server.
+
+    Returns:
+        dict: Name, report ID, download directory, status ('ok' or 'failed'), error and stage timings of the job.
+    """
+    logger = logging.getLogger('batch')
+    thread = threading.current_thread()
+    thread_name, thread.name = thread.name, name
+    result = {'name': name, 'report_id': properties.report_id, 'download_dir': str(properties.download_folder),
+              'status': 'ok', 'error': None, 'timings': {}}
+    start = time.perf_counter()
+    try:
+        result['timings'] = run_download(properties, session=session)
+    except Exception as e:
+        logger.exception(f'Job {name} failed.')
+        result['status'] = 'failed'
+        result['error'] = str(e)
+        result['timings'] = {'total': time.perf_counter() - start}
+    finally:
+        thread.name = thread_name
+    return result
+
+
+def run_batch(batch: BatchProperties) -> list[dict]:
+    """
+    Run all the download jobs of a batch in one process, at most max_concurrent_jobs at the same time.
+
+    Jobs targeting the same REDCap server share one HTTP session, so that connections are reused across jobs.
+
+    Args:
+        batch (BatchProperties): Properties of the batch.
+
+    Returns:
+        list: Result of each job (see run_job), in the order of the properties file.
+    """
+    sessions = create_sessions(batch)
+    try:
+        with ThreadPoolExecutor(max_workers=batch.max_concurrent_jobs, thread_name_prefix='batch') as executor:
+            futures = [executor.submit(run_job, name, properties, sessions[properties.api_url])
+                       for name, properties in batch.jobs.items()]
+            return [future.result() for future in futures]
+    finally:
+        for session in sessions.values():
+            session.close()
+
+
+def format_timing_report(results: list[dict]) -> str:
+    """
+    Format the results of a batch as a table of stage timings.
+
+    Args:
+        results (list): Result of each job (see run_job).
+
+    Returns:
+        str: One line per job, with its status and the duration (in seconds) of each stage.
+    """
+    stages = list(dict.fromkeys(stage for result in results for stage in result['timings'] if stage != 'total'))
+    columns = ['job', 'status', *stages, 'total']
+    rows = [[result['name'], result['status'],
+             *(f"{result['timings'][stage]:.2f}" if stage in result['timings'] else '-' for stage in columns[2:])]
+            for result in results]
+    widths = [max(len(str(row[i])) for row in [columns, *rows]) for i in range(len(columns))]
+    return '\n'.join('  '.join(str(value).ljust(width) for value, width in zip(row, widths))
+                     for row in [columns, *rows])
+
+
+def save_timing_report(results: list[dict], file_path: Path, started: datetime, wall_time: float):
+    """
+    Save the consolidated timing report of a batch as JSON.
+
+    Args:
+        results (list): Result of each job (see run_job).
+        file_path (Path): Path of the JSON file.
+        started (datetime): Start time of the batch.
+        wall_time (float): Duration (in seconds) of the whole batch.
+
+    Returns:
+        None
+    """
+    report = {
+        'started': started.isoformat(timespec='seconds'),
+        'wall_time': wall_time,
+        'jobs_time': sum(result['timings'].get('total', 0) for result in results),
+        'failed': [result['name'] for result in results if result['status'] != 'ok'],
+        'jobs': results
+    }
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    file_path.write_text(json.dumps(report, indent=2))
+
+
+def main():
+    # Load properties
+    batch = load_batch_properties()
+
+    # Configure the logger
+    log_file = batch.batch_report.parent / f"batch_{datetime.now().strftime('%Y%m%d')}.log"
+    configure_logging(log_file, batch.log_level, log_format=BATCH_LOG_FORMAT)
+
+    logger = logging.getLogger('batch')
+    logger.info(f'Running {len(batch.jobs)} download jobs, {batch.max_concurrent_jobs} at a time.')
+
+    started = datetime.now()
+    start = time.perf_counter()
+    results = run_batch(batch)
+    wall_time = time.perf_counter() - start
+
+    save_timing_report(results, batch.batch_report, started, wall_time)
+    logger.info(f'Batch completed in {wall_time:.2f} s:\n{format_timing_report(results)}')
+    logger.info(f'Saved timing report to {batch.batch_report}')
+    if any(result['status'] != 'ok' for result in results):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
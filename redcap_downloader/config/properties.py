@@ -11,25 +11,113 @@ class Properties():
         download_folder (str): Directory where downloaded data will be stored.
         report_id (int): ID of the report to fetch from REDCap.
         log_level (str): Logging level for the application.
+        stream_download (bool): Whether to stream the report from the API instead of buffering the whole response.
+        api_url (str): URL of the REDCap API.
+        pool_size (int): Maximum number of pooled HTTP connections to the REDCap server.
+        connect_timeout (float): Timeout (in seconds) to establish a connection to the REDCap server.
+        read_timeout (float): Timeout (in seconds) between two bytes received from the REDCap server.
+        max_retries (int): Number of times a request is retried after a connection error, a 429 or a 5xx response.
+        backoff_factor (float): Exponential backoff factor (in seconds) between retries.
+        batch_size (int): Number of records exported per request (0 to export the whole report in one request).
+        max_workers (int): Number of record batches exported concurrently.
+        incremental (bool): Whether to only download the records modified since the last successful download.
+        writer_backend (str): How cleaned files are written: 'serial', 'thread' or 'process'.
+        writer_workers (int): Number of threads or processes writing cleaned files.
+        output_format (str): Format of the saved data files: 'csv', 'parquet' or 'feather'.
+        partitioned_reports (bool): Whether to save the reports as one Parquet dataset partitioned by participant
+            and questionnaire, instead of one file per participant and questionnaire.
+        unchanged_files (str): What to do with cleaned files whose content did not change since the last run:
+            'write' them again, 'skip' them, or 'link' them to the previous file.
+        variables_cache (bool): Whether to cache the cleaned variables while the data dictionary does not change.
+        metadata_cache_days (float): Maximum age (in days) of the cached data dictionary (0 to disable the cache).
+        concurrent_download (bool): Whether to download the report while the variables are processed.
+        report_schema (bool): Whether to parse the report with dtypes derived from the data dictionary.
+        sparse_reports (bool): Whether to clean the report in long format, only keeping its non-empty values.
+        existing_dir (str): What to do if the download directory is not empty: 'ask' the user (only if running in a
+            terminal, otherwise fail), 'overwrite' its files, 'fail', or download to a new 'version' of the directory.
+        staged_output (bool): Whether to save each run to a new snapshot directory, published at the end of the run.
+        profile (bool): Whether to trace the peak memory of each step and profile the download with cProfile.
+        memory_limit (float): Approximate memory (in MB) available to clean the report, which is then cleaned in
+            partitions of participants (0 to clean the whole report in memory).
     """
     def __init__(self,
                  redcap_token_file: str | Path = None,
                  download_folder: str | Path = '../downloaded_data',
                  report_id: int | None = None,
-                 log_level: str = 'INFO'
+                 log_level: str = 'INFO',
+                 stream_download: bool = True,
+                 api_url: str = 'https://redcap.usher.ed.ac.uk/api/',
+                 pool_size: int = 4,
+                 connect_timeout: float = 10,
+                 read_timeout: float = 600,
+                 max_retries: int = 5,
+                 backoff_factor: float = 1,
+                 batch_size: int = 0,
+                 max_workers: int = 4,
+                 incremental: bool = False,
+                 writer_backend: str = 'serial',
+                 writer_workers: int = 4,
+                 output_format: str = 'csv',
+                 partitioned_reports: bool = False,
+                 unchanged_files: str = 'write',
+                 variables_cache: bool = False,
+                 metadata_cache_days: float = 0,
+                 concurrent_download: bool = True,
+                 report_schema: bool = False,
+                 sparse_reports: bool = False,
+                 existing_dir: str = 'ask',
+                 staged_output: bool = False,
+                 profile: bool = False,
+                 memory_limit: float = 0
                  ):
 
         self.redcap_token_file = Path(redcap_token_file or './redcap_token.txt')
         self.download_folder = Path(download_folder or '../downloaded_data')
         self.report_id = report_id
         self.log_level = log_level
+        self.stream_download = stream_download
+        self.api_url = api_url
+        self.pool_size = int(pool_size)
+        self.connect_timeout = float(connect_timeout)
+        self.read_timeout = float(read_timeout)
+        self.max_retries = int(max_retries)
+        self.backoff_factor = float(backoff_factor)
+        self.batch_size = int(batch_size)
+        self.max_workers = int(max_workers)
+        self.incremental = incremental
+        self.writer_backend = writer_backend
+        self.writer_workers = int(writer_workers)
+        self.output_format = output_format
+        self.partitioned_reports = partitioned_reports
+        self.unchanged_files = unchanged_files
+        self.variables_cache = variables_cache
+        self.metadata_cache_days = float(metadata_cache_days)
+        self.concurrent_download = concurrent_download
+        self.report_schema = report_schema
+        self.sparse_reports = sparse_reports
+        self.existing_dir = existing_dir
+        self.staged_output = staged_output
+        self.profile = profile
+        self.memory_limit = float(memory_limit)
         with self.redcap_token_file.open('r') as f:
             self.redcap_token = f.readline().strip(' \t\n\r')
 
     def __str__(self):
         return f"Properties(redcap_token_file={self.redcap_token_file}, " \
                f"download_folder={self.download_folder}, report_id={self.report_id}, " \
-               f"log_level={self.log_level})"
+               f"log_level={self.log_level}, stream_download={self.stream_download}, " \
+               f"api_url={self.api_url}, pool_size={self.pool_size}, " \
+               f"connect_timeout={self.connect_timeout}, read_timeout={self.read_timeout}, " \
+               f"max_retries={self.max_retries}, backoff_factor={self.backoff_factor}, " \
+               f"batch_size={self.batch_size}, max_workers={self.max_workers}, " \
+               f"incremental={self.incremental}, writer_backend={self.writer_backend}, " \
+               f"writer_workers={self.writer_workers}, output_format={self.output_format}, " \
+               f"partitioned_reports={self.partitioned_reports}, unchanged_files={self.unchanged_files}, " \
+               f"variables_cache={self.variables_cache}, metadata_cache_days={self.metadata_cache_days}, " \
+               f"concurrent_download={self.concurrent_download}, report_schema={self.report_schema}, " \
+               f"sparse_reports={self.sparse_reports}, existing_dir={self.existing_dir}, " \
+               f"staged_output={self.staged_output}, profile={self.profile}, " \
+               f"memory_limit={self.memory_limit})"
 
 
 def load_application_properties(file_path: str | Path = './REDCap_downloader.properties'):
@@ -42,6 +130,22 @@ def load_application_properties(file_path: str | Path = './REDCap_downloader.pro
     Returns:
         Properties: An instance of the Properties class containing the loaded properties.
 
+    Raises:
+        ValueError: If the properties file does not exist or is not readable.
+    """
+    return load_section_properties(read_properties_file(file_path)['DEFAULT'])
+
+
+def read_properties_file(file_path: str | Path) -> configparser.ConfigParser:
+    """
+    Read a properties file.
+
+    Args:
+        file_path (str): Path to the properties file.
+
+    Returns:
+        configparser.ConfigParser: Parsed properties file.
+
     Raises:
         ValueError: If the properties file does not exist or is not readable.
     """
@@ -51,9 +155,112 @@ def load_application_properties(file_path: str | Path = './REDCap_downloader.pro
         config.read(file_path)
     else:
         raise ValueError(f"Properties file not found: {file_path}.")
+    return config
+
+
+def load_section_properties(section: configparser.SectionProxy) -> Properties:
+    """
+    Load application properties from a section of a properties file.
+
+    Settings missing from the section are taken from the DEFAULT section, then from the defaults of Properties.
+
+    Args:
+        section (configparser.SectionProxy): Section of the properties file.
+
+    Returns:
+        Properties: An instance of the Properties class containing the loaded properties.
+    """
     return Properties(
-        redcap_token_file=config['DEFAULT'].get('token-file', None),
-        download_folder=config['DEFAULT'].get('download-dir', None),
-        report_id=config['DEFAULT'].get('report-id', None),
-        log_level=config['DEFAULT'].get('log-level', 'INFO')
+        redcap_token_file=section.get('token-file', None),
+        download_folder=section.get('download-dir', None),
+        report_id=section.get('report-id', None),
+        log_level=section.get('log-level', 'INFO'),
+        stream_download=section.getboolean('stream-download', True),
+        api_url=section.get('api-url', 'https://redcap.usher.ed.ac.uk/api/'),
+        pool_size=section.getint('pool-size', 4),
+        connect_timeout=section.getfloat('connect-timeout', 10),
+        read_timeout=section.getfloat('read-timeout', 600),
+        max_retries=section.getint('max-retries', 5),
+        backoff_factor=section.getfloat('backoff-factor', 1),
+        batch_size=section.getint('batch-size', 0),
+        max_workers=section.getint('max-workers', 4),
+        incremental=section.getboolean('incremental', False),
+        writer_backend=section.get('writer-backend', 'serial'),
+        writer_workers=section.getint('writer-workers', 4),
+        output_format=section.get('output-format', 'csv'),
+        partitioned_reports=section.getboolean('partitioned-reports', False),
+        unchanged_files=section.get('unchanged-files', 'write'),
+        variables_cache=section.getboolean('variables-cache', False),
+        metadata_cache_days=section.getfloat('metadata-cache-days', 0),
+        concurrent_download=section.getboolean('concurrent-download', True),
+        report_schema=section.getboolean('report-schema', False),
+        sparse_reports=section.getboolean('sparse-reports', False),
+        existing_dir=section.get('existing-dir', 'ask'),
+        staged_output=section.getboolean('staged-output', False),
+        profile=section.getboolean('profile', False),
+        memory_limit=section.getfloat('memory-limit', 0)
+    )
+
+
+class BatchProperties():
+    """
+    Represents the properties of a batch of downloads, read from the sections of a configuration file.
+
+    Each section other than DEFAULT is one job (one report of one project), whose settings default to those of the
+    DEFAULT section. Jobs run unattended, so the ones left with the 'ask' existing-dir policy fail on a non-empty
+    download directory instead of prompting the user.
+
+    Attributes:
+        jobs (dict): Properties of each job, by section name.
+        max_concurrent_jobs (int): Maximum number of jobs running at the same time.
+        log_level (str): Logging level of the batch.
+        batch_report (Path): Path of the JSON file where the timing report of the batch is saved.
+    """
+    def __init__(self,
+                 jobs: dict[str, Properties],
+                 max_concurrent_jobs: int = 2,
+                 log_level: str = 'INFO',
+                 batch_report: str | Path = './batch_report.json'
+                 ):
+        if not jobs:
+            raise ValueError("No download job defined: add one [section] per report to the properties file.")
+        download_folders = [properties.download_folder.resolve() for properties in jobs.values()]
+        if len(set(download_folders)) < len(download_folders):
+            raise ValueError("Every download job must have its own download-dir.")
+        if int(max_concurrent_jobs) < 1:
+            raise ValueError(f"max-concurrent-jobs must be at least 1, got {max_concurrent_jobs}.")
+        if int(max_concurrent_jobs) > 1 and any(properties.profile for properties in jobs.values()):
+            raise ValueError("Profiling is process-wide: set max-concurrent-jobs to 1 to profile batch jobs.")
+        for properties in jobs.values():
+            if properties.existing_dir == 'ask':
+                properties.existing_dir = 'fail'
+        self.jobs = jobs
+        self.max_concurrent_jobs = int(max_concurrent_jobs)
+        self.log_level = log_level
+        self.batch_report = Path(batch_report or './batch_report.json')
+
+    def __str__(self):
+        return f"BatchProperties(jobs={list(self.jobs)}, max_concurrent_jobs={self.max_concurrent_jobs}, " \
+               f"log_level={self.log_level}, batch_report={self.batch_report})"
+
+
+def load_batch_properties(file_path: str | Path = './REDCap_downloader.properties') -> BatchProperties:
+    """
+    Load the properties of a batch of downloads from a configuration file.
+
+    Args:
+        file_path (str): Path to the properties file.
+
+    Returns:
+        BatchProperties: An instance of the BatchProperties class containing the properties of every job.
+
+    Raises:
+        ValueError: If the properties file does not exist, or does not define valid jobs.
+    """
+    config = read_properties_file(file_path)
+    return BatchProperties(
+        jobs={name: load_section_properties(config[name]) for name in config.sections()},
+        max_concurrent_jobs=config['DEFAULT'].getint('max-concurrent-jobs', 2),
+        log_level=config['DEFAULT'].get('log-level', 'INFO'),
+        batch_report=config['DEFAULT'].get('batch-report', None)
     )
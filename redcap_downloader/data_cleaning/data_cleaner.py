@@ -1,13 +1,34 @@
-from functools import reduce
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import hashlib
+import json
 import logging
+from pathlib import Path
 import numpy as np
 import pandas as pd
 
+from ..profiling import profiled
 from ..redcap_api.redcap import REDCap, Variables, Report
+from ..redcap_api.schema import ReportSchema
+from ..storage.atomic import atomic_write
+from ..storage.formats import read_table
+from ..storage.manifest import Manifest, hash_table
+from ..storage.partitions import ReportPartitioner
 from ..storage.path_resolver import PathResolver
-from .helpers import replace_strings, merge_duplicate_columns
+from ..storage.sync_state import SyncState
+from ..storage.writer import GroupWriter
+from ..version import get_version
+from .helpers import StringReplacer, merge_duplicate_columns, strip_html_tags
+from .plan import CleaningPlan
+from .sparse import SparseTable
 from .replacements import FORM_NAME_REPLACEMENTS, FIELD_NAME_REPLACEMENTS, ARM_NAME_REPLACEMENTS
 
+FORM_NAME_REPLACER = StringReplacer(FORM_NAME_REPLACEMENTS)
+FIELD_NAME_REPLACER = StringReplacer(FIELD_NAME_REPLACEMENTS)
+ARM_NAME_REPLACER = StringReplacer(ARM_NAME_REPLACEMENTS)
+VARIABLES_COLUMNS = ['field_name', 'form_name', 'section_header', 'field_type', 'field_label']
+
 
 class DataCleaner:
     """
@@ -16,81 +37,392 @@ class DataCleaner:
     Attributes:
         redcap (REDCap): Instance of the REDCap API client.
         paths (PathResolver): Instance of PathResolver to manage file paths.
+        incremental (bool): Whether to only download and save the records modified since the last download.
+        writer (GroupWriter): Writer running the per-participant file writes.
+        partitioned (bool): Whether to save the reports as one partitioned Parquet dataset instead of one file per
+            participant and questionnaire.
+        manifest (Manifest): Manifest used to skip or link the files whose content did not change since the last run.
+        variables_cache (bool): Whether to cache the cleaned variables, and reuse them while the data dictionary
+            does not change, along with the cleaning plan of the report header.
+        report_schema (bool): Whether to parse the reports with dtypes derived from the data dictionary.
+        sparse (bool): Whether to clean the reports in long format (see SparseTable), only converting them back to
+            wide format per participant and questionnaire.
+        memory_limit (float): Approximate memory (in MB) available to clean the reports. If set, the raw report is
+            downloaded to a file, then cleaned and saved in partitions of participants that fit in this memory (0 to
+            clean the whole report in memory).
 
     Methods:
-        save_questionnaire_variables(): Cleans and saves questionnaire variables.
+        save_questionnaire_data(): Cleans and saves questionnaire variables while the reports are being downloaded,
+            then cleans and saves the reports.
+        save_questionnaire_variables(variables): Cleans and saves questionnaire variables.
         save_questionnaire_reports(): Cleans and saves questionnaire reports.
+        download_raw_report(): Downloads the raw report to the raw directory, without parsing it.
+        get_report_schema(variables): Returns the dtypes of the report columns, if the report schema is enabled.
+        get_variables_cache_key(variables): Returns the key of the cleaned variables in the cache.
+        get_cleaning_plan(columns): Returns the cleaning plan of a report header.
     """
-    def __init__(self, redcap: REDCap, paths: PathResolver):
+    # Overlap between incremental downloads, since REDCap compares the time of the last download, taken from the
+    # local clock, with its own clock
+    SYNC_MARGIN = timedelta(hours=1)
+
+    def __init__(self, redcap: REDCap, paths: PathResolver, incremental: bool = False, writer: GroupWriter = None,
+                 partitioned: bool = False, manifest: Manifest = None, variables_cache: bool = False,
+                 report_schema: bool = False, sparse: bool = False, memory_limit: float = 0):
+        if incremental and memory_limit > 0:
+            raise ValueError('Incremental downloads merge the previous report in memory, and cannot be combined with '
+                             'a memory limit.')
         self._logger = logging.getLogger('DataCleaner')
         self.redcap = redcap
         self.paths = paths
-
-    def save_questionnaire_variables(self):
+        self.incremental = incremental
+        self.writer = writer or GroupWriter()
+        self.partitioned = partitioned
+        self.manifest = manifest
+        self.variables_cache = variables_cache
+        self.report_schema = report_schema
+        self.sparse = sparse
+        self.memory_limit = memory_limit
+        self._schema = None
+        self._plan = None
+
+    @profiled()
+    def save_questionnaire_variables(self, variables: Variables = None):
         """
         Clean-up and save questionnaire variables from REDCap.
 
         Args:
-            None
+            variables (Variables): Raw variables, if already fetched. They are fetched from REDCap if not given.
 
         Returns:
             None
 
         """
-        variables = self.redcap.get_questionnaire_variables()
+        variables = variables or self.redcap.get_questionnaire_variables()
+        self.get_report_schema(variables)
         variables.save_raw_data(paths=self.paths)
 
         variables = self.clean_variables(variables)
-        variables.save_cleaned_data(paths=self.paths, by='output_form', remove_empty_columns=True)
+        variables.save_cleaned_data(paths=self.paths, by='output_form', remove_empty_columns=True, writer=self.writer,
+                                    manifest=self.manifest)
         self._logger.info(f'Saved cleaned questionnaire variables to {self.paths.get_meta_dir()}.')
 
+    @profiled()
+    def save_questionnaire_data(self):
+        """
+        Clean-up and save questionnaire variables and reports from REDCap, downloading both concurrently.
+
+        The report is downloaded in a background thread while the variables are downloaded, cleaned and saved, so
+        that the report download is the only step on the critical path before the reports are cleaned. If the report
+        schema is enabled, the variables are downloaded first, since the schema is derived from them. With a memory
+        limit, the report is downloaded to a file, and cleaned in partitions once the variables are saved.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        sync_start = datetime.now()
+        state = SyncState(self.paths.get_sync_state_file()) if self.incremental else None
+        # Create the raw directory before both threads write to it
+        self.paths.get_raw_dir()
+        variables = self.redcap.get_questionnaire_variables() if self.report_schema else None
+        schema = self.get_report_schema(variables)
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='report-download') as executor:
+            # The download runs in the context of this thread, so that its stages are profiled with the others
+            if self.memory_limit > 0:
+                report_download = executor.submit(contextvars.copy_context().run, self.download_raw_report)
+            else:
+                report_download = executor.submit(contextvars.copy_context().run, self.fetch_questionnaire_reports,
+                                                  state, schema)
+            self.save_questionnaire_variables(variables)
+            reports = report_download.result()
+        if self.memory_limit > 0:
+            self._save_report_partitions(reports, schema)
+        else:
+            self._save_reports(reports, state, sync_start)
+
+    @profiled()
     def save_questionnaire_reports(self):
         """
         Clean-up and save questionnaire reports from REDCap.
 
+        In incremental mode, only the records modified since the last successful download are fetched and merged
+        into the previous raw report, and only the files of the affected participants are regenerated. With a memory
+        limit, the report is downloaded to a file, then cleaned and saved in partitions of participants.
+
         Args:
             None
 
         Returns:
             None
         """
-        reports = self.redcap.get_questionnaire_report()
+        if self.memory_limit > 0:
+            self._save_report_partitions(self.download_raw_report(), self.get_report_schema())
+            return
+        sync_start = datetime.now()
+        state = SyncState(self.paths.get_sync_state_file()) if self.incremental else None
+        self._save_reports(self.fetch_questionnaire_reports(state, self.get_report_schema()), state, sync_start)
+
+    def get_report_schema(self, variables: Variables = None) -> ReportSchema | None:
+        """
+        Get the dtypes of the report columns, derived from the raw data dictionary.
+
+        The schema is built once, from the given variables or from variables fetched from REDCap.
+
+        Args:
+            variables (Variables): Raw variables, if already fetched.
+
+        Returns:
+            ReportSchema: Schema of the reports. None if the report schema is not enabled.
+        """
+        if not self.report_schema:
+            return None
+        if self._schema is None:
+            variables = variables or self.redcap.get_questionnaire_variables()
+            self._schema = ReportSchema.from_variables(variables.raw_data)
+            self._logger.info(f'Derived report schema from the data dictionary: {self._schema}.')
+        return self._schema
+
+    def get_cleaning_plan(self, columns: list[str]) -> CleaningPlan:
+        """
+        Get the cleaning plan of a report header (see CleaningPlan).
+
+        The plan is compiled once per header and reused for the following frames with the same header. If the
+        variables cache is enabled, it is also cached in the cache directory for the next runs.
+
+        Args:
+            columns (list): Column names of the raw report.
+
+        Returns:
+            CleaningPlan: Plan of the header.
+        """
+        if self._plan is None or self._plan.key != CleaningPlan.get_key(columns, FIELD_NAME_REPLACER):
+            if self.variables_cache:
+                self._plan = CleaningPlan.load(self.paths.get_cache_dir(), columns, FIELD_NAME_REPLACER)
+            else:
+                self._plan = CleaningPlan.compile(columns, FIELD_NAME_REPLACER)
+        return self._plan
+
+    def fetch_questionnaire_reports(self, state: SyncState = None, schema: ReportSchema = None) -> Report | None:
+        """
+        Fetch the questionnaire reports from REDCap, or only the records modified since the last download.
+
+        Args:
+            state (SyncState): State of the last successful download, in incremental mode.
+            schema (ReportSchema): Optional dtypes of the report columns.
+
+        Returns:
+            Report: Report instance containing the raw data. None if no record was modified since the last download.
+        """
+        if state is not None and state.can_resume():
+            return self.get_updated_report(state, schema)
+        return self._get_full_report(schema)
+
+    def _get_full_report(self, schema: ReportSchema = None) -> Report:
+        # The raw report can only be spooled while it is downloaded if it is saved as CSV
+        raw_file = self.paths.get_raw_report_file() if self.paths.file_format == 'csv' else None
+        return self.redcap.get_questionnaire_report(raw_file=raw_file, schema=schema)
+
+    def _save_reports(self, reports: Report | None, state: SyncState | None, sync_start: datetime):
+        if reports is None:
+            state.update(sync_start, state.raw_file)
+            return
+        # A merged report only holds the modified records in its data, and builds on a report that was checked
+        resumable = state is not None and (reports.data is not reports.raw_data or self._is_complete(reports))
         reports.save_raw_data(paths=self.paths)
 
-        reports = self.clean_reports(reports)
-        reports.save_cleaned_data(self.paths, by=['participant_id', 'output_form'], remove_empty_columns=True)
+        self._save_cleaned_reports(self.clean_reports(reports))
         self._logger.info(f'Saved cleaned questionnaire reports to {self.paths.get_reports_dir()}.')
+        if resumable:
+            state.update(sync_start, self.paths.get_raw_report_file())
+        elif state is not None:
+            state.reset()
+
+    def _is_complete(self, reports: Report) -> bool:
+        """
+        Check that a full report contains every record of the project, so that modified records can be merged into it.
+
+        The records modified since the last download are exported with the record API, which does not apply the filter
+        of the report. Merging them into a filtered report would add the records the filter excludes.
+
+        Args:
+            reports (Report): Report downloaded in full.
 
+        Returns:
+            bool: Whether the report contains all the records of the project.
+        """
+        record_ids = set(reports.raw_data[self.redcap.RECORD_ID_FIELD].astype(str))
+        missing = [r for r in self.redcap.get_record_ids() if r not in record_ids]
+        if missing:
+            self._logger.warning(f'The report does not contain {len(missing)} records of the project, and is probably '
+                                 f'filtered: incremental downloads are disabled, the full report is downloaded on '
+                                 f'every run.')
+        return not missing
+
+    def _save_cleaned_reports(self, reports: Report):
+        if self.partitioned:
+            reports.save_partitioned_data(self.paths, partition_cols=['participant_id', 'output_form'])
+        else:
+            reports.save_cleaned_data(self.paths, by=['participant_id', 'output_form'], remove_empty_columns=True,
+                                      writer=self.writer, manifest=self.manifest)
+
+    def download_raw_report(self) -> Path:
+        """
+        Download the raw report to the raw directory as CSV, without parsing it.
+
+        The raw report is kept in CSV, the format it is exported in, whatever the format of the other files.
+
+        Args:
+            None
+
+        Returns:
+            Path: Path of the raw report.
+        """
+        return self.redcap.download_questionnaire_report(self.paths.get_raw_report_file(file_format='csv'))
+
+    def _save_report_partitions(self, raw_file: Path, schema: ReportSchema = None):
+        """
+        Clean and save the reports of a raw report file, one partition of participants at a time.
+
+        Column renaming and merging only depend on the column names, so cleaning each partition gives the same files
+        as cleaning the whole report. Only one partition is held in memory at a time.
+
+        Args:
+            raw_file (Path): CSV file of the raw report.
+            schema (ReportSchema): Optional dtypes of the report columns.
+
+        Returns:
+            None
+        """
+        partitioner = ReportPartitioner(raw_file, self.redcap.RECORD_ID_FIELD, self.memory_limit * 2 ** 20,
+                                        schema=schema, work_dir=self.paths.get_cache_dir())
+        n_partitions = 0
+        for data in partitioner.partitions():
+            self._save_cleaned_reports(self.clean_reports(Report(data, raw_file=raw_file)))
+            n_partitions += 1
+        self._logger.info(f'Saved cleaned questionnaire reports of {n_partitions} partitions to '
+                          f'{self.paths.get_reports_dir()}.')
+
+    def get_updated_report(self, state: SyncState, schema: ReportSchema = None) -> Report | None:
+        """
+        Fetch the records modified since the last download and merge them into the previous raw report.
+
+        Args:
+            state (SyncState): State of the last successful download.
+            schema (ReportSchema): Optional dtypes of the report columns.
+
+        Returns:
+            Report: Report whose raw data is the merged report, and whose data only contains the modified records.
+                The full report if the columns of the modified records differ from those of the previous report. None
+                if no record was modified.
+        """
+        record_id = self.redcap.RECORD_ID_FIELD
+        modified_ids = self.redcap.get_record_ids(modified_since=state.last_sync - self.SYNC_MARGIN)
+        if not modified_ids:
+            self._logger.info(f'No record modified since {state.last_sync}, nothing to update.')
+            return None
+
+        if schema is not None and state.raw_file.suffix == '.csv':
+            previous = schema.read_csv(state.raw_file)
+        else:
+            previous = read_table(state.raw_file)
+        updates = self.redcap.get_questionnaire_records(modified_ids, schema=schema).raw_data
+        if set(updates.columns) != set(previous.columns):
+            # The records are exported with all the fields of the questionnaire forms, and the report with its own
+            # fields: they only match while neither the report nor the data dictionary changed.
+            self._logger.warning(f'The columns of the modified records do not match those of {state.raw_file}, '
+                                 f'downloading the full report.')
+            return self._get_full_report(schema)
+        merged = pd.concat([previous[~previous[record_id].astype(str).isin(modified_ids)],
+                            updates[previous.columns]], ignore_index=True)
+        if schema is not None:
+            merged = schema.categorize(merged)
+        self._logger.info(f'Merged {len(modified_ids)} modified records into the report of {state.raw_file}.')
+
+        reports = Report(merged)
+        reports.data = merged[merged[record_id].astype(str).isin(modified_ids)]
+        return reports
+
+    @profiled()
     def clean_variables(self, variables: Variables) -> Variables:
         """
         Clean-up the variables DataFrame.
 
+        If the variables cache is enabled, the cleaned variables are saved in the cache directory, keyed by a hash of
+        the raw data dictionary and of the cleaning rules (see get_variables_cache_key), and reused as long as neither
+        changes. A cache file that cannot be read is ignored.
+
         Args:
             variables (Variables): Variables instance containing raw data.
 
         Returns:
             Variables: Variables instance with cleaned data added.
         """
+        cache_file = None
+        if self.variables_cache:
+            cache_file = self.paths.get_cache_dir() / f'variables_{self.get_variables_cache_key(variables)}.pkl'
+            if cache_file.exists():
+                try:
+                    variables.data = pd.read_pickle(cache_file)
+                    self._logger.info(f'Data dictionary unchanged, reusing cleaned variables from {cache_file}.')
+                    return variables
+                except Exception as e:
+                    self._logger.warning(f'Could not read the cached variables from {cache_file} ({e}), cleaning '
+                                         f'them again.')
+
         cleaned_var = (variables
                        .data
                        .query('form_name != "participant_information"')
-                       .pipe(self.remove_html_tags)
                        .pipe(self.filter_variables_columns)
+                       .pipe(self.remove_html_tags)
                        .pipe(self.clean_variables_form_names)
                        )
         variables.data = cleaned_var
+
+        if cache_file is not None:
+            for old_cache_file in cache_file.parent.glob('variables_*.pkl'):
+                old_cache_file.unlink()
+            atomic_write(cache_file, cleaned_var.to_pickle, mode='wb')
         return variables
 
+    @staticmethod
+    def get_variables_cache_key(variables: Variables) -> str:
+        """
+        Hash the raw data dictionary along with the rules cleaning it: kept columns, renaming rules, and the versions
+        of the package and of pandas (which cover the other cleaning steps and the format of the cache file).
+
+        Args:
+            variables (Variables): Variables instance containing raw data.
+
+        Returns:
+            str: Hexadecimal SHA-256 digest.
+        """
+        rules = json.dumps([VARIABLES_COLUMNS, FORM_NAME_REPLACER.replacements, FIELD_NAME_REPLACER.replacements,
+                            get_version(), pd.__version__])
+        return hashlib.sha256(f'{hash_table(variables.data)}{rules}'.encode()).hexdigest()
+
+    @profiled()
     def clean_reports(self, reports: Report) -> Report:
         """
         Clean-up the reports DataFrame.
 
+        In sparse mode, the cleaned data is saved in the sparse attribute of the report instead of its data.
+
         Args:
             reports (Report): Report instance containing raw data.
 
         Returns:
             Report: Report instance with cleaned data added.
         """
+        if self.sparse:
+            table = SparseTable.from_frame(reports.data, index_columns=[self.redcap.RECORD_ID_FIELD,
+                                                                        'redcap_event_name'])
+            reports.sparse = self.clean_sparse_reports(table)
+            reports.data = None
+            self._logger.info(f'Cleaned reports in long format: {reports.sparse}.')
+            return reports
+
         cleaned_reports = (reports
                            .data
                            .pipe(self.clean_reports_form_names)
@@ -99,6 +431,24 @@ class DataCleaner:
         reports.data = cleaned_reports
         return reports
 
+    @profiled()
+    def clean_sparse_reports(self, table: SparseTable) -> SparseTable:
+        """
+        Clean-up the reports in long format, with the same steps as clean_reports.
+
+        Args:
+            table (SparseTable): Report data in long format, with the record ID and event name as identifiers.
+
+        Returns:
+            SparseTable: Cleaned report data in long format.
+        """
+        plan = self.get_cleaning_plan(table.column_order)
+        return (self.clean_event_names(table)
+                .rename(plan.target)
+                .query('redcap_event_name != "initial_contact"')
+                )
+
+    @profiled()
     def clean_variables_form_names(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         Replace form names by human-readable names and merge researcher and participant forms.
@@ -111,33 +461,45 @@ class DataCleaner:
         """
         return (df
                 .assign(
-                    form_name=lambda df: replace_strings(df.form_name, FORM_NAME_REPLACEMENTS),
-                    field_name=lambda df: replace_strings(df.field_name, FIELD_NAME_REPLACEMENTS),
+                    form_name=lambda df: FORM_NAME_REPLACER.replace_series(df.form_name),
+                    field_name=lambda df: FIELD_NAME_REPLACER.replace_series(df.field_name),
                     output_form=lambda df: np.where(df.form_name == 'Screening', 'Scre', 'Ques')
                 )
                 .pipe(merge_duplicate_columns)
                 )
 
+    @profiled()
     def clean_reports_form_names(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         Clean-up the form and column names of the reports DataFrame.
 
+        Column names are cleaned with the cleaning plan of the report header (see get_cleaning_plan).
+
         Args:
             df (pd.DataFrame): DataFrame containing report data.
 
         Returns:
             pd.DataFrame: DataFrame with cleaned form and column names.
         """
-        return (df
-                .assign(redcap_event_name=lambda df: replace_strings(df.redcap_event_name, ARM_NAME_REPLACEMENTS),
-                        output_form=lambda df: np.where(df.redcap_event_name == 'screening', 'Scre', 'Ques')
-                        )
-                .rename(columns=lambda df: (
-                    reduce(lambda s, kv: s.replace(kv[0], kv[1]), FIELD_NAME_REPLACEMENTS.items(), df)
-                ))
-                .pipe(merge_duplicate_columns)
+        return (self.get_cleaning_plan(df.columns)
+                .apply(df)
+                .pipe(self.clean_event_names)
                 )
 
+    @profiled()
+    def clean_event_names(self, df: pd.DataFrame | SparseTable) -> pd.DataFrame | SparseTable:
+        """
+        Remove the arm from the event names, and add the output form (screening or questionnaire) of each row.
+
+        Args:
+            df (pd.DataFrame | SparseTable): Report data, in wide or long format.
+
+        Returns:
+            pd.DataFrame | SparseTable: Report data with cleaned event names and output forms.
+        """
+        return df.assign(redcap_event_name=lambda df: ARM_NAME_REPLACER.replace_series(df.redcap_event_name),
+                         output_form=lambda df: np.where(df.redcap_event_name == 'screening', 'Scre', 'Ques'))
+
     def filter_variables_columns(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         Remove unnecessary columns from the DataFrame.
@@ -148,20 +510,21 @@ class DataCleaner:
         Returns:
             pd.DataFrame: DataFrame with unnecessary columns removed.
         """
-        keep_cols = ['field_name', 'form_name', 'section_header', 'field_type', 'field_label']
-        return df[keep_cols].copy()
+        return df[VARIABLES_COLUMNS].copy()
 
     def remove_html_tags(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         Remove HTML tags from all string cells in a DataFrame.
 
+        Tags are stripped once per unique string of each text column.
+
         Args:
             df (pd.DataFrame): DataFrame to be processed.
 
         Returns:
             pd.DataFrame: DataFrame with HTML tags removed from string cells.
         """
-        return df.copy().assign(
-            **df.select_dtypes(include=['object'])
-            .replace(to_replace=r'<[^>]+>', value='', regex=True)
-        )
+        return df.assign(**{
+            column: strip_html_tags(df[column])
+            for column in df.select_dtypes(include=['object', 'string']).columns
+        })
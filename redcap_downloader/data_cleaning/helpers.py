@@ -1,5 +1,10 @@
+import re
+
+import numpy as np
 import pandas as pd
 
+from ..profiling import profiled
+
 
 def drop_empty_columns(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -14,25 +19,140 @@ def drop_empty_columns(df: pd.DataFrame) -> pd.DataFrame:
     return df.dropna(axis='columns', how='all')
 
 
+def find_duplicate_columns(columns: pd.Index) -> dict[str, list[int]]:
+    """
+    Find the positions of every column name in an index, in order of first appearance.
+
+    Args:
+        columns (pd.Index): Column index to be processed.
+
+    Returns:
+        dict: Mapping of each unique column name to the list of its positions in the index.
+    """
+    groups = {}
+    for position, name in enumerate(columns):
+        groups.setdefault(name, []).append(position)
+    return groups
+
+
+def coalesce_columns(columns: list[pd.Series]) -> pd.Series:
+    """
+    Coalesce several columns into a single Series by taking the first non-NA value of each row.
+
+    Args:
+        columns (list): Series sharing the same index, in order of priority.
+
+    Returns:
+        pd.Series: Series named after the first column, containing the first non-NA value of each row.
+            The original dtype is kept when all columns share the same dtype.
+    """
+    values = np.column_stack([column.to_numpy() for column in columns])
+    first_valid = pd.notna(values).argmax(axis=1)
+    merged = values[np.arange(len(values)), first_valid]
+    dtypes = {column.dtype for column in columns}
+    if len(dtypes) == 1:
+        return pd.Series(merged, index=columns[0].index, name=columns[0].name, dtype=dtypes.pop())
+    return pd.Series(merged, index=columns[0].index, name=columns[0].name).infer_objects()
+
+
+@profiled()
 def merge_duplicate_columns(df: pd.DataFrame) -> pd.DataFrame:
     """
     Merge duplicate columns in a DataFrame by taking the first non-NA value.
 
+    Columns that are not duplicated are kept untouched, and the order of first appearance is preserved.
+
     Args:
         df (pd.DataFrame): DataFrame to be processed.
 
     Returns:
         pd.DataFrame: DataFrame with duplicate columns merged.
     """
-    return (df
-            .T
-            .groupby(df.columns, sort=False)
-            .apply(lambda x: x.infer_objects(copy=False).bfill().iloc[0])
-            .T
-            )
+    if df.columns.is_unique:
+        return df
+    columns = [column for _, column in df.items()]
+    merged = {
+        name: columns[positions[0]] if len(positions) == 1 else coalesce_columns([columns[p] for p in positions])
+        for name, positions in find_duplicate_columns(df.columns).items()
+    }
+    return pd.DataFrame(merged, index=df.index)
+
+
+HTML_TAG_PATTERN = re.compile(r'<[^>]+>')
+
+
+def map_unique(series: pd.Series, func) -> pd.Series:
+    """
+    Apply a function to every string of a Series, calling it once per unique value.
+
+    Args:
+        series (pd.Series): Series of strings.
+        func (callable): Function taking and returning a string.
+
+    Returns:
+        pd.Series: Series of results, with the same index, name and dtype (categoricals get new categories). Missing
+            and non-string values become NA, as with the Series.str methods.
+    """
+    codes, uniques = pd.factorize(series)
+    # Missing values get the code -1, which picks the trailing NaN
+    results = np.array([func(u) if isinstance(u, str) else np.nan for u in uniques] + [np.nan], dtype=object)
+    dtype = 'category' if isinstance(series.dtype, pd.CategoricalDtype) else series.dtype
+    return pd.Series(results[codes], index=series.index, name=series.name).astype(dtype)
+
+
+def strip_html_tags(series: pd.Series) -> pd.Series:
+    """
+    Remove HTML tags from a Series of strings, once per unique value.
+
+    Args:
+        series (pd.Series): Series of strings.
+
+    Returns:
+        pd.Series: Series with HTML tags removed.
+    """
+    return map_unique(series, lambda s: HTML_TAG_PATTERN.sub('', s))
+
+
+class StringReplacer:
+    """
+    Applies a table of substring replacements, in order, to strings.
+
+    The result is the same as calling str.replace for each replacement in turn. A single alternation regex of all
+    the substrings to replace is used to skip the strings that contain none of them, and results are memoized per
+    unique input string.
+
+    Attributes:
+        replacements (list): (old, new) substring pairs, applied in order.
+
+    Methods:
+        replace_series(series): Applies the replacements to every string of a Series.
+    """
+    def __init__(self, replacements: dict[str, str]):
+        self.replacements = [(old, new) for old, new in replacements.items() if old]
+        self._pattern = re.compile('|'.join(re.escape(old) for old, _ in self.replacements)) \
+            if self.replacements else None
+        self._cache = {}
+
+    def __call__(self, string: str) -> str:
+        try:
+            return self._cache[string]
+        except KeyError:
+            pass
+        result = string
+        if self._pattern is not None and self._pattern.search(string):
+            for old, new in self.replacements:
+                result = result.replace(old, new)
+        self._cache[string] = result
+        return result
+
+    def replace_series(self, series: pd.Series) -> pd.Series:
+        """
+        Apply the replacements to every string of a Series, once per unique value.
 
+        Args:
+            series (pd.Series): Series of strings. Missing and non-string values become NA, as with Series.str.
 
-def replace_strings(series: pd.Series, replacements: dict) -> pd.Series:
-    for old, new in replacements.items():
-        series = series.str.replace(old, new, regex=False)
-    return series
+        Returns:
+            pd.Series: Series with replaced strings, with the same index, name and dtype.
+        """
+        return map_unique(series, self)
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+import pandas as pd
+
+from ..profiling import profiled
+from ..storage.atomic import atomic_write
+from ..version import get_version
+from .helpers import StringReplacer, coalesce_columns, find_duplicate_columns
+
+
+class CleaningPlan:
+    """
+    Column operations of the report cleaning that only depend on the column names of the raw report: renaming the
+    fields, and merging the columns that get the same name once renamed.
+
+    The plan is compiled once from the header of a report, and applied to every frame with that header (e.g. each
+    partition of a report cleaned out of core) as one column selection, followed by the coalescing of the merged
+    columns.
+
+    Attributes:
+        columns (list): Column names of the raw report.
+        targets (list): Cleaned name of each raw column.
+        selection (list): Position of the first raw column of each cleaned column, in order of first appearance.
+        merge_groups (dict): Positions of the raw columns coalesced into each cleaned column made of several raw
+            columns, by position of the cleaned column.
+        key (str): Hash of the header, of the renaming rules and of the package version, identifying the plan in the
+            cache.
+
+    Methods:
+        get_key(columns, replacer): Hashes a header, renaming rules and the package version.
+        compile(columns, replacer): Builds the plan of a header.
+        load(cache_dir, columns, replacer): Loads the cached plan of a header, compiling and caching it if needed.
+        target(column): Returns the cleaned name of a column.
+        apply(df): Renames and merges the columns of a raw report.
+    """
+    def __init__(self, columns: list[str], targets: list[str], selection: list[int],
+                 merge_groups: dict[int, list[int]], key: str):
+        self.columns = columns
+        self.targets = targets
+        self.selection = selection
+        self.merge_groups = merge_groups
+        self.key = key
+        self._targets = dict(zip(columns, targets))
+
+    def __str__(self):
+        return f"CleaningPlan of {len(self.columns)} columns into {len(self.selection)} columns " \
+               f"({len(self.merge_groups)} merged)"
+
+    @staticmethod
+    def get_key(columns: list[str], replacer: StringReplacer) -> str:
+        """Hash the column names of a header, the renaming rules applied to them, and the package version."""
+        content = json.dumps([[str(column) for column in columns], replacer.replacements, get_version()])
+        return hashlib.sha256(content.encode()).hexdigest()[:16]
+
+    @classmethod
+    def compile(cls, columns: list[str], replacer: StringReplacer) -> 'CleaningPlan':
+        """
+        Build the cleaning plan of a header.
+
+        Args:
+            columns (list): Column names of the raw report.
+            replacer (StringReplacer): Renaming rules of the field names.
+
+        Returns:
+            CleaningPlan: Plan of the header.
+        """
+        columns = list(columns)
+        targets = [replacer(column) for column in columns]
+        groups = list(find_duplicate_columns(pd.Index(targets)).values())
+        return cls(columns, targets,
+                   selection=[positions[0] for positions in groups],
+                   merge_groups={i: positions for i, positions in enumerate(groups) if len(positions) > 1},
+                   key=cls.get_key(columns, replacer))
+
+    @classmethod
+    def load(cls, cache_dir: str | Path, columns: list[str], replacer: StringReplacer) -> 'CleaningPlan':
+        """
+        Load the cached cleaning plan of a header, or compile it and save it in the cache.
+
+        The cache only keeps the plan of the last header, since the header only changes with the data dictionary. A
+        cached plan that cannot be read is compiled again.
+
+        Args:
+            cache_dir (str | Path): Directory of the cached plans.
+            columns (list): Column names of the raw report.
+            replacer (StringReplacer): Renaming rules of the field names.
+
+        Returns:
+            CleaningPlan: Plan of the header.
+        """
+        logger = logging.getLogger('CleaningPlan')
+        columns = list(columns)
+        cache_file = Path(cache_dir) / f'cleaning_plan_{cls.get_key(columns, replacer)}.json'
+        if cache_file.exists():
+            try:
+                with cache_file.open('r') as f:
+                    content = json.load(f)
+                if content['columns'] == columns:
+                    logger.info(f'Report header unchanged, reusing the cleaning plan from {cache_file}.')
+                    return cls(content['columns'], content['targets'], content['selection'],
+                               {int(position): sources for position, sources in content['merge_groups'].items()},
+                               content['key'])
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                logger.warning(f'Could not read the cleaning plan from {cache_file} ({e}), compiling it again.')
+
+        plan = cls.compile(columns, replacer)
+        for old_cache_file in cache_file.parent.glob('cleaning_plan_*.json'):
+            old_cache_file.unlink()
+        atomic_write(cache_file, lambda f: json.dump({'columns': plan.columns, 'targets': plan.targets,
+                                                      'selection': plan.selection, 'merge_groups': plan.merge_groups,
+                                                      'key': plan.key}, f))
+        logger.info(f'Compiled {plan}, saved to {cache_file}.')
+        return plan
+
+    def target(self, column: str) -> str:
+        """Get the cleaned name of a column (columns missing from the plan keep their name)."""
+        return self._targets.get(column, column)
+
+    @profiled()
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Rename the columns of a raw report, and merge the columns that get the same name by taking the first non-NA
+        value (see merge_duplicate_columns).
+
+        Args:
+            df (pd.DataFrame): Raw report, with the header of the plan.
+
+        Returns:
+            pd.DataFrame: Report with cleaned column names.
+
+        Raises:
+            ValueError: If the columns of the report are not those of the plan.
+        """
+        if list(df.columns) != self.columns:
+            raise ValueError(f'{self} does not apply to a report with other columns.')
+        names = [self.targets[position] for position in self.selection]
+        if not self.merge_groups:
+            return df.set_axis(names, axis='columns')
+        columns = [column for _, column in df.items()]
+        # Building the frame at once keeps the columns of the same dtype together, which makes splitting it faster
+        return pd.DataFrame({
+            name: coalesce_columns([columns[source] for source in self.merge_groups[position]])
+            if position in self.merge_groups else columns[first]
+            for position, (name, first) in enumerate(zip(names, self.selection))
+        }, index=df.index)
@@ -0,0 +1,209 @@
+from collections.abc import Callable, Iterator
+
+import numpy as np
+import pandas as pd
+
+
+class SparseTable:
+    """
+    Long-format representation of a wide, mostly-empty table: one row of identifiers per record, and one cell per
+    non-empty value of the other columns.
+
+    Attributes:
+        index (pd.DataFrame): Identifier columns of each row (e.g. participant and event), indexed by row number.
+        cells (pd.DataFrame): Non-empty values, as 'row' number, 'column' code and 'value', sorted by row then column.
+        columns (list): Names of the value columns, in wide order. Column codes are positions in this list.
+        dtypes (dict): Dtype of each value column in wide format.
+        column_order (list): Names of all the columns (identifiers and values) in wide format.
+
+    Methods:
+        from_frame(df, index_columns): Converts a wide DataFrame into a SparseTable.
+        to_frame(): Converts the table back into a wide DataFrame.
+        assign(**kwargs): Adds or replaces identifier columns.
+        rename(mapper): Renames the columns, merging the value columns that get the same name.
+        query(expr): Keeps the rows whose identifiers match a query.
+        split(by): Lazily converts each group of rows into a wide DataFrame.
+        memory_usage(): Returns the memory used by the table.
+    """
+    def __init__(self, index: pd.DataFrame, cells: pd.DataFrame, columns: list[str], dtypes: dict,
+                 column_order: list[str]):
+        self.index = index
+        self.cells = cells
+        self.columns = columns
+        self.dtypes = dtypes
+        self.column_order = column_order
+
+    def __str__(self):
+        return f"SparseTable with {len(self.index)} rows, {len(self.columns)} columns and {len(self.cells)} values"
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, index_columns: list[str]) -> 'SparseTable':
+        """
+        Convert a wide DataFrame into a SparseTable.
+
+        Args:
+            df (pd.DataFrame): Wide DataFrame, with unique column names.
+            index_columns (list): Columns identifying each row, kept for every row.
+
+        Returns:
+            SparseTable: Table holding the non-empty values of the other columns.
+        """
+        index = df[index_columns].reset_index(drop=True)
+        columns = [column for column in df.columns if column not in index_columns]
+        rows, codes, values = [], [], []
+        for code, column in enumerate(columns):
+            series = df[column]
+            positions = np.flatnonzero(series.notna().to_numpy())
+            rows.append(positions)
+            codes.append(np.full(len(positions), code, dtype=np.int32))
+            values.append(series.iloc[positions].to_numpy(dtype=object))
+        cells = cls._make_cells(np.concatenate(rows) if rows else np.empty(0, dtype=np.int64),
+                                np.concatenate(codes) if codes else np.empty(0, dtype=np.int32),
+                                np.concatenate(values) if values else np.empty(0, dtype=object))
+        return cls(index, cells, columns, {column: df[column].dtype for column in columns}, list(df.columns))
+
+    @staticmethod
+    def _make_cells(rows: np.ndarray, codes: np.ndarray, values: np.ndarray) -> pd.DataFrame:
+        order = np.lexsort((codes, rows))
+        return pd.DataFrame({'row': rows[order], 'column': codes[order], 'value': values[order]})
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Convert the table back into a wide DataFrame.
+
+        Args:
+            None
+
+        Returns:
+            pd.DataFrame: Wide DataFrame with all the columns of the table, indexed by row number.
+        """
+        return self._to_wide(self.index, self.cells, keep_empty_columns=True)
+
+    def _to_wide(self, index: pd.DataFrame, cells: pd.DataFrame, keep_empty_columns: bool = False) -> pd.DataFrame:
+        """Pivot the cells of some rows to wide format, keeping only the columns with values unless asked not to."""
+        if keep_empty_columns:
+            codes = np.arange(len(self.columns))
+        else:
+            codes = np.unique(cells['column'].to_numpy())
+            index = index.dropna(axis='columns', how='all')
+        values = np.full((len(codes), len(index)), np.nan, dtype=object)
+        values[np.searchsorted(codes, cells['column'].to_numpy()), index.index.get_indexer(cells['row'])] = \
+            cells['value'].to_numpy()
+
+        # Columns are converted back to their dtype one block of columns of the same dtype at a time
+        members = {}
+        for position, code in enumerate(codes):
+            members.setdefault(self.dtypes[self.columns[code]], []).append(position)
+        blocks = []
+        for dtype, positions in members.items():
+            block = pd.DataFrame(values[positions].T, index=index.index,
+                                 columns=[self.columns[codes[position]] for position in positions])
+            # Merged columns of different dtypes are inferred again, as with coalesce_columns
+            blocks.append(block.infer_objects() if dtype == object else block.astype(dtype))
+        wide = pd.concat([index, *blocks], axis='columns')
+        return wide[[column for column in self.column_order if column in wide.columns]]
+
+    def assign(self, **kwargs) -> 'SparseTable':
+        """
+        Add or replace identifier columns, as with DataFrame.assign on the index.
+
+        Args:
+            **kwargs: New columns, as values or as callables taking the index.
+
+        Returns:
+            SparseTable: Table with the new identifier columns. New columns are added after the existing ones.
+        """
+        index = self.index.assign(**kwargs)
+        column_order = self.column_order + [column for column in kwargs if column not in self.column_order]
+        return SparseTable(index, self.cells, self.columns, self.dtypes, column_order)
+
+    def rename(self, mapper: Callable[[str], str]) -> 'SparseTable':
+        """
+        Rename the columns, merging the value columns that get the same name.
+
+        As with merge_duplicate_columns, a merged column takes the first non-empty value of its columns, in wide
+        order, and is placed where its first column was.
+
+        Args:
+            mapper (callable): Function returning the new name of a column.
+
+        Returns:
+            SparseTable: Table with renamed columns.
+        """
+        index = self.index.rename(columns=mapper)
+        column_order = list(dict.fromkeys(mapper(column) for column in self.column_order))
+        renamed = [mapper(column) for column in self.columns]
+        columns = list(dict.fromkeys(renamed))
+        positions = {name: code for code, name in enumerate(columns)}
+        new_codes = np.array([positions[name] for name in renamed], dtype=np.int32)
+
+        dtypes = {}
+        for column, name in zip(self.columns, renamed):
+            dtype = self.dtypes[column]
+            dtypes[name] = dtype if dtypes.get(name, dtype) == dtype else np.dtype(object)
+
+        cells = self.cells
+        if len(columns) < len(self.columns):
+            # Once sorted by row, new column and old column, the first cell of each (row, new column) pair is the
+            # first non-empty value in wide order
+            codes = new_codes[cells['column'].to_numpy()]
+            rows = cells['row'].to_numpy()
+            order = np.lexsort((cells['column'].to_numpy(), codes, rows))
+            rows, codes, values = rows[order], codes[order], cells['value'].to_numpy()[order]
+            first = np.ones(len(rows), dtype=bool)
+            first[1:] = (rows[1:] != rows[:-1]) | (codes[1:] != codes[:-1])
+            cells = self._make_cells(rows[first], codes[first], values[first])
+        else:
+            cells = cells.assign(column=new_codes[cells['column'].to_numpy()])
+        return SparseTable(index, cells, columns, dtypes, column_order)
+
+    def query(self, expr: str) -> 'SparseTable':
+        """
+        Keep the rows whose identifiers match a query, as with DataFrame.query on the index.
+
+        Args:
+            expr (str): Query on the identifier columns.
+
+        Returns:
+            SparseTable: Table with the matching rows only.
+        """
+        index = self.index.query(expr)
+        cells = self.cells[self.cells['row'].isin(index.index)]
+        return SparseTable(index, cells, self.columns, self.dtypes, self.column_order)
+
+    def split(self, by: list[str]) -> Iterator[pd.DataFrame]:
+        """
+        Lazily convert each group of rows into a wide DataFrame, with only the columns that have values in the group.
+
+        Args:
+            by (list): Identifier columns to group the rows by.
+
+        Yields:
+            pd.DataFrame: One wide DataFrame for each unique group defined by 'by', in sorted group order.
+        """
+        # Sort the cells by group once, so that the cells of each group are a contiguous slice. Rows with a missing
+        # key are in no group, and their cells are dropped, as with DataFrame.groupby
+        group_of_row = pd.Series(np.full(len(self.index), -1, dtype=np.int64), index=self.index.index)
+        groups = list(self.index.groupby(by).indices.values())
+        for group, positions in enumerate(groups):
+            group_of_row.iloc[positions] = group
+        cell_groups = group_of_row.loc[self.cells['row']].to_numpy()
+        grouped = cell_groups >= 0
+        cell_groups = cell_groups[grouped]
+        order = np.argsort(cell_groups, kind='stable')
+        cells = self.cells[grouped].iloc[order]
+        bounds = np.searchsorted(cell_groups[order], np.arange(len(groups) + 1))
+        for group, positions in enumerate(groups):
+            yield self._to_wide(self.index.iloc[positions], cells.iloc[bounds[group]:bounds[group + 1]])
+
+    def memory_usage(self) -> int:
+        """
+        Return the memory used by the table.
+
+        Args:
+            None
+
+        Returns:
+            int: Number of bytes used by the identifiers and the cells, including the values they hold.
+        """
+        return int(self.index.memory_usage(deep=True).sum() + self.cells.memory_usage(deep=True).sum())
@@ -1,45 +1,164 @@
+import argparse
 import logging
+import time
 from pathlib import Path
-import pkg_resources
 from datetime import datetime
+from typing import TYPE_CHECKING
 
-from .config.properties import load_application_properties
-from .storage.path_resolver import PathResolver
-from .redcap_api.redcap import REDCap
-from .data_cleaning.data_cleaner import DataCleaner
+from .config.properties import Properties, load_application_properties
+from .version import get_version
 
+if TYPE_CHECKING:
+    import requests
 
-def main():
-    # Load properties
-    properties = load_application_properties()
 
-    # Configure the logger
-    log_file = Path(properties.download_folder) / f"download_{datetime.now().strftime('%Y%m%d')}.log"
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def configure_logging(log_file: Path, log_level: str = 'INFO', log_format: str = LOG_FORMAT):
+    """
+    Log to the console and to a new log file.
+
+    Args:
+        log_file (Path): Path of the log file. An existing log file is replaced.
+        log_level (str): Logging level: INFO or DEBUG.
+        log_format (str): Format of the log records.
+
+    Returns:
+        None
+    """
     if not log_file.parent.exists():
         log_file.parent.mkdir(parents=True)
     if log_file.exists():
         log_file.unlink()
     logging.basicConfig(
-        level=logging.DEBUG if properties.log_level == 'DEBUG' else logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',  # Log format
+        level=logging.DEBUG if log_level == 'DEBUG' else logging.INFO,
+        format=log_format,
         handlers=[
             logging.FileHandler(log_file),  # Log to a file
             logging.StreamHandler()  # Log to console
         ]
     )
 
-    logger = logging.getLogger('main')
-    version = pkg_resources.require("redcap_downloader")[0].version
-    logger.info(f'Running redcap_downloader version {version}')
 
-    paths = PathResolver(properties.download_folder)
+def run_download(properties: Properties, session: 'requests.Session' = None) -> dict[str, float]:
+    """
+    Download, clean and save the variables and the report of one REDCap project.
+
+    The time and resources used by each step are saved as a JSON run report next to the log file
+    (download_<date>.json), even if the download fails. If the profile property is set, the peak memory of each
+    step is also traced, and the function calls of the download are profiled with cProfile (download_<date>.prof).
+
+    Args:
+        properties (Properties): Properties of the download.
+        session (requests.Session): HTTP session shared with other downloads. A session is created if not given.
+
+    Returns:
+        dict: Duration (in seconds) of each stage of the download.
+    """
+    from .profiling import StageProfiler, profile_calls
+
+    run_name = f"download_{datetime.now().strftime('%Y%m%d')}"
+    profiler = StageProfiler(trace_memory=properties.profile)
+    started = datetime.now()
+    timings, status, error = {}, 'ok', None
+    try:
+        with profiler.activate():
+            if properties.profile:
+                with profile_calls(properties.download_folder / f'{run_name}.prof'):
+                    _download(properties, session, timings)
+            else:
+                _download(properties, session, timings)
+    except BaseException as e:
+        status, error = 'failed', str(e)
+        raise
+    finally:
+        profiler.save(properties.download_folder / f'{run_name}.json', version=get_version(),
+                      started=started.isoformat(timespec='seconds'), report_id=properties.report_id,
+                      status=status, error=error, timings=timings)
+    return timings
+
+
+def _download(properties: Properties, session: 'requests.Session', timings: dict[str, float]):
+    """
+    Run the stages of a download, recording the duration of each one in timings as it completes.
+
+    The modules using pandas and requests are only imported here, so that the command starts and logs without
+    waiting for them.
+    """
+    from .data_cleaning.data_cleaner import DataCleaner
+    from .redcap_api.redcap import REDCap
+    from .storage.manifest import Manifest
+    from .storage.metadata_cache import MetadataCache
+    from .storage.path_resolver import PathResolver
+    from .storage.writer import GroupWriter
 
-    redcap = REDCap(properties)
+    start = time.perf_counter()
+    paths = PathResolver(properties.download_folder, file_format=properties.output_format,
+                         existing_dir=properties.existing_dir, staged=properties.staged_output)
 
-    cleaner = DataCleaner(redcap, paths)
+    metadata_cache = MetadataCache(paths.get_cache_dir(), max_age_days=properties.metadata_cache_days) \
+        if properties.metadata_cache_days > 0 else None
+
+    redcap = REDCap(properties, metadata_cache=metadata_cache, session=session)
+
+    writer = GroupWriter(properties.writer_backend, max_workers=properties.writer_workers)
+
+    manifest = Manifest(paths.get_manifest_file(), policy=properties.unchanged_files) \
+        if properties.unchanged_files != 'write' else None
+
+    cleaner = DataCleaner(redcap, paths, incremental=properties.incremental, writer=writer,
+                          partitioned=properties.partitioned_reports, manifest=manifest,
+                          variables_cache=properties.variables_cache, report_schema=properties.report_schema,
+                          sparse=properties.sparse_reports, memory_limit=properties.memory_limit)
+    timings['setup'] = time.perf_counter() - start
+
+    try:
+        if properties.concurrent_download:
+            stage_start = time.perf_counter()
+            cleaner.save_questionnaire_data()
+            timings['questionnaire_data'] = time.perf_counter() - stage_start
+        else:
+            stage_start = time.perf_counter()
+            cleaner.save_questionnaire_variables()
+            timings['variables'] = time.perf_counter() - stage_start
+            stage_start = time.perf_counter()
+            cleaner.save_questionnaire_reports()
+            timings['reports'] = time.perf_counter() - stage_start
+    finally:
+        writer.close()
+        redcap.close()
+    if properties.staged_output:
+        stage_start = time.perf_counter()
+        paths.publish()
+        timings['publish'] = time.perf_counter() - stage_start
+    timings['total'] = time.perf_counter() - start
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(
+        prog='redcap_download',
+        description='Download and clean the questionnaire data of a REDCap project, as set in the '
+                    'REDCap_downloader.properties file of the current directory.')
+    parser.add_argument('--version', action='version', version=f'%(prog)s {get_version()}')
+    parser.add_argument('--check-config', action='store_true',
+                        help='load and log the properties, then exit without downloading data')
+    args = parser.parse_args(argv)
+
+    # Load properties
+    properties = load_application_properties()
+
+    # Configure the logger
+    log_file = Path(properties.download_folder) / f"download_{datetime.now().strftime('%Y%m%d')}.log"
+    configure_logging(log_file, properties.log_level)
+
+    logger = logging.getLogger('main')
+    logger.info(f'Running redcap_downloader version {get_version()}')
+    if args.check_config:
+        logger.info(f'Loaded {properties}')
+        return
 
-    cleaner.save_questionnaire_variables()
-    cleaner.save_questionnaire_reports()
+    run_download(properties)
 
 
 if __name__ == '__main__':
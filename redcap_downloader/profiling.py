@@ -0,0 +1,309 @@
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+_profiler = contextvars.ContextVar('profiler', default=None)
+_stage = contextvars.ContextVar('stage', default=None)
+
+# tracemalloc is process-wide: it is started by the first profiler tracing memory and stopped by the last one, and
+# the stages being traced (in any thread) are kept to record their peak before another stage resets it
+_tracing_lock = threading.Lock()
+_tracing_profilers = 0
+_started_tracing = False
+_traced_stages = {}
+
+
+def max_rss() -> int | None:
+    """
+    Get the peak resident memory of the process so far.
+
+    Returns:
+        int: Peak resident set size in bytes, or None if it cannot be measured on this platform.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in kilobytes on Linux, and in bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def table_shape(obj) -> tuple[int, int] | None:
+    """
+    Get the number of rows and columns of a DataFrame, or of the data of a Report or Variables object.
+
+    Args:
+        obj: DataFrame, object with a 'data' DataFrame or a 'sparse' SparseTable, or anything else.
+
+    Returns:
+        tuple: Number of rows and columns, or None if the object holds no table.
+    """
+    sparse = getattr(obj, 'sparse', None)
+    if hasattr(sparse, 'column_order'):
+        return len(sparse.index), len(sparse.column_order)
+    shape = getattr(getattr(obj, 'data', obj), 'shape', None)
+    return (int(shape[0]), int(shape[1])) if isinstance(shape, tuple) and len(shape) == 2 else None
+
+
+def add_bytes_written(n_bytes: int):
+    """
+    Count bytes written to disk in the current stage (and the stages containing it), if a profiler is active.
+
+    Args:
+        n_bytes (int): Number of bytes written.
+
+    Returns:
+        None
+    """
+    profiler, record = _profiler.get(), _stage.get()
+    if profiler is not None and record is not None:
+        with profiler._lock:
+            record['bytes_written'] += n_bytes
+
+
+class StageProfiler:
+    """
+    Records the time and resources used by each stage of a download, for the stages run while it is active.
+
+    Stages are the functions decorated with profiled(). Stages started from other threads are only recorded if the
+    context of the active profiler is copied to them (see contextvars.copy_context).
+
+    Attributes:
+        trace_memory (bool): Whether to trace the peak memory allocated by Python in each stage with tracemalloc,
+            which slows the download down.
+        stages (list): Record of each completed stage, in completion order: name, thread, start (in seconds since
+            the profiler was created), wall_time, cpu_time (of the thread running the stage), max_rss (peak
+            resident memory of the process at the end of the stage), traced_peak (peak traced memory, if
+            tracing), rows and columns of the data produced or saved, and bytes_written.
+
+    Methods:
+        activate(): Context manager recording the stages run inside it.
+        stage(name): Context manager recording one stage.
+        add_record(name, start, wall_time, cpu_time, data, **fields): Records a stage measured by the caller.
+        save(file_path, **info): Saves the run report as JSON.
+    """
+    def __init__(self, trace_memory: bool = False):
+        self._logger = logging.getLogger('StageProfiler')
+        self.trace_memory = trace_memory
+        self.stages = []
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def activate(self):
+        global _tracing_profilers, _started_tracing
+        if self.trace_memory:
+            with _tracing_lock:
+                if _tracing_profilers == 0 and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    _started_tracing = True
+                _tracing_profilers += 1
+        token = _profiler.set(self)
+        try:
+            yield self
+        finally:
+            _profiler.reset(token)
+            if self.trace_memory:
+                with _tracing_lock:
+                    _tracing_profilers -= 1
+                    if _tracing_profilers == 0 and _started_tracing:
+                        tracemalloc.stop()
+                        _started_tracing = False
+
+    def _new_record(self, name: str, start: float) -> dict:
+        return {'stage': name, 'thread': threading.current_thread().name, 'start': start - self._start,
+                'wall_time': None, 'cpu_time': None, 'max_rss': None, 'traced_peak': None,
+                'rows': None, 'columns': None, 'bytes_written': 0}
+
+    def _close_record(self, record: dict, parent: dict | None):
+        record['max_rss'] = max_rss()
+        with self._lock:
+            if parent is not None:
+                parent['bytes_written'] += record['bytes_written']
+            self.stages.append(record)
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Record one stage.
+
+        Args:
+            name (str): Name of the stage.
+
+        Yields:
+            dict: Record of the stage, in which the caller can set the rows and columns of the data.
+        """
+        parent = _stage.get()
+        start, cpu_start = time.perf_counter(), time.thread_time()
+        record = self._new_record(name, start)
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            with _tracing_lock:
+                # The peak is process-wide: the peak so far of the other stages being traced is kept before resetting
+                peak = tracemalloc.get_traced_memory()[1]
+                for floor in _traced_stages:
+                    _traced_stages[floor] = max(_traced_stages[floor], peak)
+                _traced_stages[id(record)] = 0
+                tracemalloc.reset_peak()
+        token = _stage.set(record)
+        try:
+            yield record
+        finally:
+            _stage.reset(token)
+            record['wall_time'] = time.perf_counter() - start
+            record['cpu_time'] = time.thread_time() - cpu_start
+            if tracing:
+                with _tracing_lock:
+                    record['traced_peak'] = max(tracemalloc.get_traced_memory()[1], _traced_stages.pop(id(record)))
+            self._close_record(record, parent)
+
+    def add_record(self, name: str, start: float, wall_time: float, cpu_time: float, data=None, **fields):
+        """
+        Record a stage measured by the caller (e.g. the time spent inside a generator, between its items).
+
+        Args:
+            name (str): Name of the stage.
+            start (float): Start time of the stage, as given by time.perf_counter().
+            wall_time (float): Wall time (in seconds) of the stage.
+            cpu_time (float): CPU time (in seconds) of the stage.
+            data: Data of the stage, whose rows and columns are recorded (see table_shape).
+            **fields: Other fields of the record.
+
+        Returns:
+            None
+        """
+        record = self._new_record(name, start)
+        record.update(wall_time=wall_time, cpu_time=cpu_time, **fields)
+        record['rows'], record['columns'] = table_shape(data) or (None, None)
+        self._close_record(record, None)
+
+    def save(self, file_path: str | Path, **info):
+        """
+        Save the run report as JSON.
+
+        Args:
+            file_path (str | Path): Path of the JSON file.
+            **info: Other information about the run, saved before the stages.
+
+        Returns:
+            None
+        """
+        file_path = Path(file_path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            stages = sorted(self.stages, key=lambda record: record['start'])
+        file_path.write_text(json.dumps({**info, 'stages': stages}, indent=2, default=str))
+        self._logger.info(f'Saved run report to {file_path}')
+
+
+@contextmanager
+def profile_calls(file_path: str | Path):
+    """
+    Profile the function calls of the current thread, and of the threads it starts, with cProfile.
+
+    From Python 3.12, a single profile covers all the threads of the process, and only one can be active at a time.
+    Before that, each thread is profiled separately, and the profiles are merged once the block completes.
+
+    Args:
+        file_path (str | Path): Path of the profile saved at the end of the block (see pstats).
+
+    Yields:
+        None
+    """
+    import cProfile
+    import pstats
+
+    profiles = [cProfile.Profile()]
+    lock = threading.Lock()
+
+    def profile_thread(*args):
+        # Called on the first event of each new thread, where it replaces itself with the profile of the thread
+        profile = cProfile.Profile()
+        with lock:
+            profiles.append(profile)
+        profile.enable()
+
+    per_thread = sys.version_info < (3, 12)
+    if per_thread:
+        threading.setprofile(profile_thread)
+    profiles[0].enable()
+    try:
+        yield
+    finally:
+        profiles[0].disable()
+        if per_thread:
+            threading.setprofile(None)
+        with lock:
+            stats = pstats.Stats(*profiles)
+        stats.dump_stats(file_path)
+
+
+def profiled(name: str = None):
+    """
+    Record the calls of a function as stages of the active StageProfiler, if any.
+
+    The rows and columns recorded are those of the returned data, or else of the data of the object the method
+    belongs to. For generator functions, only the time spent producing the items is recorded, along with the number
+    of items.
+
+    Args:
+        name (str): Name of the stage (qualified name of the function by default).
+
+    Returns:
+        callable: Decorator.
+    """
+    def decorator(func):
+        stage_name = name or func.__qualname__
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                profiler = _profiler.get()
+                if profiler is None:
+                    return (yield from func(*args, **kwargs))
+                generator = func(*args, **kwargs)
+                created = time.perf_counter()
+                wall_time = cpu_time = 0
+                items = 0
+                try:
+                    while True:
+                        start, cpu_start = time.perf_counter(), time.thread_time()
+                        try:
+                            item = next(generator)
+                        except StopIteration as stop:
+                            return stop.value
+                        finally:
+                            wall_time += time.perf_counter() - start
+                            cpu_time += time.thread_time() - cpu_start
+                        items += 1
+                        yield item
+                finally:
+                    generator.close()
+                    profiler.add_record(stage_name, created, wall_time, cpu_time, data=args[0] if args else None,
+                                        items=items)
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = _profiler.get()
+            if profiler is None:
+                return func(*args, **kwargs)
+            with profiler.stage(stage_name) as record:
+                result = func(*args, **kwargs)
+                shape = table_shape(result) or (table_shape(args[0]) if args else None)
+                record['rows'], record['columns'] = shape or (None, None)
+            return result
+        return wrapper
+    return decorator
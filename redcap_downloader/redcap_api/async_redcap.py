@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import time
+from io import StringIO
+
+import httpx
+import pandas as pd
+
+from .dom import Variables, Report
+from .redcap import REDCap, metadata_request, report_request
+from ..config.properties import Properties
+
+
+def create_client(max_connections: int = 10, connect_timeout: float = 10, read_timeout: float = 600) \
+        -> httpx.AsyncClient:
+    """
+    Create an asynchronous HTTP client that can be shared by several AsyncREDCap instances.
+
+    All the requests sent through the client share its connection limit, whichever project they target.
+
+    Args:
+        max_connections (int): Maximum number of simultaneous connections.
+        connect_timeout (float): Timeout (in seconds) to establish a connection.
+        read_timeout (float): Timeout (in seconds) between two bytes received.
+
+    Returns:
+        httpx.AsyncClient: Configured client.
+    """
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        timeout=httpx.Timeout(read_timeout, connect=connect_timeout)
+    )
+
+
+class AsyncREDCap:
+    """
+    Asynchronous connection to a REDCap project, with the same interface as REDCap.
+
+    Several instances (e.g. one per project or per report) can share one client, and be awaited concurrently
+    with asyncio.gather: the connection limit of the client then applies to all of them.
+
+    Attributes:
+        token (str): API token for the REDCap project.
+        base_url (str): Base URL for the REDCap API.
+        report_id (int): ID of the report to fetch.
+        client (httpx.AsyncClient): HTTP client. A client is created from the properties if none is given, and is
+            then closed by aclose().
+        max_retries (int): Number of times a request is retried after a connection error, a 429 or a 5xx response.
+        backoff_factor (float): Exponential backoff factor (in seconds) between retries.
+
+    Methods:
+        get_questionnaire_variables(): Fetches the list of questionnaire variables from the REDCap API.
+        get_questionnaire_report(report_id): Fetches the questionnaire answers from the REDCap API.
+        aclose(): Closes the HTTP client, if it was created by this instance.
+    """
+    def __init__(self, properties: Properties, client: httpx.AsyncClient = None):
+        self._logger = logging.getLogger('AsyncREDCap')
+        self.token = properties.redcap_token
+        self.base_url = properties.api_url
+        self.report_id = properties.report_id
+        self.max_retries = properties.max_retries
+        self.backoff_factor = properties.backoff_factor
+        self.properties = properties
+        self._owns_client = client is None
+        self.client = client or create_client(properties.pool_size, properties.connect_timeout,
+                                              properties.read_timeout)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    async def aclose(self):
+        """Close the HTTP client, if it was created by this instance."""
+        if self._owns_client:
+            await self.client.aclose()
+
+    async def _post(self, data: dict) -> httpx.Response:
+        """
+        Send a POST request to the REDCap API, with exponential backoff on connection errors, 429 and 5xx responses.
+
+        Args:
+            data (dict): Form data of the request.
+
+        Returns:
+            httpx.Response: Response of the REDCap API.
+        """
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                r = await self.client.post(self.base_url, data=data)
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise
+                self._logger.warning(f"POST content={data['content']} failed ({e}), retrying.")
+            else:
+                self._logger.info(f"POST content={data['content']}: HTTP {r.status_code}, "
+                                  f"{len(r.content)} bytes in {time.perf_counter() - start:.3f} s")
+                if r.status_code not in REDCap.RETRY_STATUS_CODES or attempt == self.max_retries:
+                    return r
+            await asyncio.sleep(self.backoff_factor * 2 ** attempt)
+
+    async def get_questionnaire_variables(self) -> Variables:
+        """
+        Fetch the list of questionnaire variables from the REDCap API.
+
+        Args:
+            None
+
+        Returns:
+            Variables: Variables instance containing the raw data.
+        """
+        r = await self._post(metadata_request(self.token))
+        if r.status_code != 200:
+            self._logger.error(f"Failed to fetch variable dictionary: {r.text}")
+            raise Exception(f"HTTP Error: {r.status_code}")
+        self._logger.info('Accessing variable dictionary through the REDCap API.')
+        variables_data = await asyncio.to_thread(pd.read_csv, StringIO(r.text))
+        return Variables(variables_data)
+
+    async def get_questionnaire_report(self, report_id: int = None) -> Report:
+        """
+        Fetch the questionnaire answers from the REDCap API.
+
+        Args:
+            report_id (int): ID of the report to fetch (the report_id of the properties by default).
+
+        Returns:
+            Report: Report instance containing the raw data.
+        """
+        report_id = report_id or self.report_id
+        r = await self._post(report_request(self.token, report_id))
+        if r.status_code != 200:
+            self._logger.error(f"Failed to fetch report: {r.text}")
+            raise Exception(f"HTTP Error: {r.status_code}")
+        self._logger.info(f'Fetched report {report_id} through the REDCap API.')
+        report_data = await asyncio.to_thread(pd.read_csv, StringIO(r.text))
+        return Report(report_data)
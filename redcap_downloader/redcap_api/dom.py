@@ -1,8 +1,47 @@
 import logging
+from collections import Counter
+from collections.abc import Iterator
+from pathlib import Path
 import pandas as pd
 
 from ..data_cleaning.helpers import drop_empty_columns
+from ..profiling import add_bytes_written, profiled
+from ..storage.formats import write_table
+from ..storage.manifest import Manifest, hash_table, reuse_unchanged_file
 from ..storage.path_resolver import PathResolver
+from ..storage.writer import GroupWriter
+
+
+def write_group(df: pd.DataFrame, file_path: Path, remove_empty_columns: bool = True, key: str = None,
+                previous: dict = None, policy: str = 'write') -> tuple[str, str, str, Path, int]:
+    """
+    Write one group of cleaned data to a file, without its output_form column.
+
+    If a manifest key is given, the content of the group is hashed, and the previous file of the group is reused
+    according to the policy when the content did not change.
+
+    Args:
+        df (pd.DataFrame): Group to be written.
+        file_path (Path): Path of the file. Its extension sets the file format.
+        remove_empty_columns (bool): Whether to remove empty columns before saving.
+        key (str): Key of the group in the manifest, if any.
+        previous (dict): Manifest entry of the group from a previous run, if any.
+        policy (str): What to do if the content did not change: 'write', 'skip' or 'link'.
+
+    Returns:
+        tuple: Manifest key, status ('written', 'skipped' or 'linked'), content hash, path of the file and number
+            of bytes written.
+    """
+    if remove_empty_columns:
+        df = drop_empty_columns(df)
+    df = df.drop(columns=['output_form'])
+    content_hash = hash_table(df) if key is not None else None
+    status = reuse_unchanged_file(content_hash, file_path, previous, policy) if key is not None else None
+    n_bytes = 0
+    if status is None:
+        n_bytes = write_table(df, file_path)
+        status = 'written'
+    return key, status, content_hash, file_path, n_bytes
 
 
 class DataMixin:
@@ -14,21 +53,92 @@ class DataMixin:
         raw_data (pd.DataFrame): The raw data.
 
     Methods:
-        split(by): Splits the DataFrame into a list of DataFrames based on the specified columns.
+        split(by, remove_empty_columns): Lazily splits the DataFrame into one DataFrame per group of the specified
+            columns.
+        column_occupancy(by): Finds the non-empty columns of every group of the specified columns.
+        write_groups(groups, remove_empty_columns, writer, manifest): Writes groups of data to their files.
     """
     def __init__(self):
         self._logger = logging.getLogger(self.__class__.__name__)
 
-    def split(self, by: list[str]) -> list[pd.DataFrame]:
-        """Split the DataFrame into a list of DataFrames based on the specified columns.
+    @profiled()
+    def split(self, by: list[str], remove_empty_columns: bool = False) -> Iterator[pd.DataFrame]:
+        """Lazily split the DataFrame into one DataFrame per group of the specified columns.
+
+        Group positions are computed once, and the rows of each group are only taken when the group is consumed.
+        Groups made of contiguous rows are returned as slices of the data, without copying. If empty columns are
+        removed, the non-empty columns of all the groups are found in one pass (see column_occupancy), and only
+        these columns are taken.
 
         Args:
             by (list): List of columns to split the DataFrame by.
+            remove_empty_columns (bool): Whether to leave out the columns that are empty in a group.
+
+        Yields:
+            pd.DataFrame: One DataFrame for each unique group defined by 'by', in sorted group order.
+        """
+        groups = self.data.groupby(by).indices
+        if remove_empty_columns:
+            occupancy = self.column_occupancy(by).reindex(list(groups)).to_numpy()
+        for i, positions in enumerate(groups.values()):
+            start, stop = positions[0], positions[-1] + 1
+            rows = slice(start, stop) if stop - start == len(positions) else positions
+            if remove_empty_columns:
+                yield self.data.iloc[rows, occupancy[i].nonzero()[0]]
+            elif isinstance(rows, slice):
+                yield self.data.iloc[rows]
+            else:
+                yield self.data.take(positions)
+
+    def column_occupancy(self, by: list[str]) -> pd.DataFrame:
+        """
+        Find the non-empty columns of every group of the specified columns, in one pass over the data.
+
+        Args:
+            by (list): List of columns to group the DataFrame by.
+
+        Returns:
+            pd.DataFrame: One row per group (in sorted group order) and one column per column of the data, True where
+                the column has at least one value in the group. The grouping columns are always True.
+        """
+        counts = self.data.groupby(by).count()
+        return (counts.gt(0)
+                .reindex(columns=self.data.columns, fill_value=True)
+                .astype(bool))
+
+    def write_groups(self, groups: Iterator[tuple[str, Path, pd.DataFrame]], remove_empty_columns: bool = True,
+                     writer: GroupWriter = None, manifest: Manifest = None) -> dict[str, int]:
+        """
+        Write groups of data to their files, skipping or linking the files whose content did not change.
+
+        Args:
+            groups (Iterator): Tuples of manifest key, file path and data of each group.
+            remove_empty_columns (bool): Whether to remove empty columns before saving.
+            writer (GroupWriter): Writer running the file writes (serial if not given).
+            manifest (Manifest): Manifest of the previous runs. Every file is written if not given.
 
         Returns:
-            List[pd.DataFrame]: List of DataFrames, one for each unique group defined by 'by'.
+            dict: Number of files 'written', 'skipped' and 'linked'.
         """
-        return [group.copy() for _, group in self.data.groupby(by)]
+        writer = writer or GroupWriter()
+        for key, file_path, df in groups:
+            self._logger.debug(f'Saving data with shape {df.shape} to {file_path}')
+            if manifest is None:
+                writer.submit(write_group, df, file_path, remove_empty_columns)
+            else:
+                writer.submit(write_group, df, file_path, remove_empty_columns, key, manifest.get(key), manifest.policy)
+
+        summary = Counter({'written': 0, 'skipped': 0, 'linked': 0})
+        n_bytes = 0
+        for key, status, content_hash, file_path, written in writer.wait():
+            summary[status] += 1
+            n_bytes += written
+            if manifest is not None and status != 'skipped':
+                manifest.update(key, content_hash, file_path)
+        if manifest is not None:
+            manifest.save()
+        add_bytes_written(n_bytes)
+        return dict(summary)
 
 
 class Report(DataMixin):
@@ -38,23 +148,33 @@ class Report(DataMixin):
     Attributes:
         raw_data (pd.DataFrame): The raw report data (will not get affected by data cleaning operations).
         data (pd.DataFrame): The report data (will be affected by data cleaning operations).
+        raw_file (Path): File the raw report was already spooled to while downloading, if any.
+        sparse (SparseTable): Cleaned report data in long format, if the report is cleaned in sparse mode. The data
+            attribute is then None.
 
     Methods:
         save_cleaned_data(paths): Saves cleaned report data to disk.
+        save_partitioned_data(paths, partition_cols): Saves cleaned report data as a partitioned Parquet dataset.
     """
-    def __init__(self, report_data: pd.DataFrame):
+    def __init__(self, report_data: pd.DataFrame, raw_file: str | Path = None):
         super().__init__()
         self.data = report_data
         self.raw_data = report_data
+        self.raw_file = Path(raw_file) if raw_file is not None else None
+        self.sparse = None
         self._logger.info(f'Initialised report for {len(self.data.study_id.unique())} subjects.')
         self._logger.info(f'Number of questionnaires: \
                           {self.data.groupby("redcap_event_name").size().sort_values(ascending=False)}')
         self._logger.debug(f'Subject list: {self.data.study_id.unique()}')
 
     def __str__(self):
+        if self.sparse is not None:
+            return f"Report with {len(self.sparse.index)} entries and {len(self.sparse.column_order)} columns"
         return f"Report with {self.data.shape[0]} entries and {self.data.shape[1]} columns"
 
-    def save_cleaned_data(self, paths: PathResolver, by: list[str] = None, remove_empty_columns: bool = True):
+    @profiled()
+    def save_cleaned_data(self, paths: PathResolver, by: list[str] = None, remove_empty_columns: bool = True,
+                          writer: GroupWriter = None, manifest: Manifest = None) -> dict[str, int]:
         """
         Save cleaned questionnaire report data after splitting it by the specified columns.
 
@@ -62,25 +182,61 @@ class Report(DataMixin):
             paths (PathResolver): PathResolver instance to get the save paths.
             by (list): List of columns to split the DataFrame by.
             remove_empty_columns (bool): Whether to remove empty columns before saving.
+            writer (GroupWriter): Writer running the file writes (serial if not given).
+            manifest (Manifest): Manifest used to skip or link unchanged files. Every file is written if not given.
 
         Returns:
-            None
+            dict: Number of files 'written', 'skipped' and 'linked'.
         """
-        df_list = [self.data] if by is None else self.split(by)
-        if remove_empty_columns:
-            df_list = [drop_empty_columns(df) for df in df_list]
+        # When the data is split, empty columns are left out of the groups by split
+        summary = self.write_groups(self._report_groups(paths, by, remove_empty_columns),
+                                    remove_empty_columns and by is None, writer=writer, manifest=manifest)
+        self._logger.info(f'Saved cleaned report files: {summary["written"]} written, '
+                          f'{summary["skipped"]} skipped, {summary["linked"]} linked (unchanged).')
+        return summary
+
+    def _report_groups(self, paths: PathResolver, by: list[str] = None, remove_empty_columns: bool = True):
+        if self.sparse is not None:
+            groups = [self.sparse.to_frame()] if by is None else self.sparse.split(by)
+        else:
+            groups = [self.data] if by is None else self.split(by, remove_empty_columns)
+        # Create the directories of all participants at once, rather than checking for one before each file
+        participants = self.sparse.index if self.sparse is not None else self.data
+        paths.make_subject_dirs(participants.participant_id.dropna().unique())
+        for df in groups:
+            subject_id, event_name = df.participant_id.iloc[0], df.output_form.iloc[0]
+            yield (f'reports/{subject_id}/PROM-{event_name}',
+                   paths.get_subject_questionnaire(subject_id=subject_id, event_name=event_name),
+                   df)
+
+    @profiled()
+    def save_partitioned_data(self, paths: PathResolver, partition_cols: list[str] = None):
+        """
+        Save cleaned questionnaire report data as a single Parquet dataset, partitioned by the specified columns.
 
-        for df in df_list:
-            self._logger.debug(f'Saving report with shape: {df.shape}')
-            file_path = paths.get_subject_questionnaire(subject_id=df.participant_id.iloc[0],
-                                                        event_name=df.output_form.iloc[0])
-            df.drop(columns=['output_form']).to_csv(file_path, index=False)
-            self._logger.debug(f'Saved cleaned report data to {file_path}')
+        Partitions present in the data replace the existing ones, while other partitions of the dataset are kept,
+        so that incremental downloads only rewrite the partitions of the modified participants.
 
+        Args:
+            paths (PathResolver): PathResolver instance to get the save paths.
+            partition_cols (list): Columns to partition the dataset by (participant_id and output_form by default).
+
+        Returns:
+            None
+        """
+        partition_cols = partition_cols or ['participant_id', 'output_form']
+        dataset = paths.get_reports_dataset()
+        data = self.sparse.to_frame() if self.sparse is not None else self.data
+        data.to_parquet(dataset, index=False, partition_cols=partition_cols, existing_data_behavior='delete_matching')
+        self._logger.info(f'Saved cleaned report data to partitioned dataset {dataset}')
+
+    @profiled()
     def save_raw_data(self, paths: PathResolver):
         """
         Save raw data to a specified path.
 
+        If the raw report was already spooled to that path during the download, it is not written again.
+
         Args:
             raw_data (pd.DataFrame): DataFrame containing the raw data.
             paths (PathResolver): PathResolver instance to get the save paths.
@@ -88,7 +244,10 @@ class Report(DataMixin):
         Returns:
             None
         """
-        self.raw_data.to_csv(paths.get_raw_report_file(), index=False)
+        if self.raw_file is not None and self.raw_file == paths.get_raw_report_file() and self.raw_file.exists():
+            self._logger.info(f'Raw data already saved to {self.raw_file} during download')
+            return
+        add_bytes_written(write_table(self.raw_data, paths.get_raw_report_file()))
         self._logger.info(f'Saved raw data to {paths.get_raw_report_file()}')
 
 
@@ -112,7 +271,9 @@ class Variables(DataMixin):
     def __str__(self):
         return f"Variables with {self.raw_data.shape[0]} entries"
 
-    def save_cleaned_data(self, paths: PathResolver, by: list[str] = None, remove_empty_columns: bool = True):
+    @profiled()
+    def save_cleaned_data(self, paths: PathResolver, by: list[str] = None, remove_empty_columns: bool = True,
+                          writer: GroupWriter = None, manifest: Manifest = None) -> dict[str, int]:
         """
         Save cleaned variables data.
 
@@ -120,20 +281,23 @@ class Variables(DataMixin):
             paths (PathResolver): PathResolver instance to get the save paths.
             by (list): List of columns to split the DataFrame by.
             remove_empty_columns (bool): Whether to remove empty columns before saving.
+            writer (GroupWriter): Writer running the file writes (serial if not given).
+            manifest (Manifest): Manifest used to skip or link unchanged files. Every file is written if not given.
 
         Returns:
-            None
+            dict: Number of files 'written', 'skipped' and 'linked'.
         """
-        df_list = [self.data] if by is None else self.split(by)
-        if remove_empty_columns:
-            df_list = [drop_empty_columns(df) for df in df_list]
-
-        for df in df_list:
-            self._logger.debug(f'Saving {len(df)} variables for form: {df.output_form.iloc[0]}')
-            file_path = paths.get_variables_file(form_name=df.output_form.iloc[0])
-            df.drop(columns=['output_form']).to_csv(file_path, index=False)
-            self._logger.debug(f'Saved cleaned variables data to {file_path}')
-
+        groups = (
+            (f'meta/{df.output_form.iloc[0]}_variables', paths.get_variables_file(form_name=df.output_form.iloc[0]), df)
+            for df in ([self.data] if by is None else self.split(by, remove_empty_columns))
+        )
+        # When the data is split, empty columns are left out of the groups by split
+        summary = self.write_groups(groups, remove_empty_columns and by is None, writer=writer, manifest=manifest)
+        self._logger.info(f'Saved cleaned variables files: {summary["written"]} written, '
+                          f'{summary["skipped"]} skipped, {summary["linked"]} linked (unchanged).')
+        return summary
+
+    @profiled()
     def save_raw_data(self, paths: PathResolver):
         """
         Save raw data to a specified path.
@@ -145,5 +309,5 @@ class Variables(DataMixin):
         Returns:
             None
         """
-        self.raw_data.to_csv(paths.get_raw_variables_file(), index=False)
+        add_bytes_written(write_table(self.raw_data, paths.get_raw_variables_file()))
         self._logger.info(f'Saved raw data to {paths.get_raw_variables_file()}')
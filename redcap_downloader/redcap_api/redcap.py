@@ -1,10 +1,90 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
 from io import StringIO
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
 
 from .dom import Variables, Report
+from .schema import ReportSchema, SchemaMismatchError
+from .streaming import ResponseStream
 from ..config.properties import Properties
+from ..profiling import profiled
+from ..storage.atomic import atomic_write
+from ..storage.metadata_cache import MetadataCache
+
+QUESTIONNAIRE_FORMS = [
+    'participant_information',
+    'screening',
+    'baseline_researcher_cb',
+    'baseline_participant_questionnaire',
+    'postbaseline_researcher_admin',
+    'm_followup_researcher_questionnaire',
+    'm_followup_participant_questionnaire',
+    'm_followup_researcher_questionnaire_e70e',
+    'm_followup_participant_questionnaire_6517',
+    'm_followup_researcher_questionnaire_df3a',
+    'm_followup_participant_questionnaire_13e1'
+]
+
+
+def metadata_request(token: str) -> dict:
+    """Build the form data of a request for the data dictionary of the questionnaire forms."""
+    return {
+        'token': token,
+        'content': 'metadata',
+        'format': 'csv',
+        'returnFormat': 'json',
+        **{f'forms[{i}]': form for i, form in enumerate(QUESTIONNAIRE_FORMS)}
+    }
+
+
+def report_request(token: str, report_id: int) -> dict:
+    """Build the form data of a request for a report."""
+    return {
+        'token': token,
+        'content': 'report',
+        'format': 'csv',
+        'report_id': report_id,
+        'csvDelimiter': '',
+        'rawOrLabel': 'raw',
+        'rawOrLabelHeaders': 'raw',
+        'exportCheckboxLabel': 'true',
+        'returnFormat': 'json'
+    }
+
+
+def create_session(properties: Properties, pool_size: int = None) -> requests.Session:
+    """
+    Create a pooled HTTP session with exponential backoff on connection errors, 429 and 5xx responses.
+
+    The session can be shared by several REDCap instances (e.g. one per report of a batch).
+
+    Args:
+        properties (Properties): Properties holding the pool size and retry settings.
+        pool_size (int): Maximum number of pooled connections (the pool size of the properties by default).
+
+    Returns:
+        requests.Session: Configured session.
+    """
+    pool_size = pool_size or properties.pool_size
+    retry = Retry(
+        total=properties.max_retries,
+        backoff_factor=properties.backoff_factor,
+        status_forcelist=REDCap.RETRY_STATUS_CODES,
+        allowed_methods=frozenset(['POST']),  # API exports are read-only, so POST is safe to retry
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
 
 
 class REDCap:
@@ -15,77 +95,340 @@ class REDCap:
         token (str): API token for the REDCap project.
         base_url (str): Base URL for the REDCap API.
         report_id (int): ID of the report to fetch.
+        stream (bool): Whether to stream the report into the CSV parser instead of buffering the whole response.
+        batch_size (int): Number of records exported per request in batched mode (0 to export the report at once).
+        max_workers (int): Number of batches exported concurrently in batched mode.
+        timeout (tuple): Connect and read timeouts (in seconds) applied to every request.
+        session (requests.Session): Pooled HTTP session, retrying on connection errors, 429 and 5xx responses. A
+            session is created from the properties if none is given, and is then closed by close().
+        metadata_cache (MetadataCache): Optional on-disk cache of the data dictionary.
 
     Methods:
         get_questionnaire_variables(): Fetches the list of questionnaire variables from the REDCap API.
-        get_questionnaire_report(): Fetches the questionnaire answers from the REDCap API.
+        get_metadata_fingerprint(): Fetches a cheap fingerprint of the project's data dictionary.
+        get_questionnaire_report(raw_file, schema): Fetches the questionnaire answers from the REDCap API.
+        download_questionnaire_report(file_path): Downloads the questionnaire answers to a CSV file, without
+            parsing them.
+        get_record_ids(modified_since): Fetches the list of record IDs of the project.
+        get_questionnaire_records(record_ids, schema): Fetches the questionnaire answers in batches of records.
+        close(): Closes the HTTP session, if it was created by this instance.
     """
-    def __init__(self, properties: Properties):
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+    RECORD_ID_FIELD = 'study_id'
+
+    def __init__(self, properties: Properties, metadata_cache: MetadataCache = None,
+                 session: requests.Session = None):
         self._logger = logging.getLogger('REDCap')
         self.token = properties.redcap_token
-        self.base_url = 'https://redcap.usher.ed.ac.uk/api/'
+        self.base_url = properties.api_url
         self.report_id = properties.report_id
+        self.stream = properties.stream_download
+        self.batch_size = properties.batch_size
+        self.max_workers = properties.max_workers
+        self.timeout = (properties.connect_timeout, properties.read_timeout)
         self.properties = properties
+        self._owns_session = session is None
+        self.session = session or create_session(properties)
+        self.metadata_cache = metadata_cache
+
+    def _post(self, data: dict, stream: bool = False) -> requests.Response:
+        """
+        Send a POST request to the REDCap API through the pooled session, and log its latency and size.
+
+        Args:
+            data (dict): Form data of the request.
+            stream (bool): Whether to defer downloading the response body.
+
+        Returns:
+            requests.Response: Response of the REDCap API.
+        """
+        start = time.perf_counter()
+        r = self.session.post(self.base_url, data=data, timeout=self.timeout, stream=stream)
+        elapsed = time.perf_counter() - start
+        if stream:
+            self._logger.debug(f"POST content={data['content']}: HTTP {r.status_code}, "
+                               f"headers received in {elapsed:.3f} s")
+        else:
+            self._logger.info(f"POST content={data['content']}: HTTP {r.status_code}, "
+                              f"{len(r.content)} bytes in {elapsed:.3f} s")
+        return r
+
+    def close(self):
+        """Close the HTTP session and release its pooled connections, if the session was created by this instance."""
+        if self._owns_session:
+            self.session.close()
 
+    @profiled()
     def get_questionnaire_variables(self):
         """
         Fetch the list of questionnaire variables from the REDCap API.
 
+        If a metadata cache is set, the cached data dictionary is reused as long as the fingerprint of the project
+        does not change (see get_metadata_fingerprint).
+
         Args:
             None
 
         Returns:
             Variables: Variables instance containing the raw data.
         """
+        if self.metadata_cache is not None:
+            cache_key = MetadataCache.get_key(self.base_url, self.token, *QUESTIONNAIRE_FORMS)
+            fingerprint = self.get_metadata_fingerprint()
+            cached = self.metadata_cache.load(cache_key, fingerprint)
+            if cached is not None:
+                return Variables(cached)
+
+        r = self._post(metadata_request(self.token))
+        if r.status_code != 200:
+            self._logger.error(f"Failed to fetch variable dictionary: {r.text}")
+            raise Exception(f"HTTP Error: {r.status_code}")
+        self._logger.info('Accessing variable dictionary through the REDCap API.')
+        variables_data = pd.read_csv(StringIO(r.text))
+        if self.metadata_cache is not None:
+            self.metadata_cache.save(cache_key, fingerprint, variables_data)
+        return Variables(variables_data)
+
+    @profiled()
+    def get_metadata_fingerprint(self) -> str:
+        """
+        Fetch a fingerprint of the project's data dictionary from the REDCap API.
+
+        The fingerprint is a hash of the list of exported field names, which is much smaller than the data dictionary
+        and changes whenever a field or checkbox choice is added, removed or renamed.
+
+        Args:
+            None
+
+        Returns:
+            str: Fingerprint of the data dictionary.
+        """
         data = {
             'token': self.token,
-            'content': 'metadata',
+            'content': 'exportFieldNames',
             'format': 'csv',
-            'returnFormat': 'json',
-            'forms[0]': 'participant_information',
-            'forms[1]': 'screening',
-            'forms[2]': 'baseline_researcher_cb',
-            'forms[3]': 'baseline_participant_questionnaire',
-            'forms[4]': 'postbaseline_researcher_admin',
-            'forms[5]': 'm_followup_researcher_questionnaire',
-            'forms[6]': 'm_followup_participant_questionnaire',
-            'forms[7]': 'm_followup_researcher_questionnaire_e70e',
-            'forms[8]': 'm_followup_participant_questionnaire_6517',
-            'forms[9]': 'm_followup_researcher_questionnaire_df3a',
-            'forms[10]': 'm_followup_participant_questionnaire_13e1'
+            'returnFormat': 'json'
         }
-        r = requests.post(self.base_url, data=data)
+        r = self._post(data)
         if r.status_code != 200:
-            self._logger.error(f"Failed to fetch variable dictionary: {r.text}")
+            self._logger.error(f"Failed to fetch exported field names: {r.text}")
             raise Exception(f"HTTP Error: {r.status_code}")
-        self._logger.info('Accessing variable dictionary through the REDCap API.')
-        return Variables(pd.read_csv(StringIO(r.text)))
+        return MetadataCache.get_fingerprint(r.content)
 
-    def get_questionnaire_report(self):
+    @profiled()
+    def get_questionnaire_report(self, raw_file: str | Path = None, schema: ReportSchema = None):
         """
         Fetch the questionnaire answers from the REDCap API.
 
+        If a batch size is configured, the answers are exported in batches of records instead of through the report
+        (see get_questionnaire_records).
+
         Args:
+            raw_file (str | Path): Optional path where the raw CSV is spooled while it is parsed. Only used in
+                streaming mode; the Report then remembers it so that save_raw_data does not write it again.
+            schema (ReportSchema): Optional dtypes of the report columns. If the report does not match it, the
+                column types are inferred instead (a streamed report is then downloaded again).
+
+        Returns:
+            Report: Report instance containing the raw data.
+        """
+        if self.batch_size > 0:
+            return self.get_questionnaire_records(schema=schema)
+
+        data = report_request(self.token, self.report_id)
+
+        if not self.stream:
+            r = self._post(data)
+            if r.status_code != 200:
+                self._logger.error(f"Failed to fetch report: {r.text}")
+                raise Exception(f"HTTP Error: {r.status_code}")
+            self._logger.info(f'Fetched report {self.report_id} through the REDCap API.')
+            return Report(self._read_csv(r.text, schema))
+
+        start = time.perf_counter()
+        read_csv = schema.read_csv if schema is not None else pd.read_csv
+        try:
+            with self._post(data, stream=True) as r:
+                if r.status_code != 200:
+                    self._logger.error(f"Failed to fetch report: {r.text}")
+                    raise Exception(f"HTTP Error: {r.status_code}")
+                with ResponseStream(r, spool_file=raw_file) as stream:
+                    report_data = read_csv(stream, encoding=r.encoding or 'utf-8')
+        except SchemaMismatchError as e:
+            self._logger.warning(f'Report does not match the data dictionary ({e}), downloading it again.')
+            return self.get_questionnaire_report(raw_file=raw_file)
+        self._logger.info(f'Streamed report {self.report_id} through the REDCap API '
+                          f'({stream.bytes_read} bytes in {time.perf_counter() - start:.3f} s).')
+        return Report(report_data, raw_file=raw_file)
+
+    @profiled()
+    def download_questionnaire_report(self, file_path: str | Path) -> Path:
+        """
+        Download the questionnaire answers from the REDCap API to a CSV file, without parsing them.
+
+        The report is written to the file as it is received, so that it never needs to fit in memory. If a batch
+        size is configured, the answers are exported in batches of records instead of through the report, and the
+        batches are appended to the file in record order.
+
+        Args:
+            file_path (str | Path): Path of the CSV file. It is replaced once the download is complete.
+
+        Returns:
+            Path: Path of the CSV file.
+        """
+        file_path = Path(file_path)
+        start = time.perf_counter()
+
+        def write_report(f) -> int:
+            if self.batch_size > 0:
+                self._download_records(f)
+            else:
+                with self._post(report_request(self.token, self.report_id), stream=True) as r:
+                    if r.status_code != 200:
+                        self._logger.error(f"Failed to fetch report: {r.text}")
+                        raise Exception(f"HTTP Error: {r.status_code}")
+                    for chunk in r.iter_content(chunk_size=1024 * 1024):
+                        f.write(chunk)
+            return f.tell()
+
+        n_bytes = atomic_write(file_path, write_report, mode='wb')
+        self._logger.info(f'Downloaded report {self.report_id} to {file_path} '
+                          f'({n_bytes} bytes in {time.perf_counter() - start:.3f} s).')
+        return file_path
+
+    def _download_records(self, f):
+        """
+        Export the questionnaire forms in batches of records, and append them to an open binary file.
+
+        Batches are exported max_workers at a time, so that at most max_workers batches are held in memory.
+
+        Args:
+            f: Binary file receiving the records, in CSV format, with the header of the first batch only.
+
+        Returns:
             None
+        """
+        record_ids = self.get_record_ids()
+        batches = [record_ids[i:i + self.batch_size] for i in range(0, len(record_ids), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for i in range(0, len(batches), self.max_workers):
+                for text in executor.map(self._export_records_batch, batches[i:i + self.max_workers]):
+                    f.write((text if f.tell() == 0 else text.partition('\n')[2]).encode())
+        self._logger.info(f'Fetched {len(record_ids)} records in {len(batches)} batches through the REDCap API.')
+
+    @profiled()
+    def get_record_ids(self, modified_since: datetime = None) -> list[str]:
+        """
+        Fetch the list of record IDs of the project from the REDCap API.
+
+        Args:
+            modified_since (datetime): If given, only list records created or modified since that time.
+
+        Returns:
+            list: Record IDs, in the order returned by REDCap.
+        """
+        data = {
+            'token': self.token,
+            'content': 'record',
+            'format': 'csv',
+            'type': 'flat',
+            'fields[0]': self.RECORD_ID_FIELD,
+            'returnFormat': 'json'
+        }
+        if modified_since is not None:
+            data['dateRangeBegin'] = modified_since.strftime('%Y-%m-%d %H:%M:%S')
+        r = self._post(data)
+        if r.status_code != 200:
+            self._logger.error(f"Failed to fetch record IDs: {r.text}")
+            raise Exception(f"HTTP Error: {r.status_code}")
+        record_ids = pd.read_csv(StringIO(r.text), dtype=str)[self.RECORD_ID_FIELD].drop_duplicates().tolist()
+        self._logger.info(f'Fetched {len(record_ids)} record IDs through the REDCap API.')
+        return record_ids
+
+    @profiled()
+    def get_questionnaire_records(self, record_ids: list[str] = None, schema: ReportSchema = None) -> Report:
+        """
+        Fetch the questionnaire answers from the REDCap API, in batches of records exported concurrently.
+
+        The questionnaire forms are exported for batch_size records per request (all records at once if batch_size
+        is 0) over a pool of max_workers threads. Batches are concatenated in record order, regardless of the order
+        in which they complete.
+
+        Args:
+            record_ids (list): IDs of the records to export. All records of the project are listed if not given.
+            schema (ReportSchema): Optional dtypes of the report columns.
 
         Returns:
             Report: Report instance containing the raw data.
         """
+        if record_ids is None:
+            record_ids = self.get_record_ids()
+        batch_size = self.batch_size if self.batch_size > 0 else max(len(record_ids), 1)
+        batches = [record_ids[i:i + batch_size] for i in range(0, len(record_ids), batch_size)]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            batch_data = list(executor.map(self._get_records_batch, batches, [schema] * len(batches)))
+        self._logger.info(f'Fetched {len(record_ids)} records in {len(batches)} batches through the REDCap API.')
+        if not batch_data:
+            return Report(pd.DataFrame(columns=[self.RECORD_ID_FIELD, 'redcap_event_name']))
+        report_data = pd.concat(batch_data, ignore_index=True)
+        return Report(schema.categorize(report_data) if schema is not None else report_data)
+
+    def _get_records_batch(self, record_ids: list[str], schema: ReportSchema = None) -> pd.DataFrame:
+        """
+        Export the questionnaire forms for a batch of records.
+
+        Args:
+            record_ids (list): IDs of the records to export.
+            schema (ReportSchema): Optional dtypes of the report columns.
+
+        Returns:
+            pd.DataFrame: Exported records.
+        """
+        return self._read_csv(self._export_records_batch(record_ids), schema)
+
+    def _export_records_batch(self, record_ids: list[str]) -> str:
+        """
+        Export the questionnaire forms for a batch of records, without parsing them.
+
+        Args:
+            record_ids (list): IDs of the records to export.
+
+        Returns:
+            str: Exported records, in CSV format.
+        """
         data = {
             'token': self.token,
-            'content': 'report',
+            'content': 'record',
             'format': 'csv',
-            'report_id': self.report_id,
+            'type': 'flat',
             'csvDelimiter': '',
             'rawOrLabel': 'raw',
             'rawOrLabelHeaders': 'raw',
             'exportCheckboxLabel': 'true',
-            'returnFormat': 'json'
+            'returnFormat': 'json',
+            **{f'records[{i}]': record_id for i, record_id in enumerate(record_ids)},
+            **{f'forms[{i}]': form for i, form in enumerate(QUESTIONNAIRE_FORMS)}
         }
-
-        r = requests.post(self.base_url, data=data)
+        r = self._post(data)
         if r.status_code != 200:
-            self._logger.error(f"Failed to fetch report: {r.text}")
+            self._logger.error(f"Failed to fetch records {record_ids[0]} to {record_ids[-1]}: {r.text}")
             raise Exception(f"HTTP Error: {r.status_code}")
-        self._logger.info(f'Fetched report {self.report_id} through the REDCap API.')
-        return Report(pd.read_csv(StringIO(r.text)))
+        return r.text
+
+    def _read_csv(self, text: str, schema: ReportSchema = None) -> pd.DataFrame:
+        """
+        Parse exported records with a schema, or infer the column types if they do not match it.
+
+        Args:
+            text (str): Exported records, in CSV format.
+            schema (ReportSchema): Optional dtypes of the columns.
+
+        Returns:
+            pd.DataFrame: Parsed records.
+        """
+        if schema is not None:
+            try:
+                return schema.read_csv(StringIO(text))
+            except SchemaMismatchError as e:
+                self._logger.warning(f'Records do not match the data dictionary ({e}), inferring column types.')
+        return pd.read_csv(StringIO(text))
@@ -0,0 +1,175 @@
+import logging
+import re
+
+import pandas as pd
+
+# Columns added by REDCap to every record export
+EXPORT_COLUMN_DTYPES = {
+    'redcap_event_name': 'category',
+    'redcap_repeat_instrument': 'category',
+    'redcap_repeat_instance': 'Int64',
+    'redcap_data_access_group': 'category',
+}
+
+# Dtype of the fields of each field type (text fields depend on their validation, see field_dtype)
+FIELD_TYPE_DTYPES = {
+    'radio': 'category',
+    'dropdown': 'category',
+    'sql': 'category',
+    'yesno': 'Int8',
+    'truefalse': 'Int8',
+    'slider': 'Int64',
+    'calc': 'float64',
+    'notes': 'str',
+    'file': 'str',
+}
+
+
+class SchemaMismatchError(ValueError):
+    """Raised when the values of a report do not match the dtypes of its schema."""
+
+
+def field_dtype(field_type: str, validation: str | None) -> str | None:
+    """
+    Get the dtype of the values of a field, from its type and validation in the data dictionary.
+
+    Args:
+        field_type (str): Field type (text, radio, dropdown, calc, ...).
+        validation (str): Text validation type (integer, number, date_ymd, ...), if any.
+
+    Returns:
+        str: Dtype of the field, 'datetime' for date and time fields, or None if the field has no value column
+            (descriptive fields) or an unknown type.
+    """
+    if field_type != 'text':
+        return FIELD_TYPE_DTYPES.get(field_type)
+    validation = validation if isinstance(validation, str) else ''
+    if validation == 'integer':
+        return 'Int64'
+    if validation.startswith('number'):
+        return 'float64'
+    if validation.startswith(('date_', 'datetime_')):
+        return 'datetime'
+    return 'str'
+
+
+def checkbox_columns(field_name: str, choices: str | None) -> list[str]:
+    """
+    Get the export columns of a checkbox field, one per choice.
+
+    Args:
+        field_name (str): Name of the checkbox field.
+        choices (str): Choices of the field, as in the data dictionary ("1, Yes | 2, No").
+
+    Returns:
+        list: Names of the export columns of the field ({field_name}___{choice code}).
+    """
+    if not isinstance(choices, str):
+        return []
+    codes = [choice.split(',', 1)[0].strip() for choice in choices.split('|')]
+    return [f"{field_name}___{re.sub(r'[^a-z0-9_]', '_', code.lower())}" for code in codes if code]
+
+
+class ReportSchema:
+    """
+    Dtypes of the columns of a report, derived from the data dictionary of the project.
+
+    Attributes:
+        dtypes (dict): Dtype of each column, passed to the CSV parser.
+        date_columns (list): Columns holding dates or times, converted after parsing.
+
+    Methods:
+        from_variables(variables): Builds the schema from the raw data dictionary.
+        read_csv(source): Parses a report with the schema.
+        categorize(df): Restores the categorical columns of a report concatenated from several parts.
+    """
+    def __init__(self, dtypes: dict[str, str], date_columns: list[str] = None):
+        self._logger = logging.getLogger('ReportSchema')
+        self.dtypes = dtypes
+        self.date_columns = date_columns or []
+
+    def __str__(self):
+        return f"ReportSchema with {len(self.dtypes)} typed columns and {len(self.date_columns)} date columns"
+
+    @classmethod
+    def from_variables(cls, variables: pd.DataFrame) -> 'ReportSchema':
+        """
+        Build the schema of the reports from the raw data dictionary.
+
+        Choice fields (radio, dropdown) are categoricals, checkboxes are booleans, integer and number fields are
+        nullable integers and floats, date fields are datetimes, and other text fields are strings. Columns missing
+        from the data dictionary keep the types inferred by the CSV parser.
+
+        Args:
+            variables (pd.DataFrame): Raw data dictionary, as exported by the REDCap API.
+
+        Returns:
+            ReportSchema: Schema of the reports.
+        """
+        dtypes = dict(EXPORT_COLUMN_DTYPES)
+        date_columns = []
+        validations = variables.get('text_validation_type_or_show_slider_number',
+                                    pd.Series(None, index=variables.index))
+        choices = variables.get('select_choices_or_calculations', pd.Series(None, index=variables.index))
+        for field_name, field_type, validation, field_choices in zip(variables.field_name, variables.field_type,
+                                                                     validations, choices):
+            if field_type == 'checkbox':
+                dtypes.update(dict.fromkeys(checkbox_columns(field_name, field_choices), 'boolean'))
+                continue
+            dtype = field_dtype(field_type, validation)
+            if dtype == 'datetime':
+                dtypes[field_name] = 'str'
+                date_columns.append(field_name)
+            elif dtype is not None:
+                dtypes[field_name] = dtype
+        dtypes.update({f'{form_name}_complete': 'Int8' for form_name in variables.form_name.unique()})
+        return cls(dtypes, date_columns)
+
+    def read_csv(self, source, **kwargs) -> pd.DataFrame:
+        """
+        Parse a report with the schema.
+
+        Date columns whose values are not all valid ISO dates are kept as strings.
+
+        Args:
+            source: Path or file-like object of the CSV report.
+            **kwargs: Other arguments of pandas.read_csv.
+
+        Returns:
+            pd.DataFrame: Report data.
+
+        Raises:
+            SchemaMismatchError: If a value does not match the dtype of its column. Errors of the parser and of the
+                source (e.g. a malformed or truncated CSV) are raised as they are.
+        """
+        # Parsing in chunks would concatenate the typed columns of every chunk, which is slower than parsing at once
+        kwargs.setdefault('low_memory', False)
+        try:
+            df = pd.read_csv(source, dtype=self.dtypes, **kwargs)
+        except (pd.errors.ParserError, UnicodeError):
+            raise
+        except (ValueError, TypeError) as e:
+            raise SchemaMismatchError(str(e)) from e
+        for column in self.date_columns:
+            if column in df.columns:
+                try:
+                    df[column] = pd.to_datetime(df[column], format='ISO8601')
+                except ValueError:
+                    self._logger.warning(f'Column {column} contains invalid dates, keeping it as strings.')
+        return df
+
+    def categorize(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Restore the categorical columns of a report concatenated from several parts.
+
+        Concatenating categoricals with different categories gives object columns, which are converted back.
+
+        Args:
+            df (pd.DataFrame): Report data.
+
+        Returns:
+            pd.DataFrame: Report data with the categorical columns of the schema.
+        """
+        return df.astype({column: 'category' for column, dtype in self.dtypes.items()
+                          if dtype == 'category' and column in df.columns
+                          and not isinstance(df[column].dtype, pd.CategoricalDtype)})
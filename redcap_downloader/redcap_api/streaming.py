@@ -0,0 +1,55 @@
+import io
+from pathlib import Path
+
+import requests
+
+
+class ResponseStream(io.RawIOBase):
+    """
+    Read-only binary file object wrapping a streamed HTTP response.
+
+    The response body is pulled in chunks as the consumer (e.g. pd.read_csv) reads from it, so the full body is
+    never held in memory. If a spool file is given, every chunk is also written to it as it is read.
+
+    Attributes:
+        response (requests.Response): Response opened with stream=True.
+        chunk_size (int): Number of bytes requested from the connection at a time.
+        spool_file (Path): Optional path of a file receiving a verbatim copy of the body.
+        bytes_read (int): Number of bytes read from the response so far.
+    """
+    def __init__(self, response: requests.Response, chunk_size: int = 1024 * 1024, spool_file: str | Path = None):
+        super().__init__()
+        self.response = response
+        self.chunk_size = chunk_size
+        self.spool_file = Path(spool_file) if spool_file is not None else None
+        self.bytes_read = 0
+        self._chunks = response.iter_content(chunk_size=chunk_size)
+        self._buffer = b''
+        self._spool = None
+        if self.spool_file is not None:
+            # A new file is created, so that a file hard-linked from a previous snapshot is not truncated
+            self.spool_file.unlink(missing_ok=True)
+            self._spool = self.spool_file.open('wb')
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._buffer = chunk
+            self.bytes_read += len(chunk)
+            if self._spool is not None:
+                self._spool.write(chunk)
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+    def close(self):
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+        super().close()
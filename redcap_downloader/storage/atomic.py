@@ -0,0 +1,32 @@
+import os
+from collections.abc import Callable
+from pathlib import Path
+from typing import IO, TypeVar
+
+T = TypeVar('T')
+
+
+def atomic_write(file_path: str | Path, writer: Callable[[IO], T], mode: str = 'w') -> T:
+    """
+    Write a file through a temporary file, which then replaces the destination.
+
+    Readers never see a partially written file, and a file hard-linked from a previous snapshot (see PathResolver)
+    is replaced rather than modified in place. The temporary file is removed if the writer fails.
+
+    Args:
+        file_path (str | Path): Path of the file.
+        writer (callable): Function writing the content of the file to the open temporary file.
+        mode (str): Mode the temporary file is opened in: 'w' for text, or 'wb' for binary content.
+
+    Returns:
+        Value returned by the writer.
+    """
+    file_path = Path(file_path)
+    temp_path = file_path.with_name(f'.{file_path.name}.tmp')
+    try:
+        with temp_path.open(mode) as f:
+            result = writer(f)
+        os.replace(temp_path, file_path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+    return result
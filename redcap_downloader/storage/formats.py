@@ -0,0 +1,72 @@
+import importlib.util
+import io
+from pathlib import Path
+
+import pandas as pd
+
+from .atomic import atomic_write
+
+FILE_FORMATS = ('csv', 'parquet', 'feather')
+
+
+def check_file_format(file_format: str):
+    """
+    Check that a file format is supported, and that its optional dependencies are installed.
+
+    Args:
+        file_format (str): One of 'csv', 'parquet' or 'feather'.
+
+    Returns:
+        None
+
+    Raises:
+        ValueError: If the file format is not supported.
+        ImportError: If pyarrow is required by the file format but not installed.
+    """
+    if file_format not in FILE_FORMATS:
+        raise ValueError(f'Unknown file format: {file_format}. Use one of {", ".join(FILE_FORMATS)}.')
+    if file_format != 'csv' and importlib.util.find_spec('pyarrow') is None:
+        raise ImportError(f'Saving data as {file_format} requires pyarrow. '
+                          'Install it with: pip install "redcap_downloader[parquet]"')
+
+
+def write_table(df: pd.DataFrame, file_path: str | Path) -> int:
+    """
+    Write a DataFrame to a file, in the format given by the file extension.
+
+    The file is serialized in memory and written at once (see atomic_write).
+
+    Args:
+        df (pd.DataFrame): DataFrame to be written. Its index is not saved.
+        file_path (str | Path): Path of the file (.csv, .parquet or .feather).
+
+    Returns:
+        int: Number of bytes written.
+    """
+    file_path = Path(file_path)
+    buffer = io.BytesIO()
+    if file_path.suffix == '.parquet':
+        df.to_parquet(buffer, index=False)
+    elif file_path.suffix == '.feather':
+        df.reset_index(drop=True).to_feather(buffer)
+    else:
+        df.to_csv(buffer, index=False)
+    return atomic_write(file_path, lambda f: f.write(buffer.getbuffer()), mode='wb')
+
+
+def read_table(file_path: str | Path) -> pd.DataFrame:
+    """
+    Read a DataFrame from a file, in the format given by the file extension.
+
+    Args:
+        file_path (str | Path): Path of the file (.csv, .parquet or .feather), or of a partitioned Parquet dataset.
+
+    Returns:
+        pd.DataFrame: DataFrame read from the file.
+    """
+    file_path = Path(file_path)
+    if file_path.suffix == '.parquet' or file_path.is_dir():
+        return pd.read_parquet(file_path)
+    if file_path.suffix == '.feather':
+        return pd.read_feather(file_path)
+    return pd.read_csv(file_path)
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from .atomic import atomic_write
+
+UNCHANGED_FILE_POLICIES = ('write', 'skip', 'link')
+
+
+def hash_table(df: pd.DataFrame) -> str:
+    """
+    Compute a stable hash of the content of a DataFrame: column names, dtypes and values, ignoring the index.
+
+    Args:
+        df (pd.DataFrame): DataFrame to be hashed.
+
+    Returns:
+        str: Hexadecimal SHA-256 digest.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([[str(c), str(t)] for c, t in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def reuse_unchanged_file(content_hash: str, file_path: Path, previous: dict | None, policy: str) -> str | None:
+    """
+    Reuse the previous file of a group if its content did not change, instead of writing it again.
+
+    Args:
+        content_hash (str): Hash of the content to be written.
+        file_path (Path): Path the content would be written to.
+        previous (dict): Manifest entry of the group from a previous run ('hash' and 'file'), if any.
+        policy (str): What to do with unchanged content: 'write' it again, 'skip' it, or 'link' the new file to the
+            previous one.
+
+    Returns:
+        str: 'skipped' or 'linked' if the previous file was reused, None if the content must be written.
+    """
+    if policy == 'write' or previous is None or previous['hash'] != content_hash:
+        return None
+    previous_file = Path(previous['file'])
+    if not previous_file.exists() or previous_file.suffix != file_path.suffix:
+        return None
+    if policy == 'skip' or previous_file == file_path:
+        return 'skipped'
+    try:
+        if file_path.exists():
+            file_path.unlink()
+        os.link(previous_file, file_path)
+    except OSError:
+        return None
+    return 'linked'
+
+
+class Manifest:
+    """
+    Content hashes of the files saved by previous runs, persisted as a JSON file in the download directory.
+
+    Files are saved relative to the manifest, so that the manifest stays valid in a copy of the directory (e.g. the
+    next snapshot of staged output).
+
+    Attributes:
+        path (Path): Path of the manifest file.
+        policy (str): What to do with groups whose content did not change: 'write', 'skip' or 'link'.
+        entries (dict): Mapping of group keys to the hash of their content and the file it was saved to.
+
+    Methods:
+        get(key): Returns the entry of a group, if any.
+        update(key, content_hash, file_path): Records the content and file of a group.
+        save(): Writes the manifest file.
+    """
+    def __init__(self, path: str | Path, policy: str = 'link'):
+        if policy not in UNCHANGED_FILE_POLICIES:
+            raise ValueError(f'Unknown policy for unchanged files: {policy}. '
+                             f'Use one of {", ".join(UNCHANGED_FILE_POLICIES)}.')
+        self._logger = logging.getLogger('Manifest')
+        self.path = Path(path)
+        self.policy = policy
+        self.entries = {}
+        if self.path.exists():
+            with self.path.open('r') as f:
+                self.entries = {key: {'hash': entry['hash'], 'file': str(self.path.parent / entry['file'])}
+                                for key, entry in json.load(f).items()}
+            self._logger.debug(f'Loaded {len(self.entries)} entries from {self.path}')
+
+    def get(self, key: str) -> dict | None:
+        return self.entries.get(key)
+
+    def update(self, key: str, content_hash: str, file_path: str | Path):
+        self.entries[key] = {'hash': content_hash, 'file': str(file_path)}
+
+    def save(self):
+        entries = {key: {'hash': entry['hash'], 'file': os.path.relpath(entry['file'], self.path.parent)}
+                   for key, entry in self.entries.items()}
+        atomic_write(self.path, lambda f: json.dump(entries, f, indent=1, sort_keys=True))
+        self._logger.debug(f'Saved {len(self.entries)} entries to {self.path}')
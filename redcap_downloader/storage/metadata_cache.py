@@ -0,0 +1,105 @@
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+from ..version import get_version
+from .atomic import atomic_write
+
+
+class MetadataCache:
+    """
+    On-disk cache of the REDCap data dictionary, validated against a fingerprint of the project.
+
+    The fingerprint is obtained from a cheap API call (e.g. the list of exported field names), and plays the role of
+    an ETag: the cached data dictionary is reused as long as the fingerprint does not change and the cache is not
+    older than max_age. A cache saved by other versions of redcap_downloader or pandas, or that cannot be read, is
+    ignored.
+
+    Attributes:
+        cache_dir (Path): Directory holding the cached data dictionaries.
+        max_age (timedelta): Age after which a cached data dictionary is downloaded again regardless of the
+            fingerprint (catches changes that do not affect the fingerprint, e.g. edited labels).
+
+    Methods:
+        get_key(*parts): Builds a cache key from the project and request parameters.
+        load(key, fingerprint): Returns the cached data dictionary if it is still valid.
+        save(key, fingerprint, data): Saves a data dictionary in the cache.
+    """
+    def __init__(self, cache_dir: str | Path, max_age_days: float = 7):
+        self._logger = logging.getLogger('MetadataCache')
+        self.cache_dir = Path(cache_dir)
+        self.max_age = timedelta(days=max_age_days)
+
+    @staticmethod
+    def get_key(*parts: str) -> str:
+        """Build a cache key by hashing the given parts (which may include secrets such as the API token)."""
+        return hashlib.sha256('\n'.join(parts).encode()).hexdigest()[:16]
+
+    @staticmethod
+    def get_fingerprint(content: str | bytes) -> str:
+        """Hash the response of the fingerprint API call."""
+        return hashlib.sha256(content.encode() if isinstance(content, str) else content).hexdigest()
+
+    def _paths(self, key: str) -> tuple[Path, Path]:
+        return self.cache_dir / f'metadata_{key}.pkl', self.cache_dir / f'metadata_{key}.json'
+
+    def load(self, key: str, fingerprint: str) -> pd.DataFrame | None:
+        """
+        Load a cached data dictionary.
+
+        Args:
+            key (str): Cache key of the project and request.
+            fingerprint (str): Current fingerprint of the project.
+
+        Returns:
+            pd.DataFrame: Cached data dictionary, or None if it is missing, stale, expired or unreadable.
+        """
+        data_file, info_file = self._paths(key)
+        if not data_file.exists() or not info_file.exists():
+            return None
+        try:
+            with info_file.open('r') as f:
+                info = json.load(f)
+            saved_at = datetime.fromisoformat(info['saved_at'])
+            if info['fingerprint'] != fingerprint:
+                self._logger.info('Project fingerprint changed, the cached data dictionary is stale.')
+                return None
+            if (info.get('version'), info.get('pandas')) != (get_version(), pd.__version__):
+                self._logger.info('Data dictionary cached by other versions of redcap_downloader or pandas, '
+                                  'ignoring it.')
+                return None
+            if datetime.now() - saved_at > self.max_age:
+                self._logger.info(f'Cached data dictionary from {saved_at} has expired.')
+                return None
+            data = pd.read_pickle(data_file)
+        except Exception as e:
+            self._logger.warning(f'Could not read the cached data dictionary from {data_file} ({e}), downloading '
+                                 f'it again.')
+            return None
+        self._logger.info(f'Reusing data dictionary cached on {saved_at}.')
+        return data
+
+    def save(self, key: str, fingerprint: str, data: pd.DataFrame):
+        """
+        Save a data dictionary in the cache.
+
+        Args:
+            key (str): Cache key of the project and request.
+            fingerprint (str): Fingerprint of the project when the data dictionary was downloaded.
+            data (pd.DataFrame): Data dictionary.
+
+        Returns:
+            None
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        data_file, info_file = self._paths(key)
+        info = {'fingerprint': fingerprint, 'saved_at': datetime.now().isoformat(), 'version': get_version(),
+                'pandas': pd.__version__}
+        # The data is saved before the info validating it
+        atomic_write(data_file, data.to_pickle, mode='wb')
+        atomic_write(info_file, lambda f: json.dump(info, f))
+        self._logger.debug(f'Saved data dictionary to {data_file}')
@@ -0,0 +1,214 @@
+import logging
+import tempfile
+from collections.abc import Iterator
+from io import StringIO
+from pathlib import Path
+
+import pandas as pd
+
+from ..profiling import profiled
+from ..redcap_api.schema import ReportSchema, SchemaMismatchError
+
+
+class ReportPartitioner:
+    """
+    Reads a raw report from a CSV file in partitions of whole participants, each small enough to be cleaned within a
+    memory limit.
+
+    The file is read as text in chunks of rows, and each partition is parsed on its own. Columns missing from the
+    schema get the type the parser infers over the whole report, so that a partition gives the same values as the
+    same rows of a report held in memory (e.g. integers with missing values anywhere in the report are decimals in
+    every partition). If the rows of each participant are contiguous in the file, as in REDCap exports sorted by
+    record, the partitions are read in a single pass. Otherwise, the rows of each partition are first copied to a
+    temporary file.
+
+    Attributes:
+        file_path (Path): CSV file of the raw report.
+        record_id (str): Column of the participant IDs.
+        memory_limit (float): Approximate memory (in bytes) available to clean one partition.
+        schema (ReportSchema): Optional dtypes of the report columns. Partitions that do not match the column
+            types are parsed with the types inferred from the partition.
+        work_dir (Path): Directory of the temporary partition files (the directory of the report by default).
+
+    Methods:
+        get_partition_rows(): Estimates the number of rows of a partition.
+        infer_dtypes(): Infers the type of the columns missing from the schema over the whole report.
+        is_grouped(): Checks whether the rows of each participant are contiguous.
+        partitions(): Yields the parsed report data, one partition at a time.
+    """
+    SAMPLE_ROWS = 1000
+    # Number of copies of a partition held in memory at the same time while it is parsed, cleaned and saved
+    CLEANING_COPIES = 4
+    ID_CHUNK_ROWS = 100_000
+
+    def __init__(self, file_path: str | Path, record_id: str, memory_limit: float, schema: ReportSchema = None,
+                 work_dir: str | Path = None):
+        self._logger = logging.getLogger('ReportPartitioner')
+        self.file_path = Path(file_path)
+        self.record_id = record_id
+        self.memory_limit = memory_limit
+        self.schema = schema
+        self.work_dir = Path(work_dir) if work_dir is not None else self.file_path.parent
+        self._partition_rows = None
+        self._parser = schema
+
+    def _read_text(self, **kwargs):
+        # Values are kept as text, so that writing them back to CSV gives the same values to the parser
+        return pd.read_csv(self.file_path, dtype=str, keep_default_na=False, na_filter=False, **kwargs)
+
+    def _parse(self, rows: pd.DataFrame | Path) -> pd.DataFrame:
+        """
+        Parse rows read as text, or a CSV file, with the column types of the report.
+
+        Args:
+            rows (pd.DataFrame | Path): Rows of the report as text, or CSV file of the rows.
+
+        Returns:
+            pd.DataFrame: Parsed rows.
+        """
+        if self._parser is not None:
+            try:
+                return self._parser.read_csv(self._source(rows))
+            except SchemaMismatchError as e:
+                self._logger.warning(f'Partition does not match the column types of the report ({e}), inferring '
+                                     f'column types.')
+        return pd.read_csv(self._source(rows))
+
+    @staticmethod
+    def _source(rows: pd.DataFrame | Path) -> StringIO | Path:
+        return StringIO(rows.to_csv(index=False)) if isinstance(rows, pd.DataFrame) else rows
+
+    def get_partition_rows(self) -> int:
+        """
+        Estimate the number of rows of a partition, from the memory used by the first rows of the report once parsed.
+
+        Returns:
+            int: Number of rows of a partition (at least 1).
+        """
+        if self._partition_rows is None:
+            sample = self._parse(self._read_text(nrows=self.SAMPLE_ROWS))
+            row_size = sample.memory_usage(deep=True).sum() / max(len(sample), 1)
+            self._partition_rows = max(int(self.memory_limit / (row_size * self.CLEANING_COPIES)), 1)
+        return self._partition_rows
+
+    def _count_rows(self) -> tuple[bool, dict[str, int]]:
+        """
+        Count the rows of each participant, reading only the participant IDs.
+
+        Returns:
+            tuple: Whether the rows of each participant are contiguous, and the number of rows of each participant,
+                in order of first appearance.
+        """
+        counts = {}
+        n_runs, last_id = 0, None
+        for chunk in self._read_text(usecols=[self.record_id], chunksize=self.ID_CHUNK_ROWS):
+            ids = chunk[self.record_id]
+            if ids.empty:
+                continue
+            run_starts = ids.ne(ids.shift())
+            run_starts.iloc[0] = ids.iloc[0] != last_id
+            n_runs += int(run_starts.sum())
+            last_id = ids.iloc[-1]
+            for participant_id, n_rows in ids.groupby(ids, sort=False).size().items():
+                counts[participant_id] = counts.get(participant_id, 0) + n_rows
+        return n_runs == len(counts), counts
+
+    def infer_dtypes(self) -> dict[str, str]:
+        """
+        Infer the type of the columns missing from the schema, as the parser would for the whole report.
+
+        Each chunk of rows is parsed with inferred types. A column is an integer if all its values are integers, a
+        decimal if they are all numbers (or integers with missing values), a string if they are not all numbers, and
+        otherwise (booleans or empty columns) keeps the type inferred for each partition.
+
+        Returns:
+            dict: Dtype of the columns that have one.
+        """
+        known = set(self.schema.dtypes) if self.schema is not None else set()
+        columns = [column for column in pd.read_csv(self.file_path, nrows=0).columns
+                   if column not in known and column != self.record_id]
+        kinds = {column: set() for column in columns}
+        has_missing = dict.fromkeys(columns, False)
+        if columns:
+            for chunk in pd.read_csv(self.file_path, usecols=columns, chunksize=self.get_partition_rows()):
+                for column, n_values in chunk.count().items():
+                    has_missing[column] |= n_values < len(chunk)
+                    if n_values > 0:
+                        kinds[column].add(chunk[column].dtype.kind)
+        dtypes = {}
+        for column, column_kinds in kinds.items():
+            if not column_kinds or column_kinds == {'b'}:
+                continue
+            if column_kinds == {'i'} and not has_missing[column]:
+                dtypes[column] = 'int64'
+            elif column_kinds <= {'i', 'f'}:
+                dtypes[column] = 'float64'
+            else:
+                dtypes[column] = 'str'
+        return dtypes
+
+    def is_grouped(self) -> bool:
+        """Check whether the rows of each participant are contiguous in the file."""
+        return self._count_rows()[0]
+
+    @profiled()
+    def partitions(self) -> Iterator[pd.DataFrame]:
+        """
+        Read the report one partition at a time.
+
+        Each participant is in exactly one partition, with its rows in file order. Partitions hold about
+        get_partition_rows() rows, or more if a single participant has more rows.
+
+        Yields:
+            pd.DataFrame: Parsed rows of the participants of a partition.
+        """
+        if self.file_path.stat().st_size == 0:
+            return
+        grouped, counts = self._count_rows()
+        if not counts:
+            return
+        partition_rows = self.get_partition_rows()
+        dtypes = self.infer_dtypes()
+        if self.schema is not None:
+            self._parser = ReportSchema({**dtypes, **self.schema.dtypes}, self.schema.date_columns)
+        elif dtypes:
+            self._parser = ReportSchema(dtypes)
+        self._logger.info(f'Reading {sum(counts.values())} rows of {len(counts)} participants from {self.file_path} '
+                          f'in partitions of about {partition_rows} rows.')
+        if grouped:
+            yield from self._contiguous_partitions(partition_rows)
+        else:
+            self._logger.info('Rows of the participants are not contiguous, copying partitions to temporary files.')
+            yield from self._copied_partitions(partition_rows, counts)
+
+    def _contiguous_partitions(self, partition_rows: int) -> Iterator[pd.DataFrame]:
+        # The rows of the last participant of a chunk may continue in the next chunk, so they are carried over to it
+        chunks = self._read_text(chunksize=partition_rows)
+        chunk = next(chunks, None)
+        while chunk is not None:
+            next_chunk = next(chunks, None)
+            if next_chunk is None:
+                yield self._parse(chunk)
+                return
+            last = chunk[self.record_id].eq(chunk[self.record_id].iloc[-1])
+            if not last.all():
+                yield self._parse(chunk[~last])
+            chunk = pd.concat([chunk[last], next_chunk], ignore_index=True)
+
+    def _copied_partitions(self, partition_rows: int, counts: dict[str, int]) -> Iterator[pd.DataFrame]:
+        # Participants are assigned to partitions in order of first appearance
+        partition_of, partition, size = {}, 0, 0
+        for participant_id, n_rows in counts.items():
+            if size > 0 and size + n_rows > partition_rows:
+                partition, size = partition + 1, 0
+            partition_of[participant_id] = partition
+            size += n_rows
+
+        with tempfile.TemporaryDirectory(prefix='partitions_', dir=self.work_dir) as temp_dir:
+            files = [Path(temp_dir) / f'partition_{i}.csv' for i in range(partition + 1)]
+            for chunk in self._read_text(chunksize=partition_rows):
+                for i, rows in chunk.groupby(chunk[self.record_id].map(partition_of), sort=False):
+                    rows.to_csv(files[i], mode='a', index=False, header=not files[i].exists())
+            for file in files:
+                yield self._parse(file)
+                file.unlink()
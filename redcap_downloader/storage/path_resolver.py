@@ -1,33 +1,108 @@
 from pathlib import Path
 from datetime import datetime
 import logging
+import os
+import shutil
 import sys
 
+from .formats import check_file_format
+
+
+EXISTING_DIR_POLICIES = ('ask', 'overwrite', 'fail', 'version')
+
+
+def is_empty_dir(path: str | Path) -> bool:
+    """
+    Check whether a directory is empty, ignoring log files and run reports (download_<date>.json and .prof).
+
+    The directory is scanned until the first entry that is not a log file, without listing it entirely.
+
+    Args:
+        path (str | Path): Path of the directory.
+
+    Returns:
+        bool: True if the directory only contains log files and run reports, or nothing.
+    """
+    with os.scandir(path) as entries:
+        return all(entry.name.endswith('.log')
+                   or (entry.name.startswith('download_') and entry.name.endswith(('.json', '.prof')))
+                   for entry in entries)
+
+
+def link_tree(source: str | Path, target: str | Path) -> list[Path]:
+    """
+    Recreate a directory tree with hard links to the files of another one, without copying their content.
+
+    Args:
+        source (str | Path): Root of the tree to be linked.
+        target (str | Path): Root of the new tree. Must not exist.
+
+    Returns:
+        list: Directories created in the new tree.
+    """
+    source, target = Path(source), Path(target)
+    directories = []
+    for root, _, file_names in os.walk(source):
+        directory = target / os.path.relpath(root, source)
+        directory.mkdir()
+        directories.append(directory)
+        for file_name in file_names:
+            os.link(os.path.join(root, file_name), directory / file_name)
+    return directories
+
 
 class PathResolver:
     """
     Resolves file paths for storing downloaded data.
 
+    Directories are created the first time they are requested, and are then assumed to exist.
+
+    With staged output, the data of each run is saved to a new snapshot directory ('snapshots/<run ID>'), which
+    starts as a hard-linked copy of the last published snapshot. Once the run is complete, publish() points the
+    'current' link of the main directory to it, so that readers of 'current' never see a partial snapshot.
+
     Attributes:
         _main_dir (str): Main directory for storing downloaded data.
+        file_format (str): Format of the saved data files: 'csv', 'parquet' or 'feather'.
+        existing_dir (str): What to do if the main directory is not empty: 'ask' the user (only if running in a
+            terminal, otherwise fail), 'overwrite' its files, 'fail', or save to a new 'version' of the directory.
+            Does not apply to staged output, which never modifies published files.
+        staged (bool): Whether to save the data to a snapshot directory, published at the end of the run.
 
     Methods:
         set_main_dir(path): Sets the main directory for storing data.
         get_main_dir(): Returns the main directory path.
+        get_output_dir(): Returns the directory the data of this run is saved to.
+        publish(): Publishes the snapshot directory of a staged run.
         get_raw_dir(): Returns the path for raw data storage.
         get_meta_dir(): Returns the path for metadata storage.
         get_reports_dir(): Returns the path for reports storage.
         get_subject_dir(subject_id): Returns the path for a specific subject's data.
+        make_subject_dirs(subject_ids): Creates the directories of several subjects at once.
         get_raw_variables_file(): Returns the path for raw variables data.
-        get_raw_report_file(): Returns the path for raw report data.
+        get_raw_report_file(file_format): Returns the path for raw report data (in the given or default format).
         get_variables_file(form_name): Returns the path for a specific form's variables data.
         get_subject_questionnaire(subject_id, event_name): Returns the path for a subject's questionnaire data.
+        get_sync_state_file(): Returns the path of the incremental download state file.
+        get_reports_dataset(): Returns the path of the partitioned Parquet dataset of reports.
+        get_manifest_file(): Returns the path of the manifest of saved file contents.
+        get_cache_dir(): Returns the path for cached intermediate data.
     """
-    def __init__(self, path: str | Path = '../downloaded_data'):
+    def __init__(self, path: str | Path = '../downloaded_data', file_format: str = 'csv', existing_dir: str = 'ask',
+                 staged: bool = False):
         path = Path(path)
+        check_file_format(file_format)
+        if existing_dir not in EXISTING_DIR_POLICIES:
+            raise ValueError(f"Unknown existing directory policy: {existing_dir}. "
+                             f"Must be one of {', '.join(EXISTING_DIR_POLICIES)}.")
         self._logger = logging.getLogger('PathsResolver')
         self.timestamp = datetime.now().strftime('%Y%m%d')
+        self.file_format = file_format
+        self.existing_dir = existing_dir
+        self.staged = staged
         self._main_dir = None
+        self._output_dir = None
+        self._created_dirs = set()
         self.set_main_dir(path)
 
     def set_main_dir(self, path: str | Path):
@@ -36,51 +111,166 @@ class PathResolver:
             path.mkdir(parents=True)
         if not path.is_dir():
             raise ValueError(f'Main storage: {str(path)} is not a directory')
-        if len(list(path.iterdir())) > 1:
+        if not self.staged and not is_empty_dir(path):
+            path = self._resolve_existing_dir(path)
+        self._main_dir = path
+        self._created_dirs = {path}
+        self._output_dir = self._stage() if self.staged else path
+        self._logger.info(f'Downloading data to: {self._output_dir.absolute()}')
+
+    def _stage(self) -> Path:
+        """Create the snapshot directory of this run, as a hard-linked copy of the current snapshot if any."""
+        snapshots = self._make_dir(self._main_dir / 'snapshots')
+        run_id = datetime.now().strftime('%Y%m%d-%H%M%S')
+        staging = snapshots / run_id
+        suffix = 1
+        while staging.exists():
+            suffix += 1
+            staging = snapshots / f'{run_id}-{suffix}'
+        current = self._main_dir / 'current'
+        if current.is_dir():
+            self._created_dirs.update(link_tree(current.resolve(), staging))
+        else:
+            self._make_dir(staging)
+        return staging
+
+    def publish(self) -> Path:
+        """
+        Publish the snapshot directory of a staged run, by pointing the 'current' link of the main directory to it.
+
+        The files of the snapshot are flushed to disk at once, then the snapshot is marked as complete
+        ('snapshots/<run ID>.published') and the link is replaced with a single rename. The other complete snapshots
+        are removed afterwards, except the previously published one. Snapshots of runs still in progress, or
+        interrupted, are never removed.
+
+        Args:
+            None
+
+        Returns:
+            Path: Published directory (the main directory if the output is not staged).
+        """
+        if not self.staged:
+            return self._main_dir
+        if hasattr(os, 'sync'):
+            os.sync()
+        current = self._main_dir / 'current'
+        previous = current.resolve().name if current.is_symlink() else None
+        snapshots = self._output_dir.parent
+        (snapshots / f'{self._output_dir.name}.published').touch()
+        link = self._main_dir / f'.current-{self._output_dir.name}'
+        link.symlink_to(Path('snapshots') / self._output_dir.name, target_is_directory=True)
+        os.replace(link, current)
+        self._logger.info(f'Published {self._output_dir} as {current}')
+        for marker in snapshots.glob('*.published'):
+            if marker.stem not in (self._output_dir.name, previous):
+                shutil.rmtree(snapshots / marker.stem, ignore_errors=True)
+                marker.unlink()
+        return current
+
+    def _resolve_existing_dir(self, path: Path) -> Path:
+        """
+        Apply the existing directory policy to a main directory that is not empty.
+
+        Args:
+            path (Path): Main directory.
+
+        Returns:
+            Path: Directory to save the data to.
+
+        Raises:
+            FileExistsError: If the policy is 'fail', or 'ask' while not running in a terminal.
+        """
+        if self.existing_dir == 'overwrite':
+            self._logger.warning(f'Main storage: {str(path)} is not empty, overwriting its files.')
+            return path
+        if self.existing_dir == 'version':
+            version = 2
+            while (path.parent / f'{path.name}_v{version}').exists() \
+                    and not is_empty_dir(path.parent / f'{path.name}_v{version}'):
+                version += 1
+            versioned = path.parent / f'{path.name}_v{version}'
+            versioned.mkdir(exist_ok=True)
+            self._logger.warning(f'Main storage: {str(path)} is not empty, saving data to {str(versioned)} instead.')
+            return versioned
+        if self.existing_dir == 'ask' and sys.stdin is not None and sys.stdin.isatty():
             self._logger.warning(f'Main storage: {str(path)} is not empty.')
             response = input('Continue? (y/n): ').strip().lower()
             if response != 'y':
                 self._logger.info('Main storage path is not empty and user chose not to continue. '
                                   'Exiting without downloading data.')
                 sys.exit(1)
-        self._main_dir = path
-        self._logger.info(f'Downloading data to: {self._main_dir.absolute()}')
+            return path
+        self._logger.error(f'Main storage: {str(path)} is not empty. Set existing-dir to overwrite or version to '
+                           f'download data to it without being asked.')
+        raise FileExistsError(f'Main storage: {str(path)} is not empty')
+
+    def _make_dir(self, path: Path) -> Path:
+        """Create a directory, unless it was already created or found by this resolver."""
+        if path not in self._created_dirs:
+            path.mkdir(parents=True, exist_ok=True)
+            self._created_dirs.add(path)
+        return path
 
     def get_main_dir(self) -> Path:
         return self._main_dir
 
+    def get_output_dir(self) -> Path:
+        return self._output_dir
+
     def get_raw_dir(self) -> Path:
-        raw_dir = self._main_dir / 'raw'
-        if not raw_dir.exists():
-            raw_dir.mkdir(parents=True)
-        return raw_dir
+        return self._make_dir(self._output_dir / 'raw')
 
     def get_meta_dir(self) -> Path:
-        meta_dir = self._main_dir / 'meta'
-        if not meta_dir.exists():
-            meta_dir.mkdir(parents=True)
-        return meta_dir
+        return self._make_dir(self._output_dir / 'meta')
 
     def get_reports_dir(self) -> Path:
-        reports_dir = self._main_dir / 'reports'
-        if not reports_dir.exists():
-            reports_dir.mkdir(parents=True)
-        return reports_dir
+        return self._make_dir(self._output_dir / 'reports')
 
     def get_subject_dir(self, subject_id: str) -> Path:
-        subject_dir = self.get_reports_dir() / subject_id
-        if not subject_dir.exists():
-            subject_dir.mkdir(parents=True)
-        return subject_dir
+        return self._make_dir(self.get_reports_dir() / subject_id)
+
+    def make_subject_dirs(self, subject_ids):
+        """
+        Create the directories of several subjects at once.
+
+        The reports directory is listed once, and only the missing subject directories are created.
+
+        Args:
+            subject_ids (Iterable): IDs of the subjects.
+
+        Returns:
+            None
+        """
+        reports_dir = self.get_reports_dir()
+        with os.scandir(reports_dir) as entries:
+            existing = {entry.name for entry in entries if entry.is_dir()}
+        for subject_id in map(str, subject_ids):
+            subject_dir = reports_dir / subject_id
+            if subject_dir not in self._created_dirs:
+                if subject_id not in existing:
+                    subject_dir.mkdir()
+                self._created_dirs.add(subject_dir)
 
     def get_raw_variables_file(self) -> Path:
-        return self.get_raw_dir() / f'Variables_raw_{self.timestamp}.csv'
+        return self.get_raw_dir() / f'Variables_raw_{self.timestamp}.{self.file_format}'
 
-    def get_raw_report_file(self) -> Path:
-        return self.get_raw_dir() / f'Report_raw_{self.timestamp}.csv'
+    def get_raw_report_file(self, file_format: str = None) -> Path:
+        return self.get_raw_dir() / f'Report_raw_{self.timestamp}.{file_format or self.file_format}'
 
     def get_variables_file(self, form_name: str) -> Path:
-        return self.get_meta_dir() / f'{form_name}_variables_{self.timestamp}.csv'
+        return self.get_meta_dir() / f'{form_name}_variables_{self.timestamp}.{self.file_format}'
 
     def get_subject_questionnaire(self, subject_id: str, event_name: str) -> Path:
-        return self.get_subject_dir(subject_id) / f'{subject_id}_PROM-{event_name}_{self.timestamp}.csv'
+        return self.get_subject_dir(subject_id) / f'{subject_id}_PROM-{event_name}_{self.timestamp}.{self.file_format}'
+
+    def get_sync_state_file(self) -> Path:
+        return self._output_dir / 'sync_state.json'
+
+    def get_reports_dataset(self) -> Path:
+        return self.get_reports_dir() / 'PROM_dataset'
+
+    def get_manifest_file(self) -> Path:
+        return self._output_dir / 'manifest.json'
+
+    def get_cache_dir(self) -> Path:
+        return self._make_dir(self._main_dir / 'cache')
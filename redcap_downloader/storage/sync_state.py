@@ -0,0 +1,56 @@
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+
+from .atomic import atomic_write
+
+
+class SyncState:
+    """
+    State of the last successful download, persisted as a JSON file in the download directory.
+
+    The raw report file is saved relative to the state file, so that the state stays valid in a copy of the
+    directory (e.g. the next snapshot of staged output).
+
+    Attributes:
+        path (Path): Path of the state file.
+        last_sync (datetime): Time at which the last successful download started.
+        raw_file (Path): Raw report file written by the last successful download.
+
+    Methods:
+        can_resume(): Whether an incremental download can build on the saved state.
+        update(last_sync, raw_file): Records a successful download and saves the state file.
+        reset(): Forgets the last download and removes the state file, so that the next download is a full one.
+    """
+    TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+    def __init__(self, path: str | Path):
+        self._logger = logging.getLogger('SyncState')
+        self.path = Path(path)
+        self.last_sync = None
+        self.raw_file = None
+        if self.path.exists():
+            with self.path.open('r') as f:
+                state = json.load(f)
+            self.last_sync = datetime.strptime(state['last_sync'], self.TIME_FORMAT)
+            self.raw_file = self.path.parent / state['raw_file']
+            self._logger.info(f'Last successful download: {state["last_sync"]} ({self.raw_file})')
+
+    def can_resume(self) -> bool:
+        return self.last_sync is not None and self.raw_file is not None and self.raw_file.exists()
+
+    def update(self, last_sync: datetime, raw_file: str | Path):
+        self.last_sync = last_sync
+        self.raw_file = Path(raw_file)
+        state = {'last_sync': self.last_sync.strftime(self.TIME_FORMAT),
+                 'raw_file': os.path.relpath(self.raw_file, self.path.parent)}
+        atomic_write(self.path, lambda f: json.dump(state, f))
+        self._logger.debug(f'Saved download state to {self.path}')
+
+    def reset(self):
+        self.last_sync = None
+        self.raw_file = None
+        self.path.unlink(missing_ok=True)
+        self._logger.debug(f'Removed download state {self.path}')
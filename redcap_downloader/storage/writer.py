@@ -0,0 +1,97 @@
+import logging
+import multiprocessing
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+class GroupWriter:
+    """
+    Runs file-writing tasks serially, or over a pool of threads or processes.
+
+    The number of tasks in flight is bounded: submit() blocks until a slot is free, so that the data waiting to be
+    written does not accumulate in memory.
+
+    Attributes:
+        backend (str): 'serial', 'thread' or 'process'.
+        max_workers (int): Number of workers in the pool.
+        max_in_flight (int): Maximum number of submitted tasks not yet completed.
+
+    Methods:
+        submit(func, *args): Runs a writing task, or schedules it on the pool.
+        wait(): Blocks until all submitted tasks are completed, and returns their results.
+        close(): Waits for all tasks and shuts the pool down.
+    """
+    BACKENDS = ('serial', 'thread', 'process')
+
+    def __init__(self, backend: str = 'serial', max_workers: int = 4, max_in_flight: int = None):
+        if backend not in self.BACKENDS:
+            raise ValueError(f'Unknown writer backend: {backend}. Use one of {", ".join(self.BACKENDS)}.')
+        self._logger = logging.getLogger('GroupWriter')
+        self.backend = backend
+        self.max_workers = max_workers
+        self.max_in_flight = max_in_flight or 2 * max_workers
+        self._executor = None
+        self._pending = set()
+        self._results = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.backend == 'thread':
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            else:
+                # The pool may be started while other threads (e.g. the report download) hold locks, which forked
+                # workers would inherit locked: workers are started from a fresh server process instead
+                start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context(start_method))
+            self._logger.debug(f'Started {self.backend} pool with {self.max_workers} workers')
+        return self._executor
+
+    def submit(self, func, *args):
+        """
+        Run a writing task serially, or schedule it on the pool once fewer than max_in_flight tasks are pending.
+
+        Args:
+            func (callable): Task to run. Must be picklable (e.g. a module-level function) for the process backend.
+            *args: Arguments of the task.
+
+        Returns:
+            None
+        """
+        if self.backend == 'serial':
+            self._results.append(func(*args))
+            return
+        while len(self._pending) >= self.max_in_flight:
+            done, self._pending = wait(self._pending, return_when=FIRST_COMPLETED)
+            self._collect(done)
+        self._pending.add(self._get_executor().submit(func, *args))
+
+    def wait(self) -> list:
+        """
+        Block until all submitted tasks are completed, and raise the first error encountered.
+
+        Returns:
+            list: Results of the tasks completed since the last call to wait(), in completion order.
+        """
+        done, self._pending = wait(self._pending), set()
+        self._collect(done.done)
+        results, self._results = self._results, []
+        return results
+
+    def close(self):
+        """Wait for all submitted tasks, then shut the pool down."""
+        try:
+            self.wait()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def _collect(self, futures: set[Future]):
+        for future in futures:
+            self._results.append(future.result())
@@ -0,0 +1,131 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class StubResponses:
+    """
+    Responses of a stub REDCap API, to test and benchmark the download without a REDCap project.
+
+    Responses are queued per API `content` type as (status, body) tuples. The last queued response of a content
+    type is repeated once the queue is exhausted. The body can be a callable, which is then called with the form
+    fields of the request. Every request received is recorded as a dict of form fields.
+    """
+    def __init__(self):
+        self.responses = {}
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def queue(self, content: str, status: int, body):
+        self.responses.setdefault(content, []).append((status, body))
+
+    def _next_response(self, fields: dict) -> tuple[int, str]:
+        with self._lock:
+            self.requests.append(fields)
+            queue = self.responses.get(fields.get('content'), [])
+            if not queue:
+                return 404, 'Unknown content'
+            status, body = queue.pop(0) if len(queue) > 1 else queue[0]
+        return status, body(fields) if callable(body) else body
+
+
+class StubREDCapServer(StubResponses):
+    """Local threaded HTTP server standing in for the REDCap API, used by the tests and the benchmarks."""
+    def __init__(self):
+        super().__init__()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self._server.server_address[1]}/api/'
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                fields = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+                status, body = server._next_response(fields)
+                payload = body.encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/csv; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class AsyncStubREDCapServer(StubResponses):
+    """
+    Local asyncio HTTP server standing in for the REDCap API, to be started in the event loop of the test.
+
+    Every response is delayed by `delay` seconds, and the maximum number of requests handled at the same time is
+    recorded in `max_active`.
+    """
+    def __init__(self, delay: float = 0):
+        super().__init__()
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self._server.sockets[0].getsockname()[1]}/api/'
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while (line := await reader.readline()) not in (b'\r\n', b''):
+                    name, _, value = line.decode().partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                fields = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+                await asyncio.sleep(self.delay)
+                status, text = self._next_response(fields)
+                self.active -= 1
+
+                payload = text.encode()
+                writer.write(f'HTTP/1.1 {status} Stub\r\nContent-Type: text/csv; charset=utf-8\r\n'
+                             f'Content-Length: {len(payload)}\r\n\r\n'.encode() + payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
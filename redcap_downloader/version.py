@@ -0,0 +1,14 @@
+from importlib.metadata import PackageNotFoundError, version
+
+
+def get_version() -> str:
+    """
+    Get the installed version of redcap_downloader.
+
+    Returns:
+        str: Version of the package, or 'unknown' if it is not installed.
+    """
+    try:
+        return version('redcap_downloader')
+    except PackageNotFoundError:
+        return 'unknown'
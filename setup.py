@@ -12,9 +12,14 @@ setup(
         'pandas>=2.3.0',
         'requests>=2.32.0'
     ],
+    extras_require={
+        'parquet': ['pyarrow>=15.0.0'],
+        'async': ['httpx>=0.27'],
+    },
     entry_points={
         'console_scripts': [
             'redcap_download=redcap_downloader:main.main',
+            'redcap_batch_download=redcap_downloader:batch.main',
         ],
     },
 )
@@ -0,0 +1,15 @@
+import pytest
+
+from redcap_downloader.testing import AsyncStubREDCapServer, StubREDCapServer
+
+
+@pytest.fixture
+def stub_server():
+    with StubREDCapServer() as server:
+        yield server
+
+
+@pytest.fixture
+def async_stub_server():
+    """Factory of asynchronous stub servers, to be entered in the event loop of the test."""
+    return AsyncStubREDCapServer
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip('httpx')
+
+from redcap_downloader.redcap_api.async_redcap import AsyncREDCap, create_client  # noqa: E402
+from redcap_downloader.redcap_api.dom import Variables, Report  # noqa: E402
+
+
+class DummyProperties:
+    def __init__(self, api_url, token='dummy_token', report_id=123):
+        self.redcap_token = token
+        self.report_id = report_id
+        self.api_url = api_url
+        self.pool_size = 2
+        self.connect_timeout = 1
+        self.read_timeout = 5
+        self.max_retries = 3
+        self.backoff_factor = 0
+
+
+def test_get_questionnaire_variables(async_stub_server):
+    async def run():
+        async with async_stub_server() as server:
+            server.queue('metadata', 200, 'field_name,form_name\nfield1,screening\nfield2,baseline')
+            async with AsyncREDCap(DummyProperties(server.url)) as redcap:
+                variables = await redcap.get_questionnaire_variables()
+        return server, variables
+
+    server, variables = asyncio.run(run())
+    assert isinstance(variables, Variables)
+    assert list(variables.raw_data.field_name) == ['field1', 'field2']
+    assert server.requests[0]['forms[1]'] == 'screening'
+
+
+def test_get_questionnaire_report_retries_server_errors(async_stub_server):
+    async def run():
+        async with async_stub_server() as server:
+            server.queue('report', 503, 'Unavailable')
+            server.queue('report', 200, 'study_id,redcap_event_name\n1,screening\n2,baseline')
+            async with AsyncREDCap(DummyProperties(server.url)) as redcap:
+                report = await redcap.get_questionnaire_report()
+        return server, report
+
+    server, report = asyncio.run(run())
+    assert isinstance(report, Report)
+    assert list(report.raw_data.study_id) == [1, 2]
+    assert len(server.requests) == 2
+    assert server.requests[-1]['report_id'] == '123'
+
+
+def test_get_questionnaire_report_raises_after_retries(async_stub_server):
+    async def run():
+        async with async_stub_server() as server:
+            server.queue('report', 500, 'Error')
+            async with AsyncREDCap(DummyProperties(server.url)) as redcap:
+                with pytest.raises(Exception, match='HTTP Error: 500'):
+                    await redcap.get_questionnaire_report()
+        return server
+
+    server = asyncio.run(run())
+    assert len(server.requests) == 4
+
+
+def test_concurrent_projects_share_connection_limit(async_stub_server):
+    def report_body(fields):
+        return f"study_id,redcap_event_name\n{fields['token']}-{fields['report_id']},screening"
+
+    async def run():
+        async with async_stub_server(delay=0.05) as server:
+            server.queue('report', 200, report_body)
+            async with create_client(max_connections=2) as client:
+                projects = [AsyncREDCap(DummyProperties(server.url, token=f'token{i}'), client=client)
+                            for i in range(3)]
+                reports = await asyncio.gather(*(project.get_questionnaire_report(report_id)
+                                                 for project in projects for report_id in (1, 2)))
+                for project in projects:
+                    await project.aclose()
+                assert not client.is_closed
+        return server, reports
+
+    server, reports = asyncio.run(run())
+    assert [report.raw_data.study_id.iloc[0] for report in reports] == [
+        f'token{i}-{report_id}' for i in range(3) for report_id in (1, 2)
+    ]
+    assert len(server.requests) == 6
+    assert server.max_active == 2
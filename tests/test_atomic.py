@@ -0,0 +1,29 @@
+import os
+
+import pytest
+
+from redcap_downloader.storage.atomic import atomic_write
+
+
+def test_atomic_write_replaces_linked_file(tmp_path):
+    previous, file_path = tmp_path / 'previous.json', tmp_path / 'state.json'
+    previous.write_text('previous')
+    os.link(previous, file_path)
+
+    assert atomic_write(file_path, lambda f: f.write('current')) == len('current')
+    assert file_path.read_text() == 'current'
+    assert previous.read_text() == 'previous'
+
+
+def test_atomic_write_keeps_file_if_writer_fails(tmp_path):
+    def failing_writer(f):
+        f.write(b'partial')
+        raise RuntimeError('download failed')
+
+    file_path = tmp_path / 'report.csv'
+    file_path.write_text('previous')
+    with pytest.raises(RuntimeError):
+        atomic_write(file_path, failing_writer, mode='wb')
+
+    assert file_path.read_text() == 'previous'
+    assert [path.name for path in tmp_path.iterdir()] == ['report.csv']
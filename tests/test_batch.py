@@ -0,0 +1,155 @@
+import json
+import pstats
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from redcap_downloader.batch import format_timing_report, run_batch, run_job, save_timing_report
+from redcap_downloader.config.properties import load_batch_properties
+
+
+REPORT_CSV = Path('./tests/data/test_report.csv').read_text()
+VARIABLES_CSV = Path('./tests/data/test_variables.csv').read_text()
+
+
+@pytest.fixture
+def batch_file(tmp_path, stub_server):
+    (tmp_path / 'token_a.txt').write_text('token_a\n')
+    (tmp_path / 'token_b.txt').write_text('token_b\n')
+    batch_file = tmp_path / 'REDCap_downloader.properties'
+    batch_file.write_text(
+        "[DEFAULT]\n"
+        f"token-file = {tmp_path / 'token_a.txt'}\n"
+        f"api-url = {stub_server.url}\n"
+        "stream-download = false\n"
+        "max-retries = 0\n"
+        "max-concurrent-jobs = 2\n"
+        f"batch-report = {tmp_path / 'batch_report.json'}\n"
+        "[project_a]\n"
+        "report-id = 1\n"
+        f"download-dir = {tmp_path / 'project_a'}\n"
+        "[project_b]\n"
+        f"token-file = {tmp_path / 'token_b.txt'}\n"
+        "report-id = 2\n"
+        f"download-dir = {tmp_path / 'project_b'}\n"
+        "concurrent-download = false\n"
+    )
+    return batch_file
+
+
+def test_load_batch_properties(batch_file, tmp_path):
+    batch = load_batch_properties(batch_file)
+
+    assert list(batch.jobs) == ['project_a', 'project_b']
+    assert batch.max_concurrent_jobs == 2
+    assert batch.batch_report == tmp_path / 'batch_report.json'
+    assert batch.jobs['project_a'].redcap_token == 'token_a'
+    assert batch.jobs['project_b'].redcap_token == 'token_b'
+    assert batch.jobs['project_b'].report_id == '2'
+    assert batch.jobs['project_a'].concurrent_download is True
+    assert batch.jobs['project_b'].concurrent_download is False
+
+
+def test_load_batch_properties_requires_jobs(tmp_path):
+    batch_file = tmp_path / 'REDCap_downloader.properties'
+    batch_file.write_text("[DEFAULT]\nreport-id = 1\n")
+
+    with pytest.raises(ValueError, match='No download job'):
+        load_batch_properties(batch_file)
+
+
+def test_load_batch_properties_rejects_shared_download_dir(batch_file, tmp_path):
+    batch_file.write_text(batch_file.read_text().replace('project_b\n', 'project_a\n'))
+
+    with pytest.raises(ValueError, match='download-dir'):
+        load_batch_properties(batch_file)
+
+
+def test_load_batch_properties_rejects_concurrent_profiling(batch_file):
+    batch_file.write_text(batch_file.read_text() + "profile = true\n")
+
+    with pytest.raises(ValueError, match='max-concurrent-jobs'):
+        load_batch_properties(batch_file)
+
+
+def test_run_batch(batch_file, stub_server, tmp_path):
+    stub_server.queue('metadata', 200, VARIABLES_CSV)
+    stub_server.queue('report', 200, REPORT_CSV)
+    batch = load_batch_properties(batch_file)
+
+    results = run_batch(batch)
+
+    assert [result['name'] for result in results] == ['project_a', 'project_b']
+    assert [result['status'] for result in results] == ['ok', 'ok']
+    assert set(results[0]['timings']) == {'setup', 'questionnaire_data', 'total'}
+    assert set(results[1]['timings']) == {'setup', 'variables', 'reports', 'total'}
+    for project in ('project_a', 'project_b'):
+        assert any((tmp_path / project / 'reports').rglob('*.csv'))
+        run_report = json.loads(next((tmp_path / project).glob('download_*.json')).read_text())
+        stages = {record['stage']: record for record in run_report['stages']}
+        assert run_report['status'] == 'ok'
+        assert {'REDCap.get_questionnaire_report', 'DataCleaner.clean_reports', 'DataMixin.split'} <= set(stages)
+        assert stages['Report.save_cleaned_data']['bytes_written'] > 0
+    report_requests = [(r['token'], r['report_id']) for r in stub_server.requests if r['content'] == 'report']
+    assert sorted(report_requests) == [('token_a', '1'), ('token_b', '2')]
+
+
+def test_run_batch_with_staged_output(batch_file, stub_server, tmp_path):
+    stub_server.queue('metadata', 200, VARIABLES_CSV)
+    stub_server.queue('report', 200, REPORT_CSV)
+    batch_file.write_text(batch_file.read_text() + "staged-output = true\n")
+    batch = load_batch_properties(batch_file)
+
+    results = run_batch(batch)
+
+    assert [result['status'] for result in results] == ['ok', 'ok']
+    assert 'publish' in results[1]['timings']
+    assert (tmp_path / 'project_b' / 'current').is_symlink()
+    assert any((tmp_path / 'project_b' / 'current' / 'reports').rglob('*.csv'))
+    assert not (tmp_path / 'project_b' / 'reports').exists()
+
+
+def test_run_batch_with_profile(batch_file, stub_server, tmp_path):
+    stub_server.queue('metadata', 200, VARIABLES_CSV)
+    stub_server.queue('report', 200, REPORT_CSV)
+    batch_file.write_text(batch_file.read_text().replace('max-concurrent-jobs = 2\n',
+                                                         'max-concurrent-jobs = 1\nprofile = true\n'))
+    batch = load_batch_properties(batch_file)
+
+    results = run_batch(batch)
+
+    assert [result['status'] for result in results] == ['ok', 'ok']
+    # The report of project_a is downloaded in another thread while the variables are processed
+    stats = pstats.Stats(str(next((tmp_path / 'project_a').glob('download_*.prof'))))
+    assert any(function == 'get_questionnaire_report' for _, _, function in stats.stats)
+
+
+def test_run_job_reports_failures(batch_file, tmp_path):
+    properties = load_batch_properties(batch_file).jobs['project_a']
+    properties.api_url = 'http://127.0.0.1:1/api/'
+
+    result = run_job('project_a', properties)
+
+    assert result['status'] == 'failed'
+    assert result['error']
+    assert 'total' in result['timings']
+
+
+def test_timing_report(tmp_path):
+    results = [
+        {'name': 'project_a', 'status': 'ok', 'timings': {'setup': 0.1, 'questionnaire_data': 1.5, 'total': 1.6}},
+        {'name': 'project_b', 'status': 'failed', 'timings': {'total': 0.2}},
+    ]
+
+    table = format_timing_report(results).splitlines()
+    assert table[0].split() == ['job', 'status', 'setup', 'questionnaire_data', 'total']
+    assert table[1].split() == ['project_a', 'ok', '0.10', '1.50', '1.60']
+    assert table[2].split() == ['project_b', 'failed', '-', '-', '0.20']
+
+    report_file = tmp_path / 'batch_report.json'
+    save_timing_report(results, report_file, started=datetime(2025, 7, 17), wall_time=1.7)
+    report = json.loads(report_file.read_text())
+    assert report['wall_time'] == 1.7
+    assert report['jobs_time'] == pytest.approx(1.8)
+    assert report['failed'] == ['project_b']
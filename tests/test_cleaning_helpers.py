@@ -1,6 +1,23 @@
+import random
 import pandas as pd
+import pytest
 
-from redcap_downloader.data_cleaning.helpers import drop_empty_columns, merge_duplicate_columns, replace_strings
+from redcap_downloader.data_cleaning.helpers import (drop_empty_columns, merge_duplicate_columns,
+                                                     find_duplicate_columns, coalesce_columns, StringReplacer)
+from redcap_downloader.data_cleaning.replacements import (FIELD_NAME_REPLACEMENTS, FORM_NAME_REPLACEMENTS,
+                                                          ARM_NAME_REPLACEMENTS)
+
+
+def sequential_replace(string, replacements):
+    for old, new in replacements.items():
+        string = string.replace(old, new)
+    return string
+
+
+def random_strings(replacements, n=2000, seed=0):
+    rng = random.Random(seed)
+    fragments = list(replacements) + list(replacements.values()) + ['_', 'q', '1', 'phq9', 'gad7', 'base', 'line']
+    return [''.join(rng.choice(fragments) for _ in range(rng.randint(0, 6))) for _ in range(n)]
 
 
 class TestCleaningHelpers:
@@ -30,9 +47,58 @@ class TestCleaningHelpers:
         })
         pd.testing.assert_frame_equal(result, expected)
 
-    def test_replace_strings(self):
+    def test_merge_duplicate_columns_keeps_dtypes(self):
+        df = pd.DataFrame({
+            'A': [1.0, None, None],
+            'C': [None, 2.0, None],
+            'B': pd.array([4, 5, None], dtype='Int64')
+        }).rename(columns={'C': 'A'})
+        result = merge_duplicate_columns(df)
+        expected = pd.DataFrame({
+            'A': [1.0, 2.0, None],
+            'B': pd.array([4, 5, None], dtype='Int64')
+        })
+        pd.testing.assert_frame_equal(result, expected)
+
+    def test_merge_duplicate_columns_no_duplicates(self):
+        df = pd.DataFrame({'A': [1, 2], 'B': ['x', None]})
+        result = merge_duplicate_columns(df)
+        pd.testing.assert_frame_equal(result, df)
+
+    def test_find_duplicate_columns(self):
+        columns = pd.Index(['A', 'B', 'A', 'C', 'B'])
+        assert find_duplicate_columns(columns) == {'A': [0, 2], 'B': [1, 4], 'C': [3]}
+
+    def test_coalesce_columns(self):
+        df = pd.DataFrame({
+            'A': [None, None, 'x'],
+            'B': ['y', None, 'z']
+        })
+        result = coalesce_columns([df['A'], df['B']])
+        expected = pd.Series(['y', None, 'x'], name='A', dtype=df.dtypes['A'])
+        pd.testing.assert_series_equal(result, expected)
+
+    def test_replace_series(self):
         series = pd.Series(['apple', 'banana', 'cherry'])
         replacements = {'apple': 'orange', 'banana': 'grape'}
-        result = replace_strings(series, replacements)
+        result = StringReplacer(replacements).replace_series(series)
         expected = pd.Series(['orange', 'grape', 'cherry'])
         pd.testing.assert_series_equal(result, expected)
+
+    @pytest.mark.parametrize('replacements', [FIELD_NAME_REPLACEMENTS, FORM_NAME_REPLACEMENTS, ARM_NAME_REPLACEMENTS])
+    def test_string_replacer_matches_sequential_replace(self, replacements):
+        replacer = StringReplacer(replacements)
+        strings = random_strings(replacements)
+        assert [replacer(s) for s in strings] == [sequential_replace(s, replacements) for s in strings]
+
+        series = pd.Series(strings + [None])
+        expected = series
+        for old, new in replacements.items():
+            expected = expected.str.replace(old, new, regex=False)
+        pd.testing.assert_series_equal(replacer.replace_series(series), expected)
+
+    def test_string_replacer_ordering(self):
+        replacer = StringReplacer({'_baseline': '', '_base': '', 'ab': 'b', 'bc': 'X'})
+        assert replacer('q1_baseline') == 'q1'
+        assert replacer('abc') == 'X'
+        assert replacer('other') == 'other'
@@ -0,0 +1,86 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from redcap_downloader.data_cleaning.helpers import StringReplacer, merge_duplicate_columns
+from redcap_downloader.data_cleaning import plan as plan_module
+from redcap_downloader.data_cleaning.plan import CleaningPlan
+
+REPLACER = StringReplacer({'study_id': 'participant_id', '_base': '', '_6m': ''})
+
+
+@pytest.fixture
+def report():
+    return pd.DataFrame({
+        'study_id': ['abd001', 'abd001', 'abd002'],
+        'redcap_event_name': ['baseline_arm_1', '6month_followup_arm_1', 'baseline_arm_1'],
+        'phq_1_base': [1, np.nan, 2],
+        'notes': ['a', None, 'b'],
+        'phq_1_6m': [np.nan, 3, np.nan],
+        'gad_1_base': [np.nan, np.nan, 1],
+        'gad_1_6m': [np.nan, 2, np.nan],
+    })
+
+
+def test_compile(report):
+    plan = CleaningPlan.compile(report.columns, REPLACER)
+
+    assert plan.targets == ['participant_id', 'redcap_event_name', 'phq_1', 'notes', 'phq_1', 'gad_1', 'gad_1']
+    assert plan.selection == [0, 1, 2, 3, 5]
+    assert plan.merge_groups == {2: [2, 4], 4: [5, 6]}
+    assert plan.target('phq_1_6m') == 'phq_1'
+    assert plan.target('output_form') == 'output_form'
+
+
+def test_apply_matches_rename_and_merge(report):
+    plan = CleaningPlan.compile(report.columns, REPLACER)
+
+    expected = merge_duplicate_columns(report.rename(columns=REPLACER))
+    pd.testing.assert_frame_equal(plan.apply(report), expected)
+    # The plan is reused for other frames with the same header
+    pd.testing.assert_frame_equal(plan.apply(report.iloc[1:]), expected.iloc[1:])
+
+    with pytest.raises(ValueError):
+        plan.apply(report.drop(columns=['notes']))
+
+
+def test_apply_without_merged_columns():
+    report = pd.DataFrame({'study_id': ['abd001'], 'phq_1_base': [1]})
+    cleaned = CleaningPlan.compile(report.columns, REPLACER).apply(report)
+
+    assert cleaned.columns.tolist() == ['participant_id', 'phq_1']
+    assert report.columns.tolist() == ['study_id', 'phq_1_base']
+
+
+def test_load_from_cache(report, tmp_path):
+    plan = CleaningPlan.load(tmp_path, report.columns, REPLACER)
+    cache_file = tmp_path / f'cleaning_plan_{plan.key}.json'
+    assert cache_file.exists()
+
+    cached = CleaningPlan.load(tmp_path, report.columns, REPLACER)
+    assert vars(cached) == vars(plan)
+
+    # A new header replaces the cached plan, and so do new renaming rules
+    other = CleaningPlan.load(tmp_path, report.columns[:-1], REPLACER)
+    assert other.key != plan.key
+    assert [f.name for f in tmp_path.iterdir()] == [f'cleaning_plan_{other.key}.json']
+    assert CleaningPlan.get_key(report.columns, StringReplacer({'_base': ''})) != plan.key
+
+
+def test_key_includes_package_version(report, monkeypatch):
+    key = CleaningPlan.get_key(report.columns, REPLACER)
+    monkeypatch.setattr(plan_module, 'get_version', lambda: '99.0')
+    assert CleaningPlan.get_key(report.columns, REPLACER) != key
+
+
+@pytest.mark.parametrize('content', ['{', '[]', None])
+def test_load_unreadable_cache(report, tmp_path, content):
+    plan = CleaningPlan.load(tmp_path, report.columns, REPLACER)
+    cache_file = tmp_path / f'cleaning_plan_{plan.key}.json'
+    # Without content, the cached plan has the header but misses the other fields
+    cache_file.write_text(content or json.dumps({'columns': list(report.columns)}))
+
+    assert vars(CleaningPlan.load(tmp_path, report.columns, REPLACER)) == vars(plan)
+    assert json.loads(cache_file.read_text())['key'] == plan.key
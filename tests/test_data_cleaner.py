@@ -1,11 +1,17 @@
 import os
 import tempfile
+import threading
+from datetime import datetime
 import pandas as pd
+import pytest
 
-from redcap_downloader.data_cleaning.data_cleaner import DataCleaner
+from redcap_downloader.data_cleaning import data_cleaner
+from redcap_downloader.data_cleaning.data_cleaner import FIELD_NAME_REPLACER, DataCleaner
 from redcap_downloader.storage.path_resolver import PathResolver
+from redcap_downloader.storage.sync_state import SyncState
 from redcap_downloader.redcap_api.redcap import REDCap
 from redcap_downloader.redcap_api.dom import Report, Variables
+from redcap_downloader.redcap_api.schema import ReportSchema
 
 
 class MockREDCap(REDCap):
@@ -17,9 +23,42 @@ class MockREDCap(REDCap):
     def get_questionnaire_variables(self):
         return Variables(self.test_variables)
 
-    def get_questionnaire_report(self):
+    def get_questionnaire_report(self, raw_file=None, schema=None):
         return Report(self.test_report)
 
+    def download_questionnaire_report(self, file_path):
+        self.test_report.to_csv(file_path, index=False)
+        return file_path
+
+    def get_record_ids(self, modified_since=None):
+        if modified_since is None:
+            return self.test_report.study_id.drop_duplicates().tolist()
+        return ['abd003']
+
+    def get_questionnaire_records(self, record_ids=None, schema=None):
+        return Report(pd.DataFrame({
+            'study_id': ['abd003'],
+            'redcap_event_name': ['6month_followup_arm_1'],
+            'consent_contact': [2],
+            'empty_column': [None]
+        }))
+
+
+class ConcurrentMockREDCap(MockREDCap):
+
+    def __init__(self):
+        super().__init__()
+        self.report_requested = threading.Event()
+
+    def get_questionnaire_variables(self):
+        # Only returns once the report was requested, which requires both downloads to run concurrently
+        assert self.report_requested.wait(timeout=5)
+        return super().get_questionnaire_variables()
+
+    def get_questionnaire_report(self, raw_file=None, schema=None):
+        self.report_requested.set()
+        return super().get_questionnaire_report(raw_file)
+
 
 class TestDataCleaner:
 
@@ -105,3 +144,202 @@ class TestDataCleaner:
         assert '<' not in cleaned_df['section_header'].values
         assert '<' not in cleaned_df['field_label'].values
         assert 'No HTML' in cleaned_df['section_header'].values
+
+    def test_save_questionnaire_reports_incremental(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            paths = PathResolver(test_dir)
+            cleaner = DataCleaner(redcap=self.mock_redcap, paths=paths, incremental=True)
+
+            cleaner.save_questionnaire_reports()
+            state = SyncState(paths.get_sync_state_file())
+            assert state.can_resume()
+            full_files = sorted(paths.get_reports_dir().rglob('*.csv'))
+            assert len(full_files) == 3
+
+            for file in full_files:
+                file.unlink()
+            state.update(datetime(2025, 1, 1), state.raw_file)
+            cleaner.save_questionnaire_reports()
+
+            assert [f.parent.name for f in paths.get_reports_dir().rglob('*.csv')] == ['abd003']
+            merged = pd.read_csv(paths.get_raw_report_file())
+            assert len(merged) == 3
+            assert list(merged.columns) == list(self.test_report.columns)
+            assert merged.set_index('study_id').loc['abd003', 'consent_contact'] == 2
+            assert SyncState(paths.get_sync_state_file()).last_sync > datetime(2025, 1, 1)
+
+    def test_incremental_column_mismatch_downloads_full_report(self, monkeypatch):
+        with tempfile.TemporaryDirectory() as test_dir:
+            paths = PathResolver(test_dir)
+            cleaner = DataCleaner(redcap=self.mock_redcap, paths=paths, incremental=True)
+            cleaner.save_questionnaire_reports()
+            SyncState(paths.get_sync_state_file()).update(datetime(2025, 1, 1), paths.get_raw_report_file())
+
+            # A field added to the data dictionary is exported with the records, but not with the report
+            updates = Report(self.test_report.head(1).assign(new_field='x'))
+            monkeypatch.setattr(self.mock_redcap, 'get_questionnaire_records', lambda *args, **kwargs: updates)
+            queried = []
+            monkeypatch.setattr(self.mock_redcap, 'get_record_ids',
+                                lambda modified_since=None: queried.append(modified_since) or ['abd001'])
+            reports = cleaner.fetch_questionnaire_reports(SyncState(paths.get_sync_state_file()))
+
+            assert queried[0] == datetime(2025, 1, 1) - DataCleaner.SYNC_MARGIN
+            assert reports.data is reports.raw_data
+            pd.testing.assert_frame_equal(reports.raw_data, self.test_report)
+
+    def test_filtered_report_is_not_incremental(self, monkeypatch):
+        with tempfile.TemporaryDirectory() as test_dir:
+            paths = PathResolver(test_dir)
+            cleaner = DataCleaner(redcap=self.mock_redcap, paths=paths, incremental=True)
+            # State of a previous download whose raw report was removed
+            SyncState(paths.get_sync_state_file()).update(datetime(2025, 1, 1), paths.get_raw_report_file())
+
+            # The report filter excludes abd004, which would be added back by the records modified later
+            monkeypatch.setattr(self.mock_redcap, 'get_record_ids',
+                                lambda modified_since=None: ['abd001', 'abd002', 'abd003', 'abd004'])
+            cleaner.save_questionnaire_reports()
+
+            assert len(list(paths.get_reports_dir().rglob('*.csv'))) == 3
+            assert not paths.get_sync_state_file().exists()
+
+    def test_clean_variables_cache(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            paths = PathResolver(test_dir)
+            cleaner = DataCleaner(redcap=self.mock_redcap, paths=paths, variables_cache=True)
+
+            cleaned = cleaner.clean_variables(Variables(self.test_variables)).data
+            cache_files = list(paths.get_cache_dir().glob('variables_*.pkl'))
+            assert len(cache_files) == 1
+
+            cleaned.head(1).to_pickle(cache_files[0])  # Alter the cached data to check that it is reused
+            assert len(cleaner.clean_variables(Variables(self.test_variables)).data) == 1
+
+            changed = self.test_variables.assign(field_label='changed')
+            assert len(cleaner.clean_variables(Variables(changed)).data) == len(cleaned)
+            assert len(list(paths.get_cache_dir().glob('variables_*.pkl'))) == 1
+
+            # A cache file that cannot be read is cleaned again
+            next(paths.get_cache_dir().glob('variables_*.pkl')).write_bytes(b'not a pickle')
+            assert len(cleaner.clean_variables(Variables(changed)).data) == len(cleaned)
+
+    def test_variables_cache_key_includes_cleaning_rules(self, monkeypatch):
+        key = DataCleaner.get_variables_cache_key(Variables(self.test_variables))
+        monkeypatch.setattr(FIELD_NAME_REPLACER, 'replacements', [*FIELD_NAME_REPLACER.replacements, ('_new', '')])
+        assert DataCleaner.get_variables_cache_key(Variables(self.test_variables)) != key
+        monkeypatch.undo()
+        monkeypatch.setattr(data_cleaner, 'get_version', lambda: '99.0')
+        assert DataCleaner.get_variables_cache_key(Variables(self.test_variables)) != key
+
+    def test_cleaning_plan_cache(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            paths = PathResolver(test_dir)
+            cleaner = DataCleaner(redcap=self.mock_redcap, paths=paths, variables_cache=True)
+
+            cleaned = cleaner.clean_reports(Report(self.test_report)).data
+            assert 'participant_id' in cleaned.columns
+            assert len(list(paths.get_cache_dir().glob('cleaning_plan_*.json'))) == 1
+
+            # The plan is reused for frames with the same header, and by the next runs
+            plan = cleaner.get_cleaning_plan(self.test_report.columns)
+            assert cleaner.get_cleaning_plan(self.test_report.columns) is plan
+            next_run = DataCleaner(redcap=self.mock_redcap, paths=paths, variables_cache=True)
+            assert vars(next_run.get_cleaning_plan(self.test_report.columns)) == vars(plan)
+            pd.testing.assert_frame_equal(next_run.clean_reports(Report(self.test_report)).data, cleaned)
+
+    def test_remove_html_tags_keeps_other_columns(self):
+        df = pd.DataFrame({
+            'section_header': ['<b>Header</b>', None, '<b>Header</b>'],
+            'score': [1, 2, 3]
+        })
+        cleaned_df = self.cleaner.remove_html_tags(df)
+
+        assert cleaned_df['section_header'].tolist()[::2] == ['Header', 'Header']
+        assert cleaned_df['section_header'].isna().tolist() == [False, True, False]
+        assert cleaned_df['score'].tolist() == [1, 2, 3]
+
+    def test_save_questionnaire_data(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            paths = PathResolver(test_dir)
+            redcap = ConcurrentMockREDCap()
+            cleaner = DataCleaner(redcap=redcap, paths=paths)
+
+            cleaner.save_questionnaire_data()
+
+            assert os.path.exists(paths.get_variables_file(form_name='Scre'))
+            assert os.path.exists(paths.get_subject_questionnaire(subject_id='abd001', event_name='Ques'))
+            assert os.path.exists(paths.get_raw_report_file())
+
+
+class SchemaMockREDCap(MockREDCap):
+
+    def __init__(self):
+        super().__init__()
+        self.variables_requests = 0
+        self.schema = None
+
+    def get_questionnaire_variables(self):
+        self.variables_requests += 1
+        return super().get_questionnaire_variables()
+
+    def get_questionnaire_report(self, raw_file=None, schema=None):
+        self.schema = schema
+        return super().get_questionnaire_report(raw_file)
+
+
+@pytest.mark.parametrize('concurrent', [True, False])
+def test_save_questionnaire_data_with_report_schema(concurrent):
+    with tempfile.TemporaryDirectory() as test_dir:
+        paths = PathResolver(test_dir)
+        redcap = SchemaMockREDCap()
+        cleaner = DataCleaner(redcap=redcap, paths=paths, report_schema=True)
+
+        if concurrent:
+            cleaner.save_questionnaire_data()
+        else:
+            cleaner.save_questionnaire_variables()
+            cleaner.save_questionnaire_reports()
+
+        assert redcap.variables_requests == 1
+        assert isinstance(redcap.schema, ReportSchema)
+        assert redcap.schema.dtypes['field1'] == 'str'
+        assert os.path.exists(paths.get_subject_questionnaire(subject_id='abd001', event_name='Ques'))
+
+
+def test_save_questionnaire_reports_sparse():
+    saved = {}
+    for sparse in (False, True):
+        with tempfile.TemporaryDirectory() as test_dir:
+            paths = PathResolver(test_dir)
+            cleaner = DataCleaner(redcap=MockREDCap(), paths=paths, sparse=sparse)
+            cleaner.save_questionnaire_reports()
+            saved[sparse] = {file_path.relative_to(paths.get_reports_dir()): file_path.read_text()
+                             for file_path in paths.get_reports_dir().rglob('*.csv')}
+
+    assert saved[True]
+    assert saved[True] == saved[False]
+
+
+@pytest.mark.parametrize('sparse', [False, True])
+@pytest.mark.parametrize('concurrent', [True, False])
+def test_save_questionnaire_reports_with_memory_limit(sparse, concurrent):
+    saved = {}
+    for memory_limit in (0, 1e-6):
+        with tempfile.TemporaryDirectory() as test_dir:
+            paths = PathResolver(test_dir)
+            cleaner = DataCleaner(redcap=MockREDCap(), paths=paths, sparse=sparse, memory_limit=memory_limit)
+            if concurrent:
+                cleaner.save_questionnaire_data()
+            else:
+                cleaner.save_questionnaire_reports()
+            assert paths.get_raw_report_file().exists()
+            saved[memory_limit] = {file_path.relative_to(paths.get_reports_dir()): file_path.read_text()
+                                   for file_path in paths.get_reports_dir().rglob('*.csv')}
+
+    assert len(saved[1e-6]) == 3
+    assert saved[1e-6] == saved[0]
+
+
+def test_memory_limit_is_not_incremental():
+    with tempfile.TemporaryDirectory() as test_dir:
+        with pytest.raises(ValueError):
+            DataCleaner(redcap=MockREDCap(), paths=PathResolver(test_dir), incremental=True, memory_limit=100)
@@ -0,0 +1,41 @@
+import os
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from redcap_downloader.storage.formats import check_file_format, read_table, write_table
+
+
+class TestFormats:
+
+    df = pd.DataFrame({
+        'participant_id': ['abd001', 'abd002', 'abd003'],
+        'score': [1.0, None, 3.0]
+    }, index=[4, 7, 9])
+
+    def test_check_file_format(self):
+        check_file_format('csv')
+        with pytest.raises(ValueError):
+            check_file_format('xlsx')
+
+    @pytest.mark.parametrize('file_format', ['csv', 'parquet', 'feather'])
+    def test_round_trip(self, file_format):
+        if file_format != 'csv':
+            pytest.importorskip('pyarrow')
+        with tempfile.TemporaryDirectory() as test_dir:
+            file_path = Path(test_dir) / f'table.{file_format}'
+            write_table(self.df, file_path)
+            result = read_table(file_path)
+        pd.testing.assert_frame_equal(result, self.df.reset_index(drop=True), check_dtype=False)
+
+    def test_write_table_replaces_linked_file(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            previous, file_path = Path(test_dir) / 'previous.csv', Path(test_dir) / 'table.csv'
+            previous.write_text('previous')
+            os.link(previous, file_path)
+            write_table(self.df, file_path)
+            assert previous.read_text() == 'previous'
+            pd.testing.assert_frame_equal(read_table(file_path), self.df.reset_index(drop=True))
+            assert sorted(path.name for path in Path(test_dir).iterdir()) == ['previous.csv', 'table.csv']
@@ -0,0 +1,54 @@
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from redcap_downloader.storage.manifest import Manifest, hash_table, reuse_unchanged_file
+
+
+class TestManifest:
+
+    df = pd.DataFrame({'participant_id': ['abd001', 'abd001'], 'score': [1.0, None]})
+
+    def test_hash_table_ignores_index(self):
+        assert hash_table(self.df) == hash_table(self.df.set_axis([5, 6]))
+
+    def test_hash_table_detects_changes(self):
+        assert hash_table(self.df) != hash_table(self.df.assign(score=[1.0, 2.0]))
+        assert hash_table(self.df) != hash_table(self.df.rename(columns={'score': 'total'}))
+        assert hash_table(self.df) != hash_table(self.df.astype({'score': 'float32'}))
+
+    def test_unknown_policy(self):
+        with pytest.raises(ValueError):
+            Manifest('manifest.json', policy='delete')
+
+    def test_save_and_reload(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            manifest = Manifest(Path(test_dir) / 'manifest.json')
+            manifest.update('reports/abd001/PROM-Ques', 'abc', Path(test_dir) / 'file.csv')
+            manifest.save()
+            reloaded = Manifest(Path(test_dir) / 'manifest.json')
+            assert reloaded.get('reports/abd001/PROM-Ques') == {'hash': 'abc', 'file': str(Path(test_dir) / 'file.csv')}
+            assert reloaded.get('reports/abd002/PROM-Ques') is None
+
+    @pytest.mark.parametrize('policy, expected', [('write', None), ('skip', 'skipped'), ('link', 'linked')])
+    def test_reuse_unchanged_file(self, policy, expected):
+        with tempfile.TemporaryDirectory() as test_dir:
+            previous_file = Path(test_dir) / 'abd001_PROM-Ques_20250715.csv'
+            previous_file.write_text('content')
+            new_file = Path(test_dir) / 'abd001_PROM-Ques_20250716.csv'
+            previous = {'hash': 'abc', 'file': str(previous_file)}
+
+            assert reuse_unchanged_file('abc', new_file, previous, policy) == expected
+            assert new_file.exists() == (expected == 'linked')
+            if expected == 'linked':
+                assert new_file.stat().st_ino == previous_file.stat().st_ino
+
+    def test_reuse_changed_file(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            previous_file = Path(test_dir) / 'previous.csv'
+            previous_file.write_text('content')
+            previous = {'hash': 'abc', 'file': str(previous_file)}
+            assert reuse_unchanged_file('def', Path(test_dir) / 'new.csv', previous, 'link') is None
+            assert reuse_unchanged_file('abc', Path(test_dir) / 'new.csv', None, 'link') is None
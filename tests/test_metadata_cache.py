@@ -0,0 +1,56 @@
+import json
+import tempfile
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from redcap_downloader.storage import metadata_cache
+from redcap_downloader.storage.metadata_cache import MetadataCache
+
+
+class TestMetadataCache:
+
+    data = pd.DataFrame({'field_name': ['field1', 'field2'], 'form_name': ['screening', 'baseline']})
+
+    def test_key_does_not_contain_secrets(self):
+        key = MetadataCache.get_key('https://redcap.example.org/api/', 'secret_token', 'screening')
+        assert 'secret' not in key
+        assert key != MetadataCache.get_key('https://redcap.example.org/api/', 'other_token', 'screening')
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            cache = MetadataCache(test_dir)
+            assert cache.load('key', 'abc') is None
+            cache.save('key', 'abc', self.data)
+            pd.testing.assert_frame_equal(cache.load('key', 'abc'), self.data)
+
+    def test_stale_fingerprint(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            cache = MetadataCache(test_dir)
+            cache.save('key', 'abc', self.data)
+            assert cache.load('key', 'def') is None
+
+    def test_expired(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            cache = MetadataCache(test_dir, max_age_days=1)
+            cache.save('key', 'abc', self.data)
+            info_file = cache.cache_dir / 'metadata_key.json'
+            info = json.loads(info_file.read_text())
+            info_file.write_text(json.dumps({**info, 'saved_at': (datetime.now() - timedelta(days=2)).isoformat()}))
+            assert cache.load('key', 'abc') is None
+
+    def test_other_versions(self, monkeypatch):
+        with tempfile.TemporaryDirectory() as test_dir:
+            cache = MetadataCache(test_dir)
+            cache.save('key', 'abc', self.data)
+            monkeypatch.setattr(metadata_cache, 'get_version', lambda: '99.0')
+            assert cache.load('key', 'abc') is None
+
+    def test_unreadable_cache(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            cache = MetadataCache(test_dir)
+            cache.save('key', 'abc', self.data)
+            (cache.cache_dir / 'metadata_key.pkl').write_bytes(b'not a pickle')
+            assert cache.load('key', 'abc') is None
+            (cache.cache_dir / 'metadata_key.json').write_text('{')
+            assert cache.load('key', 'abc') is None
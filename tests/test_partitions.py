@@ -0,0 +1,108 @@
+import pandas as pd
+import pytest
+
+from redcap_downloader.redcap_api.schema import ReportSchema
+from redcap_downloader.storage.partitions import ReportPartitioner
+
+
+def make_report(participant_ids):
+    return pd.DataFrame({
+        'study_id': participant_ids,
+        'redcap_event_name': [f'event_{i}' for i in range(len(participant_ids))],
+        'score': [i if i % 3 else None for i in range(len(participant_ids))],
+        'comment': ['line 1\nline 2' if i == 1 else '' for i in range(len(participant_ids))],
+    })
+
+
+@pytest.fixture
+def grouped_report(tmp_path):
+    report = make_report(['abd001'] * 3 + ['abd002'] * 4 + ['abd003'] + ['abd004'] * 2)
+    report.to_csv(tmp_path / 'report.csv', index=False)
+    return tmp_path / 'report.csv', report
+
+
+@pytest.fixture
+def interleaved_report(tmp_path):
+    report = make_report(['abd001', 'abd002', 'abd003', 'abd001', 'abd004', 'abd002', 'abd003', 'abd001'])
+    report.to_csv(tmp_path / 'report.csv', index=False)
+    return tmp_path / 'report.csv', report
+
+
+def check_partitions(partitions, file_path):
+    expected = pd.read_csv(file_path)
+    seen = set()
+    for partition in partitions:
+        participants = set(partition.study_id)
+        assert not participants & seen
+        seen |= participants
+        # Each participant has all its rows, in file order, with the column types of the whole report
+        for participant_id, rows in partition.groupby('study_id'):
+            pd.testing.assert_frame_equal(rows.reset_index(drop=True),
+                                          expected[expected.study_id == participant_id].reset_index(drop=True))
+    assert seen == set(expected.study_id)
+
+
+@pytest.mark.parametrize('partition_rows, n_partitions', [(1, 4), (2, 3), (3, 3), (5, 2), (100, 1)])
+def test_grouped_partitions(grouped_report, partition_rows, n_partitions):
+    file_path, _ = grouped_report
+    partitioner = ReportPartitioner(file_path, 'study_id', memory_limit=0)
+    partitioner._partition_rows = partition_rows
+
+    partitions = list(partitioner.partitions())
+    assert partitioner.is_grouped()
+    assert len(partitions) == n_partitions
+    check_partitions(partitions, file_path)
+
+
+@pytest.mark.parametrize('partition_rows, n_partitions', [(1, 4), (3, 3), (5, 2), (100, 1)])
+def test_interleaved_partitions(interleaved_report, partition_rows, n_partitions):
+    file_path, _ = interleaved_report
+    partitioner = ReportPartitioner(file_path, 'study_id', memory_limit=0)
+    partitioner._partition_rows = partition_rows
+
+    partitions = list(partitioner.partitions())
+    assert not partitioner.is_grouped()
+    assert len(partitions) == n_partitions
+    check_partitions(partitions, file_path)
+    assert not list(file_path.parent.glob('partitions_*'))
+
+
+def test_partition_rows_from_memory_limit(grouped_report):
+    file_path, _ = grouped_report
+    assert ReportPartitioner(file_path, 'study_id', memory_limit=1).get_partition_rows() == 1
+    assert ReportPartitioner(file_path, 'study_id', memory_limit=2 ** 30).get_partition_rows() > 10
+
+
+def test_partitions_with_schema(grouped_report):
+    file_path, _ = grouped_report
+    partitioner = ReportPartitioner(file_path, 'study_id', memory_limit=0, schema=ReportSchema({'score': 'Int64'}))
+    partitioner._partition_rows = 2
+
+    partitions = list(partitioner.partitions())
+    assert all(partition.score.dtype == 'Int64' for partition in partitions)
+
+
+def test_empty_report(tmp_path):
+    (tmp_path / 'empty.csv').write_text('')
+    (tmp_path / 'header.csv').write_text('study_id,redcap_event_name\n')
+
+    assert list(ReportPartitioner(tmp_path / 'empty.csv', 'study_id', memory_limit=1).partitions()) == []
+    assert list(ReportPartitioner(tmp_path / 'header.csv', 'study_id', memory_limit=1).partitions()) == []
+
+
+def test_infer_dtypes(tmp_path):
+    pd.DataFrame({
+        'study_id': ['abd001', 'abd002', 'abd003', 'abd004'],
+        'integers': [1, 2, 3, 4],
+        'missing': [1, 2, 3, None],
+        'mixed': ['1', '2', '3', 'x'],
+        'booleans': [True, False, True, False],
+        'empty': [None] * 4,
+    }).to_csv(tmp_path / 'report.csv', index=False)
+    partitioner = ReportPartitioner(tmp_path / 'report.csv', 'study_id', memory_limit=0,
+                                    schema=ReportSchema({'integers': 'Int64'}))
+    partitioner._partition_rows = 2
+
+    assert partitioner.infer_dtypes() == {'missing': 'float64', 'mixed': 'str'}
+    partitioner.schema = None
+    assert partitioner.infer_dtypes() == {'integers': 'int64', 'missing': 'float64', 'mixed': 'str'}
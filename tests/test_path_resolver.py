@@ -76,5 +76,138 @@ class TestPathsResolver():
         assert self.resolver.get_subject_questionnaire(subject_id, event_name) == expected_path
         assert not expected_path.exists()
 
+    def test_get_sync_state_file(self):
+        assert self.resolver.get_sync_state_file() == self.test_dir / 'sync_state.json'
+
+    def test_file_format(self):
+        pytest.importorskip('pyarrow')
+        with tempfile.TemporaryDirectory() as test_dir:
+            resolver = PathResolver(test_dir, file_format='parquet')
+            assert resolver.get_raw_report_file().suffix == '.parquet'
+            assert resolver.get_subject_questionnaire('subject_123', 'Ques').suffix == '.parquet'
+
+    def test_unknown_file_format(self):
+        with pytest.raises(ValueError):
+            PathResolver(self.test_dir / 'other', file_format='xlsx')
+
+    def test_get_reports_dataset(self):
+        assert self.resolver.get_reports_dataset() == self.test_dir / 'reports' / 'PROM_dataset'
+
+    def test_unknown_existing_dir_policy(self):
+        with pytest.raises(ValueError):
+            PathResolver(self.test_dir / 'other', existing_dir='skip')
+
+    def test_existing_dir_ignores_log_files(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            (Path(test_dir) / 'download_20250101.log').touch()
+            assert PathResolver(test_dir, existing_dir='fail').get_main_dir() == Path(test_dir)
+
+    def test_existing_dir_fail(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            (Path(test_dir) / 'raw').mkdir()
+            with pytest.raises(FileExistsError):
+                PathResolver(test_dir, existing_dir='fail')
+
+    def test_existing_dir_ask_without_terminal(self, monkeypatch):
+        monkeypatch.setattr('sys.stdin.isatty', lambda: False)
+        with tempfile.TemporaryDirectory() as test_dir:
+            (Path(test_dir) / 'raw').mkdir()
+            with pytest.raises(FileExistsError):
+                PathResolver(test_dir)
+
+    def test_existing_dir_overwrite(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            (Path(test_dir) / 'raw').mkdir()
+            assert PathResolver(test_dir, existing_dir='overwrite').get_main_dir() == Path(test_dir)
+
+    def test_existing_dir_version(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            main_dir = Path(test_dir) / 'data'
+            (main_dir / 'raw').mkdir(parents=True)
+            (Path(test_dir) / 'data_v2' / 'raw').mkdir(parents=True)
+            resolver = PathResolver(main_dir, existing_dir='version')
+            assert resolver.get_main_dir() == Path(test_dir) / 'data_v3'
+            assert resolver.get_raw_dir().exists()
+
+    def test_directories_are_created_once(self, monkeypatch):
+        with tempfile.TemporaryDirectory() as test_dir:
+            resolver = PathResolver(test_dir)
+            created = []
+            mkdir = Path.mkdir
+
+            def counting_mkdir(path, *args, **kwargs):
+                created.append(path)
+                mkdir(path, *args, **kwargs)
+            monkeypatch.setattr(Path, 'mkdir', counting_mkdir)
+            for _ in range(3):
+                resolver.get_raw_report_file()
+                resolver.get_subject_questionnaire('subject_123', 'Ques')
+            assert created == [Path(test_dir) / 'raw', Path(test_dir) / 'reports',
+                               Path(test_dir) / 'reports' / 'subject_123']
+
+    def test_make_subject_dirs(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            resolver = PathResolver(test_dir)
+            (Path(test_dir) / 'reports' / 'subject_1').mkdir(parents=True)
+            resolver.make_subject_dirs(['subject_1', 'subject_2'])
+            assert (Path(test_dir) / 'reports' / 'subject_2').is_dir()
+            assert resolver.get_subject_dir('subject_1') == Path(test_dir) / 'reports' / 'subject_1'
+
+    def test_staged_output(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            test_dir = Path(test_dir)
+            first = PathResolver(test_dir, staged=True)
+            first.get_raw_report_file().write_text('first')
+            assert first.get_output_dir().parent == test_dir / 'snapshots'
+            assert not (test_dir / 'current').exists()
+            assert first.publish() == test_dir / 'current'
+            assert (test_dir / 'current' / 'raw' / first.get_raw_report_file().name).read_text() == 'first'
+
+            # The next snapshot starts from the published one, without changing it
+            (test_dir / 'snapshots' / '20000101-000000').mkdir()  # Interrupted run
+            second = PathResolver(test_dir, staged=True)
+            raw_file = second.get_raw_report_file()
+            assert raw_file.read_text() == 'first'
+            raw_file.unlink()
+            raw_file.write_text('second')
+            assert (test_dir / 'current').resolve() == first.get_output_dir().resolve()
+            second.publish()
+            assert (test_dir / 'current' / 'raw' / raw_file.name).read_text() == 'second'
+            assert (first.get_output_dir() / 'raw' / raw_file.name).read_text() == 'first'
+
+            third = PathResolver(test_dir, staged=True)
+            third.publish()
+            # The interrupted run is kept, as it cannot be told apart from a run still in progress
+            assert sorted(snapshot.name for snapshot in (test_dir / 'snapshots').iterdir() if snapshot.is_dir()) == \
+                sorted(['20000101-000000', second.get_output_dir().name, third.get_output_dir().name])
+
+    def test_staged_output_keeps_snapshots_of_runs_in_progress(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            test_dir = Path(test_dir)
+            first = PathResolver(test_dir, staged=True)
+            second = PathResolver(test_dir, staged=True)
+            second.publish()
+            assert first.get_output_dir().is_dir()
+
+            first.publish()
+            assert second.get_output_dir().is_dir()
+            third = PathResolver(test_dir, staged=True)
+            third.publish()
+            assert not second.get_output_dir().exists()
+            assert first.get_output_dir().is_dir()
+            assert sorted(marker.name for marker in (test_dir / 'snapshots').glob('*.published')) == \
+                sorted(f'{run.get_output_dir().name}.published' for run in (first, third))
+
+    def test_staged_output_keeps_previous_snapshot_of_relative_dir(self, monkeypatch):
+        with tempfile.TemporaryDirectory() as test_dir:
+            monkeypatch.chdir(test_dir)
+            first = PathResolver('data', staged=True)
+            first.publish()
+            second = PathResolver('data', staged=True)
+            second.publish()
+            # The previously published snapshot is kept for readers still using it
+            assert first.get_output_dir().is_dir()
+            assert (Path('data') / 'current').resolve() == second.get_output_dir().resolve()
+
     def test_tearDown(self):
         self.temp_dir.cleanup()
@@ -0,0 +1,126 @@
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+from redcap_downloader.profiling import StageProfiler, add_bytes_written, profile_calls, profiled, table_shape
+
+
+class Pipeline:
+
+    def __init__(self):
+        self.data = pd.DataFrame({'participant_id': ['1', '1', '2'], 'score': [1, 2, 3]})
+
+    @profiled()
+    def load(self) -> pd.DataFrame:
+        return self.data
+
+    @profiled('save')
+    def save(self):
+        for _ in self.groups():
+            self.write(10)
+            # Time spent by the consumer between items is not counted in the groups stage
+            time.sleep(0.05)
+
+    @profiled()
+    def write(self, n_bytes: int):
+        add_bytes_written(n_bytes)
+
+    @profiled()
+    def groups(self):
+        for _, df in self.data.groupby('participant_id'):
+            yield df
+
+
+def test_stages_are_not_recorded_without_profiler():
+    pipeline = Pipeline()
+    assert pipeline.load() is pipeline.data
+    assert len(list(pipeline.groups())) == 2
+
+
+def test_stage_records():
+    profiler = StageProfiler()
+    pipeline = Pipeline()
+    with profiler.activate():
+        pipeline.load()
+        pipeline.save()
+    pipeline.load()
+
+    stages = {record['stage']: record for record in profiler.stages}
+    assert [record['stage'] for record in profiler.stages].count('Pipeline.load') == 1
+    assert (stages['Pipeline.load']['rows'], stages['Pipeline.load']['columns']) == (3, 2)
+    assert stages['Pipeline.write']['bytes_written'] == 10
+    assert stages['save']['bytes_written'] == 20
+    assert stages['save']['wall_time'] >= 0.1
+    assert stages['Pipeline.groups']['items'] == 2
+    assert stages['Pipeline.groups']['wall_time'] < 0.05
+    assert all(record['cpu_time'] is not None and record['traced_peak'] is None for record in profiler.stages)
+
+
+def test_traced_memory():
+    profiler = StageProfiler(trace_memory=True)
+    with profiler.activate():
+        Pipeline().load()
+    assert profiler.stages[0]['traced_peak'] > 0
+
+
+def test_save_run_report(tmp_path):
+    profiler = StageProfiler()
+    with profiler.activate():
+        Pipeline().load()
+    profiler.save(tmp_path / 'download_20250101.json', status='ok')
+
+    report = json.loads((tmp_path / 'download_20250101.json').read_text())
+    assert report['status'] == 'ok'
+    assert report['stages'][0]['stage'] == 'Pipeline.load'
+
+
+def test_table_shape():
+    assert table_shape(pd.DataFrame({'a': [1, 2]})) == (2, 1)
+    assert table_shape(Pipeline()) == (3, 2)
+    assert table_shape(None) is None
+
+
+def test_traced_memory_of_nested_profilers():
+    outer, inner = StageProfiler(trace_memory=True), StageProfiler(trace_memory=True)
+    with outer.activate():
+        with inner.activate():
+            pass
+        # Tracing is only stopped once the last profiler tracing memory completes
+        assert tracemalloc.is_tracing()
+        Pipeline().load()
+    assert not tracemalloc.is_tracing()
+    assert outer.stages[0]['traced_peak'] > 0
+
+
+def test_traced_peak_is_kept_when_another_thread_resets_it():
+    def other_download():
+        with StageProfiler(trace_memory=True).activate():
+            Pipeline().load()
+
+    profiler = StageProfiler(trace_memory=True)
+    with profiler.activate():
+        with profiler.stage('outer'):
+            data = bytearray(10_000_000)
+            del data
+            thread = threading.Thread(target=other_download)
+            thread.start()
+            thread.join()
+    stages = {record['stage']: record for record in profiler.stages}
+    assert stages['outer']['traced_peak'] >= 10_000_000
+
+
+def test_profile_calls_covers_threads(tmp_path):
+    def download():
+        time.sleep(0.01)
+
+    with profile_calls(tmp_path / 'download.prof'):
+        thread = threading.Thread(target=download)
+        thread.start()
+        thread.join()
+
+    stats = pstats.Stats(str(tmp_path / 'download.prof'))
+    assert any(function == 'download' for _, _, function in stats.stats)
@@ -1,13 +1,27 @@
+import pandas as pd
 import pytest
+import tempfile
+from pathlib import Path
 from unittest.mock import patch, MagicMock
 
 from redcap_downloader.redcap_api.redcap import REDCap
 from redcap_downloader.redcap_api.dom import Variables, Report
+from redcap_downloader.redcap_api.schema import ReportSchema
+from redcap_downloader.storage.metadata_cache import MetadataCache
 
 
 class DummyProperties:
     redcap_token = "dummy_token"
     report_id = 123
+    stream_download = False
+    api_url = "https://redcap.example.org/api/"
+    pool_size = 2
+    connect_timeout = 1
+    read_timeout = 5
+    max_retries = 3
+    backoff_factor = 0
+    batch_size = 0
+    max_workers = 2
 
 
 @pytest.fixture
@@ -20,13 +34,32 @@ def redcap(properties):
     return REDCap(properties)
 
 
+@pytest.fixture
+def streaming_redcap(properties):
+    redcap = REDCap(properties)
+    redcap.stream = True
+    return redcap
+
+
+def make_streamed_response(status_code, body, chunk_size=8):
+    mock_response = MagicMock()
+    mock_response.status_code = status_code
+    mock_response.text = body
+    mock_response.encoding = 'utf-8'
+    mock_response.iter_content.side_effect = lambda chunk_size=1: (
+        body.encode()[i:i + chunk_size] for i in range(0, len(body.encode()), chunk_size)
+    )
+    mock_response.__enter__.return_value = mock_response
+    return mock_response
+
+
 def test_get_questionnaire_variables_success(redcap):
     csv_data = "field_name,form_name\nfield1,screening\nfield2,baseline"
     mock_response = MagicMock()
     mock_response.status_code = 200
     mock_response.text = csv_data
 
-    with patch("requests.post", return_value=mock_response) as mock_post:
+    with patch("requests.Session.post", return_value=mock_response) as mock_post:
         variables = redcap.get_questionnaire_variables()
         assert isinstance(variables, Variables)
         assert "field_name" in variables.raw_data.columns
@@ -39,7 +72,7 @@ def test_get_questionnaire_variables_failure(redcap):
     mock_response.status_code = 404
     mock_response.text = "Not Found"
 
-    with patch("requests.post", return_value=mock_response):
+    with patch("requests.Session.post", return_value=mock_response):
         with pytest.raises(Exception) as excinfo:
             redcap.get_questionnaire_variables()
         assert "HTTP Error: 404" in str(excinfo.value)
@@ -51,7 +84,7 @@ def test_get_questionnaire_report_success(redcap):
     mock_response.status_code = 200
     mock_response.text = csv_data
 
-    with patch("requests.post", return_value=mock_response) as mock_post:
+    with patch("requests.Session.post", return_value=mock_response) as mock_post:
         report = redcap.get_questionnaire_report()
         assert isinstance(report, Report)
         assert "study_id" in report.raw_data.columns
@@ -64,7 +97,188 @@ def test_get_questionnaire_report_failure(redcap):
     mock_response.status_code = 500
     mock_response.text = "Internal Server Error"
 
-    with patch("requests.post", return_value=mock_response):
+    with patch("requests.Session.post", return_value=mock_response):
         with pytest.raises(Exception) as excinfo:
             redcap.get_questionnaire_report()
         assert "HTTP Error: 500" in str(excinfo.value)
+
+
+def test_get_questionnaire_report_streaming(streaming_redcap):
+    csv_data = "study_id,redcap_event_name,consent_contact\n1,event1,1\n2,event2,1\n"
+    mock_response = make_streamed_response(200, csv_data)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        raw_file = Path(tmp_dir) / 'Report_raw.csv'
+        with patch("requests.Session.post", return_value=mock_response) as mock_post:
+            report = streaming_redcap.get_questionnaire_report(raw_file=raw_file)
+        assert mock_post.call_args.kwargs['stream'] is True
+        assert isinstance(report, Report)
+        assert list(report.raw_data.columns) == ["study_id", "redcap_event_name", "consent_contact"]
+        assert len(report.raw_data) == 2
+        assert report.raw_file == raw_file
+        assert raw_file.read_text() == csv_data
+
+
+def test_get_questionnaire_report_streaming_failure(streaming_redcap):
+    mock_response = make_streamed_response(502, "Bad Gateway")
+
+    with patch("requests.Session.post", return_value=mock_response):
+        with pytest.raises(Exception) as excinfo:
+            streaming_redcap.get_questionnaire_report()
+        assert "HTTP Error: 502" in str(excinfo.value)
+
+
+@pytest.fixture
+def stub_redcap(properties, stub_server):
+    properties.api_url = stub_server.url
+    redcap = REDCap(properties)
+    yield redcap
+    redcap.close()
+
+
+def test_session_retries_server_errors(stub_redcap, stub_server):
+    stub_server.queue('report', 502, 'Bad Gateway')
+    stub_server.queue('report', 503, 'Service Unavailable')
+    stub_server.queue('report', 200, "study_id,redcap_event_name\n1,event1\n")
+
+    report = stub_redcap.get_questionnaire_report()
+    assert len(report.raw_data) == 1
+    assert len(stub_server.requests) == 3
+    assert stub_server.requests[0]['token'] == 'dummy_token'
+
+
+def test_session_gives_up_after_max_retries(stub_redcap, stub_server):
+    stub_server.queue('metadata', 500, 'Internal Server Error')
+
+    with pytest.raises(Exception) as excinfo:
+        stub_redcap.get_questionnaire_variables()
+    assert "HTTP Error: 500" in str(excinfo.value)
+    assert len(stub_server.requests) == DummyProperties.max_retries + 1
+
+
+def test_session_does_not_retry_client_errors(stub_redcap, stub_server):
+    stub_server.queue('metadata', 403, 'Forbidden')
+
+    with pytest.raises(Exception):
+        stub_redcap.get_questionnaire_variables()
+    assert len(stub_server.requests) == 1
+
+
+def test_session_streaming_with_stub_server(stub_redcap, stub_server):
+    stub_redcap.stream = True
+    stub_server.queue('report', 429, 'Too Many Requests')
+    stub_server.queue('report', 200, "study_id,redcap_event_name\n1,event1\n2,event2\n")
+
+    report = stub_redcap.get_questionnaire_report()
+    assert len(report.raw_data) == 2
+    assert len(stub_server.requests) == 2
+
+
+def test_report_schema_mismatch_falls_back_to_inferred_types(stub_redcap, stub_server):
+    schema = ReportSchema({'study_id': 'str', 'age': 'Int64'})
+    stub_server.queue('report', 200, "study_id,redcap_event_name,age\n001,event1,34.5\n")
+
+    report = stub_redcap.get_questionnaire_report(schema=schema)
+    assert report.raw_data.age.tolist() == [34.5]
+    assert report.raw_data.study_id.tolist() == [1]
+    assert len(stub_server.requests) == 1
+
+    stub_redcap.stream = True
+    report = stub_redcap.get_questionnaire_report(schema=schema)
+    assert report.raw_data.age.tolist() == [34.5]
+    assert len(stub_server.requests) == 3
+
+
+def test_report_schema_with_stub_server(stub_redcap, stub_server):
+    schema = ReportSchema({'study_id': 'str', 'age': 'Int64'})
+    stub_server.queue('report', 200, "study_id,redcap_event_name,age\n001,event1,34\n002,event2,\n")
+
+    for stream in (False, True):
+        stub_redcap.stream = stream
+        report = stub_redcap.get_questionnaire_report(schema=schema)
+        assert report.raw_data.study_id.tolist() == ['001', '002']
+        assert report.raw_data.age.dtype == 'Int64'
+
+
+def records_body(fields):
+    if 'fields[0]' in fields:
+        return "study_id,redcap_event_name\n" + "".join(f"abd{i:03d},baseline_arm_1\n" for i in range(5))
+    record_ids = [v for k, v in sorted(fields.items()) if k.startswith('records[')]
+    return "study_id,redcap_event_name,consent_contact\n" + "".join(f"{r},baseline_arm_1,1\n" for r in record_ids)
+
+
+def test_get_questionnaire_records_batched(stub_redcap, stub_server):
+    stub_redcap.batch_size = 2
+    stub_server.queue('record', 200, records_body)
+
+    report = stub_redcap.get_questionnaire_report()
+    assert isinstance(report, Report)
+    assert report.raw_data.study_id.tolist() == [f"abd{i:03d}" for i in range(5)]
+    batch_requests = [r for r in stub_server.requests if 'records[0]' in r]
+    assert len(batch_requests) == 3
+    assert all(r['forms[0]'] == 'participant_information' for r in batch_requests)
+    assert max(len([k for k in r if k.startswith('records[')]) for r in batch_requests) == 2
+
+
+def test_download_questionnaire_report(stub_redcap, stub_server, tmp_path):
+    body = "study_id,redcap_event_name,comment\nabd001,event1,\"line 1\nline 2\"\nabd002,event2,\n"
+    stub_server.queue('report', 200, body)
+
+    assert stub_redcap.download_questionnaire_report(tmp_path / 'report.csv') == tmp_path / 'report.csv'
+    assert (tmp_path / 'report.csv').read_text() == body
+    assert list(tmp_path.iterdir()) == [tmp_path / 'report.csv']
+
+
+def test_download_questionnaire_report_batched(stub_redcap, stub_server, tmp_path):
+    stub_redcap.batch_size = 2
+    stub_server.queue('record', 200, records_body)
+
+    stub_redcap.download_questionnaire_report(tmp_path / 'report.csv')
+    report = pd.read_csv(tmp_path / 'report.csv')
+    assert report.study_id.tolist() == [f"abd{i:03d}" for i in range(5)]
+    assert report.consent_contact.tolist() == [1] * 5
+
+
+def test_download_questionnaire_report_failure(stub_redcap, stub_server, tmp_path):
+    stub_server.queue('report', 403, 'Forbidden')
+
+    with pytest.raises(Exception):
+        stub_redcap.download_questionnaire_report(tmp_path / 'report.csv')
+    assert not list(tmp_path.iterdir())
+
+
+def test_get_record_ids(stub_redcap, stub_server):
+    stub_server.queue('record', 200, "study_id,redcap_event_name\nabd001,screening_arm_1\nabd001,baseline_arm_1\n"
+                                     "abd002,screening_arm_1\n")
+
+    assert stub_redcap.get_record_ids() == ['abd001', 'abd002']
+
+
+def test_get_questionnaire_variables_cached(stub_redcap, stub_server):
+    header = "original_field_name,choice_value,export_field_name\n"
+    stub_server.queue('exportFieldNames', 200, header + "field1,,field1\n")
+    stub_server.queue('exportFieldNames', 200, header + "field1,,field1\n")
+    stub_server.queue('exportFieldNames', 200, header + "field2,,field2\n")
+    stub_server.queue('metadata', 200, "field_name,form_name\nfield1,screening\n")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stub_redcap.metadata_cache = MetadataCache(tmp_dir)
+        first = stub_redcap.get_questionnaire_variables()
+        second = stub_redcap.get_questionnaire_variables()
+        third = stub_redcap.get_questionnaire_variables()
+
+    contents = [r['content'] for r in stub_server.requests]
+    assert contents == ['exportFieldNames', 'metadata', 'exportFieldNames', 'exportFieldNames', 'metadata']
+    assert stub_server.requests[0]['token'] == 'dummy_token'
+    pd.testing.assert_frame_equal(first.raw_data, second.raw_data)
+    assert len(third.raw_data) == 1
+
+
+def test_report_parser_error_is_not_a_schema_mismatch(stub_redcap, stub_server):
+    schema = ReportSchema({'study_id': 'str', 'age': 'Int64'})
+    stub_server.queue('report', 200, 'study_id,redcap_event_name,age\n001,event1,34\n"002,event2\n')
+    stub_redcap.stream = True
+
+    with pytest.raises(pd.errors.ParserError):
+        stub_redcap.get_questionnaire_report(schema=schema)
+    assert len(stub_server.requests) == 1
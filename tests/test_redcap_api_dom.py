@@ -1,9 +1,14 @@
 import pandas as pd
+import pytest
 import tempfile
 import os
+from collections.abc import Iterator
 
+from redcap_downloader.data_cleaning.helpers import drop_empty_columns
 from redcap_downloader.redcap_api.dom import Report, Variables, DataMixin
 from redcap_downloader.storage.path_resolver import PathResolver
+from redcap_downloader.storage.manifest import Manifest
+from redcap_downloader.storage.writer import GroupWriter
 
 
 class TestReport:
@@ -29,15 +34,130 @@ class TestReport:
         report.save_cleaned_data(self.paths, by=['participant_id', 'redcap_event_name'])
         assert os.path.exists(self.paths.get_subject_questionnaire(subject_id='1', event_name='form1'))
 
+    def test_save_cleaned_data_parallel_identical(self):
+        report = Report(self.test_report)
+        report.data = pd.DataFrame({
+            'participant_id': ['1', '1', '2', '3'],
+            'redcap_event_name': ['event1', 'event2', 'event2', 'event3'],
+            'consent_contact': ['1', None, '1', '0'],
+            'empty_column': [None, None, None, None],
+            'output_form': ['form1', 'form2', 'form2', 'form2'],
+        })
+        outputs = {}
+        for backend in GroupWriter.BACKENDS:
+            with tempfile.TemporaryDirectory() as test_dir:
+                paths = PathResolver(test_dir)
+                with GroupWriter(backend, max_workers=2) as writer:
+                    report.save_cleaned_data(paths, by=['participant_id', 'output_form'], writer=writer)
+                outputs[backend] = {f.name: f.read_bytes() for f in sorted(paths.get_reports_dir().rglob('*.csv'))}
+        assert len(outputs['serial']) == 4
+        assert outputs['thread'] == outputs['serial']
+        assert outputs['process'] == outputs['serial']
+
+    def test_split_matches_groupby(self):
+        report = Report(self.test_report)
+        report.data = pd.DataFrame({
+            'participant_id': ['2', '1', '2', '1', '3'],
+            'output_form': ['Ques', 'Scre', 'Ques', 'Ques', 'Ques'],
+            'value': [1, 2, 3, 4, 5]
+        })
+        groups = list(report.split(by=['participant_id', 'output_form']))
+        expected = [group for _, group in report.data.groupby(['participant_id', 'output_form'])]
+        assert len(groups) == len(expected)
+        for group, expected_group in zip(groups, expected):
+            pd.testing.assert_frame_equal(group, expected_group)
+
+    def test_split_removes_empty_columns(self):
+        report = Report(self.test_report)
+        report.data = pd.DataFrame({
+            'participant_id': ['2', '1', '2', '1', '3'],
+            'output_form': ['Ques', 'Scre', 'Ques', 'Ques', 'Ques'],
+            'screening': [None, 1, None, None, None],
+            'mood': [1, None, None, 4, 5],
+            'empty': [None] * 5,
+        })
+        groups = list(report.split(by=['participant_id', 'output_form'], remove_empty_columns=True))
+        expected = [drop_empty_columns(group) for _, group in report.data.groupby(['participant_id', 'output_form'])]
+        assert [list(group.columns) for group in groups] == [
+            ['participant_id', 'output_form', 'mood'],
+            ['participant_id', 'output_form', 'screening'],
+            ['participant_id', 'output_form', 'mood'],
+            ['participant_id', 'output_form', 'mood'],
+        ]
+        for group, expected_group in zip(groups, expected):
+            pd.testing.assert_frame_equal(group, expected_group)
+
+    def test_column_occupancy(self):
+        report = Report(self.test_report)
+        report.data = pd.DataFrame({
+            'participant_id': ['1', '1', '2'],
+            'value': [None, 1, None],
+            'output_form': ['Ques', 'Ques', 'Scre'],
+        })
+        occupancy = report.column_occupancy(by=['participant_id', 'output_form'])
+        assert list(occupancy.columns) == ['participant_id', 'value', 'output_form']
+        assert occupancy.to_numpy().tolist() == [[True, True, True], [True, False, True]]
+
+    def test_save_cleaned_data_with_manifest(self):
+        report = Report(self.test_report)
+        report.data = pd.DataFrame({
+            'participant_id': ['1', '2'],
+            'consent_contact': ['1', '1'],
+            'output_form': ['Ques', 'Ques'],
+        })
+        with tempfile.TemporaryDirectory() as test_dir:
+            paths = PathResolver(test_dir)
+            paths.timestamp = '20250715'
+            manifest = Manifest(paths.get_manifest_file(), policy='link')
+            summary = report.save_cleaned_data(paths, by=['participant_id', 'output_form'], manifest=manifest)
+            assert summary == {'written': 2, 'skipped': 0, 'linked': 0}
+
+            paths.timestamp = '20250716'
+            report.data = report.data.assign(consent_contact=['1', '0'])
+            manifest = Manifest(paths.get_manifest_file(), policy='link')
+            summary = report.save_cleaned_data(paths, by=['participant_id', 'output_form'], manifest=manifest)
+            assert summary == {'written': 1, 'skipped': 0, 'linked': 1}
+            assert paths.get_subject_questionnaire('1', 'Ques').stat().st_nlink == 2
+            assert Manifest(paths.get_manifest_file()).get('reports/2/PROM-Ques')['file'] == \
+                str(paths.get_subject_questionnaire('2', 'Ques'))
+
+    def test_save_partitioned_data(self):
+        pytest.importorskip('pyarrow')
+        report = Report(self.test_report)
+        report.data = pd.DataFrame({
+            'participant_id': ['1', '2', '2'],
+            'redcap_event_name': ['event1', 'event2', 'event3'],
+            'consent_contact': [1.0, 1.0, 0.0],
+            'output_form': ['Scre', 'Ques', 'Ques'],
+        })
+        with tempfile.TemporaryDirectory() as test_dir:
+            paths = PathResolver(test_dir)
+            report.save_partitioned_data(paths)
+            assert (paths.get_reports_dataset() / 'participant_id=2' / 'output_form=Ques').is_dir()
+
+            report.data = report.data[report.data.participant_id == '2'].assign(consent_contact=5.0)
+            report.save_partitioned_data(paths)
+            dataset = pd.read_parquet(paths.get_reports_dataset())
+            assert len(dataset) == 3
+            assert dataset[dataset.participant_id.astype(str) == '2'].consent_contact.tolist() == [5.0, 5.0]
+
     def test_save_raw_data(self):
         report = Report(self.test_report)
         report.save_raw_data(self.paths)
         assert os.path.exists(self.paths.get_raw_report_file())
 
+    def test_save_raw_data_already_spooled(self):
+        raw_file = self.paths.get_raw_report_file()
+        raw_file.write_text('spooled')
+        report = Report(self.test_report, raw_file=raw_file)
+        report.save_raw_data(self.paths)
+        assert raw_file.read_text() == 'spooled'
+
     def test_split(self):
         report = Report(self.test_report)
-        test_list = report.split(by=['study_id', 'redcap_event_name'])
-        assert isinstance(test_list, list)
+        test_groups = report.split(by=['study_id', 'redcap_event_name'])
+        assert isinstance(test_groups, Iterator)
+        test_list = list(test_groups)
         assert len(test_list) > 0
         for df in test_list:
             assert isinstance(df, pd.DataFrame)
@@ -75,8 +195,9 @@ class TestVariables:
 
     def test_split(self):
         variables = Variables(self.test_variables)
-        test_list = variables.split(by=['form_name'])
-        assert isinstance(test_list, list)
+        test_groups = variables.split(by=['form_name'])
+        assert isinstance(test_groups, Iterator)
+        test_list = list(test_groups)
         assert len(test_list) > 0
         for df in test_list:
             assert isinstance(df, pd.DataFrame)
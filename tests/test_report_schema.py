@@ -0,0 +1,96 @@
+from io import StringIO
+
+import pandas as pd
+import pytest
+
+from redcap_downloader.redcap_api.schema import ReportSchema, SchemaMismatchError, checkbox_columns, field_dtype
+
+
+@pytest.fixture
+def variables():
+    return pd.DataFrame({
+        'field_name': ['study_id', 'mood', 'symptoms', 'age', 'weight', 'visit_date', 'comments', 'intro'],
+        'form_name': ['screening', 'screening', 'screening', 'screening', 'baseline', 'baseline', 'baseline',
+                      'baseline'],
+        'field_type': ['text', 'radio', 'checkbox', 'text', 'text', 'text', 'notes', 'descriptive'],
+        'select_choices_or_calculations': [None, '1, Low | 2, High', '1, Sleep | 2, Appetite | -1, None', None,
+                                           None, None, None, None],
+        'text_validation_type_or_show_slider_number': [None, None, None, 'integer', 'number', 'date_ymd', None,
+                                                       None],
+    })
+
+
+REPORT_CSV = (
+    "study_id,redcap_event_name,mood,symptoms___1,symptoms___2,symptoms____1,age,weight,visit_date,comments,"
+    "screening_complete,baseline_complete\n"
+    "001,screening_arm_1,2,1,0,0,34,,,,2,\n"
+    "002,baseline_arm_1,,,,,,72.5,2025-07-17,Fine,,1\n"
+)
+
+
+def test_field_dtype():
+    assert field_dtype('radio', None) == 'category'
+    assert field_dtype('text', 'integer') == 'Int64'
+    assert field_dtype('text', 'number_2dp') == 'float64'
+    assert field_dtype('text', 'datetime_seconds_ymd') == 'datetime'
+    assert field_dtype('text', float('nan')) == 'str'
+    assert field_dtype('descriptive', None) is None
+
+
+def test_checkbox_columns():
+    assert checkbox_columns('symptoms', '1, Sleep | 2, Appetite | -1, None | A.b, Other') == [
+        'symptoms___1', 'symptoms___2', 'symptoms____1', 'symptoms___a_b'
+    ]
+    assert checkbox_columns('symptoms', None) == []
+
+
+def test_from_variables(variables):
+    schema = ReportSchema.from_variables(variables)
+
+    assert schema.dtypes['study_id'] == 'str'
+    assert schema.dtypes['mood'] == 'category'
+    assert schema.dtypes['symptoms____1'] == 'boolean'
+    assert schema.dtypes['screening_complete'] == 'Int8'
+    assert 'intro' not in schema.dtypes
+    assert schema.date_columns == ['visit_date']
+
+
+def test_read_csv(variables):
+    df = ReportSchema.from_variables(variables).read_csv(StringIO(REPORT_CSV))
+
+    assert df.study_id.tolist() == ['001', '002']
+    assert isinstance(df.mood.dtype, pd.CategoricalDtype)
+    assert isinstance(df.redcap_event_name.dtype, pd.CategoricalDtype)
+    assert df.symptoms___1.dtype == 'boolean'
+    assert df.symptoms___1.iloc[0] and not df.symptoms___2.iloc[0]
+    assert df.symptoms___1.isna().iloc[1]
+    assert df.age.dtype == 'Int64'
+    assert df.weight.dtype == 'float64'
+    assert pd.api.types.is_datetime64_any_dtype(df.visit_date)
+    assert df.baseline_complete.tolist()[1] == 1
+
+
+def test_read_csv_keeps_invalid_dates_as_strings(variables):
+    df = ReportSchema.from_variables(variables).read_csv(StringIO(REPORT_CSV.replace('2025-07-17', 'unknown')))
+
+    assert df.visit_date.tolist()[1] == 'unknown'
+
+
+def test_read_csv_raises_on_mismatch(variables):
+    with pytest.raises(SchemaMismatchError):
+        ReportSchema.from_variables(variables).read_csv(StringIO(REPORT_CSV.replace(',34,', ',34.5,')))
+
+
+def test_read_csv_raises_parser_errors(variables):
+    with pytest.raises(pd.errors.ParserError) as error:
+        ReportSchema.from_variables(variables).read_csv(StringIO(REPORT_CSV + '"unterminated\n'))
+    assert not isinstance(error.value, SchemaMismatchError)
+
+
+def test_categorize(variables):
+    schema = ReportSchema.from_variables(variables)
+    parts = [schema.read_csv(StringIO(REPORT_CSV)).iloc[[i]] for i in range(2)]
+
+    merged = schema.categorize(pd.concat(parts, ignore_index=True))
+    assert isinstance(merged.redcap_event_name.dtype, pd.CategoricalDtype)
+    assert merged.redcap_event_name.tolist() == ['screening_arm_1', 'baseline_arm_1']
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from redcap_downloader.data_cleaning.helpers import drop_empty_columns, merge_duplicate_columns
+from redcap_downloader.data_cleaning.sparse import SparseTable
+
+
+@pytest.fixture
+def wide():
+    return pd.DataFrame({
+        'study_id': ['abd001', 'abd001', 'abd002', 'abd003'],
+        'redcap_event_name': ['screening', 'baseline', 'screening', 'baseline'],
+        'age': [34, np.nan, 51, np.nan],
+        'mood_6m': [np.nan, 2.0, np.nan, np.nan],
+        'mood_12m': [np.nan, 3.0, np.nan, 1.0],
+        'comments': [np.nan, 'fine', np.nan, ''],
+    })
+
+
+def test_from_frame(wide):
+    table = SparseTable.from_frame(wide, index_columns=['study_id', 'redcap_event_name'])
+
+    assert table.columns == ['age', 'mood_6m', 'mood_12m', 'comments']
+    assert len(table.index) == 4
+    assert len(table.cells) == 7
+    assert table.cells.row.tolist() == [0, 1, 1, 1, 2, 3, 3]
+
+
+def test_to_frame_round_trip(wide):
+    table = SparseTable.from_frame(wide, index_columns=['study_id', 'redcap_event_name'])
+
+    pd.testing.assert_frame_equal(table.to_frame(), wide)
+
+
+def test_rename_merges_columns_like_merge_duplicate_columns(wide):
+    def mapper(column):
+        return column.replace('_6m', '').replace('_12m', '')
+
+    table = SparseTable.from_frame(wide, index_columns=['study_id', 'redcap_event_name']).rename(mapper)
+
+    assert table.columns == ['age', 'mood', 'comments']
+    pd.testing.assert_frame_equal(table.to_frame(), merge_duplicate_columns(wide.rename(columns=mapper)))
+
+
+def test_assign_and_query(wide):
+    table = (SparseTable.from_frame(wide, index_columns=['study_id', 'redcap_event_name'])
+             .assign(output_form=lambda df: np.where(df.redcap_event_name == 'screening', 'Scre', 'Ques'))
+             .query('study_id != "abd002"'))
+
+    expected = (wide.assign(output_form=lambda df: np.where(df.redcap_event_name == 'screening', 'Scre', 'Ques'))
+                .query('study_id != "abd002"'))
+    assert table.column_order[-1] == 'output_form'
+    assert len(table.cells) == 6
+    pd.testing.assert_frame_equal(table.to_frame(), expected)
+
+
+def test_split_only_keeps_non_empty_columns(wide):
+    table = SparseTable.from_frame(wide, index_columns=['study_id', 'redcap_event_name'])
+
+    groups = list(table.split(['redcap_event_name']))
+    expected = [drop_empty_columns(df) for _, df in wide.groupby('redcap_event_name')]
+    assert len(groups) == 2
+    for group, expected_group in zip(groups, expected):
+        pd.testing.assert_frame_equal(group, expected_group)
+
+
+def test_memory_usage(wide):
+    table = SparseTable.from_frame(wide, index_columns=['study_id', 'redcap_event_name'])
+
+    assert table.memory_usage() > 0
+
+
+def test_split_drops_rows_with_missing_key(wide):
+    wide = pd.concat([wide, pd.DataFrame({'study_id': [None], 'redcap_event_name': ['baseline'], 'age': [99]})],
+                     ignore_index=True)
+    table = SparseTable.from_frame(wide, index_columns=['study_id', 'redcap_event_name'])
+
+    groups = list(table.split(['study_id']))
+    expected = [drop_empty_columns(df) for _, df in wide.groupby('study_id')]
+    assert len(groups) == 3
+    for group, expected_group in zip(groups, expected):
+        pd.testing.assert_frame_equal(group, expected_group)
@@ -0,0 +1,62 @@
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# Budget for the imports made before the first log line, well above the time they take without pandas and requests
+FIRST_LOG_LINE_BUDGET = 0.3
+HEAVY_MODULES = {'pandas', 'numpy', 'requests', 'pyarrow', 'httpx'}
+# The package is imported from the source tree, even when run from another directory
+ENV = {**os.environ, 'PYTHONPATH': os.pathsep.join([str(Path(__file__).parents[1]), os.environ.get('PYTHONPATH', '')])}
+
+
+def imports_before_first_log_line(stderr: str) -> tuple[set[str], float]:
+    """Return the top-level packages imported before the first log line, and the time (in seconds) spent on them."""
+    modules, total = set(), 0
+    for line in stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+\d+ \|\s*(\S+)', line)
+        if match is None:
+            if ' - main - INFO - ' in line:
+                return modules, total / 1e6
+            continue
+        total += int(match.group(1))
+        modules.add(match.group(2).split('.')[0])
+    pytest.fail('No log line found')
+
+
+@pytest.fixture
+def properties_dir(tmp_path):
+    (tmp_path / 'redcap_token.txt').write_text('token\n')
+    (tmp_path / 'REDCap_downloader.properties').write_text(
+        "[DEFAULT]\n"
+        f"token-file = {tmp_path / 'redcap_token.txt'}\n"
+        f"download-dir = {tmp_path / 'data'}\n"
+        "report-id = 1\n"
+    )
+    return tmp_path
+
+
+def test_first_log_line_without_heavy_imports(properties_dir):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                             "from redcap_downloader.main import main; main(['--check-config'])"],
+                            cwd=properties_dir, env=ENV, capture_output=True, text=True, timeout=60)
+
+    assert result.returncode == 0, result.stderr
+    modules, import_time = imports_before_first_log_line(result.stderr)
+    assert 'redcap_downloader' in modules
+    assert not modules & HEAVY_MODULES
+    assert import_time < FIRST_LOG_LINE_BUDGET
+    assert not (properties_dir / 'data' / 'raw').exists()
+
+
+def test_batch_module_without_heavy_imports():
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import redcap_downloader.batch'],
+                            env=ENV, capture_output=True, text=True, timeout=60)
+
+    imported = {match.group(1).split('.')[0]
+                for match in re.finditer(r'^import time:\s+\d+ \|\s+\d+ \|\s*(\S+)', result.stderr, re.MULTILINE)}
+    assert 'redcap_downloader' in imported
+    assert not imported & HEAVY_MODULES
@@ -0,0 +1,55 @@
+import shutil
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from redcap_downloader.storage.sync_state import SyncState
+
+
+class TestSyncState:
+
+    def test_missing_state_file(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            state = SyncState(Path(test_dir) / 'sync_state.json')
+            assert state.last_sync is None
+            assert not state.can_resume()
+
+    def test_update_and_reload(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            raw_file = Path(test_dir) / 'Report_raw.csv'
+            raw_file.write_text('study_id\n')
+            state = SyncState(Path(test_dir) / 'sync_state.json')
+            state.update(datetime(2025, 7, 16, 3, 0, 0), raw_file)
+
+            reloaded = SyncState(Path(test_dir) / 'sync_state.json')
+            assert reloaded.last_sync == datetime(2025, 7, 16, 3, 0, 0)
+            assert reloaded.raw_file == raw_file
+            assert reloaded.can_resume()
+
+    def test_cannot_resume_without_raw_file(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            state = SyncState(Path(test_dir) / 'sync_state.json')
+            state.update(datetime(2025, 7, 16), Path(test_dir) / 'missing.csv')
+            assert not SyncState(Path(test_dir) / 'sync_state.json').can_resume()
+
+    def test_state_follows_copied_directory(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            (Path(test_dir) / 'old').mkdir()
+            raw_file = Path(test_dir) / 'old' / 'Report_raw.csv'
+            raw_file.write_text('study_id\n')
+            SyncState(Path(test_dir) / 'old' / 'sync_state.json').update(datetime(2025, 7, 16), raw_file)
+            shutil.copytree(Path(test_dir) / 'old', Path(test_dir) / 'new')
+            assert SyncState(Path(test_dir) / 'new' / 'sync_state.json').raw_file == \
+                Path(test_dir) / 'new' / 'Report_raw.csv'
+
+    def test_reset(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            raw_file = Path(test_dir) / 'Report_raw.csv'
+            raw_file.write_text('study_id\n')
+            state = SyncState(Path(test_dir) / 'sync_state.json')
+            state.update(datetime(2025, 7, 16), raw_file)
+            state.reset()
+
+            assert not state.can_resume()
+            assert not (Path(test_dir) / 'sync_state.json').exists()
+            assert SyncState(Path(test_dir) / 'sync_state.json').last_sync is None
@@ -0,0 +1,54 @@
+import threading
+import time
+import pytest
+
+from redcap_downloader.storage.writer import GroupWriter
+
+
+def slow_task(results, lock, value):
+    time.sleep(0.01)
+    with lock:
+        results.append(value)
+
+
+def square(value):
+    return value * value
+
+
+def failing_task():
+    raise RuntimeError('write failed')
+
+
+class TestGroupWriter:
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            GroupWriter('gpu')
+
+    def test_serial_runs_immediately(self):
+        results = []
+        writer = GroupWriter('serial')
+        writer.submit(results.append, 1)
+        assert results == [1]
+
+    def test_thread_pool_runs_all_tasks(self):
+        results, lock = [], threading.Lock()
+        with GroupWriter('thread', max_workers=3, max_in_flight=2) as writer:
+            for i in range(10):
+                writer.submit(slow_task, results, lock, i)
+                assert len(writer._pending) <= 2
+            writer.wait()
+            assert sorted(results) == list(range(10))
+
+    def test_process_pool_does_not_fork_threads(self):
+        with GroupWriter('process', max_workers=2) as writer:
+            for i in range(4):
+                writer.submit(square, i)
+            assert sorted(writer.wait()) == [0, 1, 4, 9]
+            assert writer._executor._mp_context.get_start_method() in ('forkserver', 'spawn')
+
+    def test_errors_are_raised(self):
+        writer = GroupWriter('thread', max_workers=2)
+        writer.submit(failing_task)
+        with pytest.raises(RuntimeError):
+            writer.close()